@@ -0,0 +1,143 @@
+"""
+Benchmarks loading a large generated aws-lambda.yml, and the same
+configuration as aws-lambda.json.
+
+Reports the time taken by each of the loaders for reading the file, by mapping
+it onto the configuration classes, and by configuration.load as a whole, along
+with the memory held by the loaded configuration, once all of its functions
+have been parsed, with and without the data read from the file.
+
+Usage: python benchmarks/config.py [--functions 2000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lambda_tools import configuration
+from lambda_tools import mapper
+
+
+def generate(count):
+    functions = {}
+    for index in range(count):
+        name = 'function-{0:05d}'.format(index)
+        functions[name] = {
+            'runtime': 'python3.6',
+            'build': {
+                'source': 'src/' + name,
+                'package': 'build/' + name + '.zip',
+                'requirements': [{ 'file': 'src/' + name + '/requirements.txt' }],
+                'ignore': ['__pycache__', '*.pyc', 'tests']
+            },
+            'test': {
+                'source': 'tests/' + name,
+                'requirements': [{ 'file': 'tests/requirements.txt' }]
+            },
+            'deploy': {
+                'handler': 'handler.main',
+                'role': 'service-role/lambda',
+                'description': 'Function number {0}'.format(index),
+                'memory_size': 256,
+                'timeout': 30,
+                'environment': {
+                    'variables': dict([
+                        ('VARIABLE_{0}'.format(v), 'value {0}'.format(v)) for v in range(10)
+                    ])
+                },
+                'tags': { 'team': 'team-{0}'.format(index % 10), 'service': name },
+                'tracing_config': { 'mode': 'Active' },
+                'dead_letter_config': { 'target': { 'sqs': name + '-dlq' } },
+                'vpc_config': {
+                    'name': 'main',
+                    'subnets': ['private-a', 'private-b', { 'id': 'subnet-12345678' }],
+                    'security_groups': ['lambda', { 'name': 'database' }]
+                }
+            }
+        }
+    return { 'version': 1, 'functions': functions }
+
+
+def measure(label, repeat, function):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    print('{0:22} best {1:8.3f}s   mean {2:8.3f}s'.format(
+        label, min(times), sum(times) / len(times)
+    ))
+
+
+def measure_memory(label, function):
+    tracemalloc.start()
+    try:
+        result = function()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    print('{0:22} {1:8.1f} MB retained'.format(label, size / 1024 / 1024))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks loading the configuration.')
+    parser.add_argument('--functions', '-n', type=int, default=2000)
+    parser.add_argument('--repeat', '-r', type=int, default=5)
+    args = parser.parse_args()
+
+    data = generate(args.functions)
+    folder = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(folder, 'aws-lambda.yml')
+        with open(filename, 'w') as f:
+            yaml.safe_dump(data, f)
+        json_filename = os.path.join(folder, 'aws-lambda.json')
+        with open(json_filename, 'w') as f:
+            json.dump(data, f)
+        print('{0} functions, {1:.1f} MB of YAML, {2:.1f} MB of JSON'.format(
+            args.functions,
+            os.path.getsize(filename) / 1024 / 1024,
+            os.path.getsize(json_filename) / 1024 / 1024
+        ))
+        with open(filename, 'rb') as f:
+            content = f.read()
+        with open(json_filename, 'rb') as f:
+            json_content = f.read()
+        measure('yaml.SafeLoader', args.repeat,
+            lambda: yaml.load(content, Loader=yaml.SafeLoader))
+        if configuration.SafeLoader is not yaml.SafeLoader:
+            measure('yaml.CSafeLoader', args.repeat,
+                lambda: yaml.load(content, Loader=configuration.SafeLoader))
+        measure('json', args.repeat,
+            lambda: json.loads(json_content.decode('utf-8')))
+        measure('parse one function', args.repeat,
+            lambda: mapper.parse(configuration.Configuration, data).functions['function-00000'])
+        measure('parse all functions', args.repeat,
+            lambda: mapper.parse(configuration.Configuration, data).functions.parse_all())
+        measure('load YAML', args.repeat,
+            lambda: configuration.load(filename))
+        measure('load JSON', args.repeat,
+            lambda: configuration.load(json_filename))
+        def load_all(retain_data):
+            config = configuration.load(filename, retain_data=retain_data)
+            config.functions.parse_all()
+            return config
+        measure_memory('without data', lambda: load_all(False))
+        measure_memory('with data', lambda: load_all(True))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmarks ltools deploy against the fake AWS backend.
+
+Creates a definition file with a number of functions, each with its own small
+package, and deploys them twice: once to create them and once to update
+their code. Reports the time taken and the number of calls made to AWS.
+
+Usage: python benchmarks/deploy.py [--functions 50] [--jobs 8] [--latency 0.05]
+"""
+
+import argparse
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+import factoryfactory
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lambda_tools import command
+from lambda_tools import fake
+
+
+def write_packages(folder, count, version):
+    for index in range(count):
+        name = 'function-{0:04d}'.format(index)
+        with zipfile.ZipFile(os.path.join(folder, name + '.zip'), 'w') as zf:
+            zf.writestr('handler.py', 'def handler(event, context):\n    return {0!r}\n'.format(
+                name + ':' + version
+            ))
+
+
+def write_definitions(folder, count, regions):
+    functions = {}
+    for index in range(count):
+        name = 'function-{0:04d}'.format(index)
+        deploy = {
+            'handler': 'handler.handler',
+            'role': 'lambda',
+            'tags': { 'benchmark': 'true' },
+            'vpc_config': {
+                'subnets': ['private-a', 'private-b'],
+                'security_groups': ['lambda']
+            }
+        }
+        if regions:
+            deploy['regions'] = regions
+        functions[name] = {
+            'build': { 'source': 'src', 'package': name + '.zip' },
+            'deploy': deploy
+        }
+    filename = os.path.join(folder, 'aws-lambda.yml')
+    with open(filename, 'w') as f:
+        yaml.safe_dump({ 'version': 1, 'functions': functions }, f)
+    return filename
+
+
+def run(label, backend, args, definitions):
+    services = factoryfactory.ServiceLocator()
+    fake.register(services, backend)
+    backend.reset_calls()
+    start = time.monotonic()
+    command.entrypoint(['deploy', '-s', definitions, '--no-cache', '-j', str(args.jobs)], services)
+    elapsed = time.monotonic() - start
+    print('{0}: {1:.2f}s, {2} calls, {3} errors'.format(
+        label, elapsed, backend.total_calls(), sum(backend.errors.values())
+    ))
+    for name, count in sorted(backend.calls.items()):
+        print('    {0:45} {1:6}'.format(name, count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks ltools deploy offline.')
+    parser.add_argument('--functions', '-n', type=int, default=50)
+    parser.add_argument('--jobs', '-j', type=int, default=8)
+    parser.add_argument('--regions', nargs='*', default=[])
+    parser.add_argument('--latency', type=float, default=0.05,
+        help='The time each call takes, in seconds.')
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=None,
+        help='The number of calls per second allowed before throttling.')
+    parser.add_argument('--conflict-rate', type=float, default=0.0)
+    parser.add_argument('--update-duration', type=float, default=0.5,
+        help='How long each function stays InProgress after an update.')
+    args = parser.parse_args()
+
+    backend = fake.FakeBackend(
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+        rate_limit=args.rate_limit,
+        conflict_rate=args.conflict_rate,
+        update_duration=args.update_duration,
+        seed=0
+    )
+    for region in args.regions or [backend.region_name]:
+        backend.add_vpc('main', ['private-a', 'private-b'], ['lambda'], region)
+
+    folder = tempfile.mkdtemp()
+    try:
+        definitions = write_definitions(folder, args.functions, args.regions)
+        write_packages(folder, args.functions, '1')
+        run('Create', backend, args, definitions)
+        write_packages(folder, args.functions, '2')
+        run('Update', backend, args, definitions)
+        run('Unchanged', backend, args, definitions)
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+Shared helpers for talking to AWS that are used across all the functions
+being processed in a single run.
+"""
+
+import json
+import os
+import os.path
+import tempfile
+import threading
+import time
+
+import boto3
+import botocore.config
+import factoryfactory
+
+
+# ====== Client pool ====== #
+
+class ClientPool(factoryfactory.Serviceable):
+    """
+    Hands out AWS clients, creating only one for each service and region.
+
+    Creating a client means loading its service model, which is slow, so the
+    clients are reused by all the functions processed in a run. Clients are
+    thread-safe, but sessions are not, so they are all created from a single
+    session while holding a lock. Each client's connection pool is made large
+    enough to be shared by concurrent deploys.
+    """
+
+    def __init__(self, max_pool_connections=50):
+        self.session = self.services.get(boto3.Session)
+        self.region_name = self.session.region_name
+        self.config = botocore.config.Config(max_pool_connections=max_pool_connections)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, service_name, region_name=None):
+        key = (service_name, region_name or self.region_name)
+        with self._lock:
+            result = self._clients.get(key)
+            if result is None:
+                result = self.session.client(
+                    service_name, region_name=key[1], config=self.config
+                )
+                self._clients[key] = result
+        return result
+
+
+# ====== Resolution cache ====== #
+
+def _is_found(value):
+    """
+    Tests whether a lookup found anything. Lookups that found nothing are
+    only cached for the current run, so that a resource created after a
+    failed run is found by the next one.
+    """
+    return value is not None and value != [] and value != {}
+
+
+class ResolutionCache:
+    """
+    Caches the results of the lookups that are used to resolve names into IDs
+    and ARNs, such as the account ID, KMS key ARNs and subnet IDs.
+
+    One instance is shared by all the functions processed in a run, so each
+    lookup is only made once however many functions need it. If a filename is
+    given, results are also persisted to disk between runs, and are reused
+    until their time to live expires.
+    """
+
+    def __init__(self, filename=None, ttl=3600):
+        self.filename = filename
+        self.ttl = ttl
+        self._values = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._dirty = False
+        if filename:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.filename) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return
+        now = time.time()
+        for key, (expires, value) in data.items():
+            if expires > now:
+                self._values[key] = (expires, value)
+
+    def save(self):
+        """
+        Writes the persistent results to disk, if a filename was given.
+        """
+        if not self.filename or not self._dirty:
+            return
+        now = time.time()
+        with self._lock:
+            data = dict([
+                (key, [expires, value])
+                for key, (expires, value) in self._values.items()
+                if expires and expires > now
+            ])
+            self._dirty = False
+        folder = os.path.dirname(os.path.abspath(self.filename))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.filename)
+
+    def get(self, key, lookup, persist=True):
+        """
+        Gets a cached value, looking it up if it is not yet known.
+
+        @param key
+            A tuple of strings identifying the value, normally
+            (account, region, query, arguments...).
+        @param lookup
+            A callable which looks up the value. Its result must be
+            JSON-serialisable.
+        @param persist
+            False if the value must never be written to disk. Values that
+            are empty are never written to disk either.
+        """
+        key = json.dumps(key)
+        with self._lock:
+            if key in self._values:
+                return self._values[key][1]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread looks up any given key; the others wait for it.
+        with key_lock:
+            with self._lock:
+                if key in self._values:
+                    return self._values[key][1]
+            value = lookup()
+            persist = persist and _is_found(value)
+            with self._lock:
+                expires = time.time() + self.ttl if persist else None
+                self._values[key] = (expires, value)
+                self._dirty = self._dirty or persist
+            return value
+
+    def get_many(self, keys, lookup, persist=True):
+        """
+        Gets several cached values at once, looking up all the ones that are
+        not yet known in a single batch.
+
+        @param keys
+            A list of tuples identifying the values.
+        @param lookup
+            A callable which takes a list of the keys that are not yet known,
+            and returns a dict mapping them to their values. Keys that are
+            missing from the dict are cached as None.
+        @param persist
+            False if the values must never be written to disk. Values that
+            are empty are never written to disk either.
+        @returns
+            A dict mapping each key to its value.
+        """
+        encoded = dict([(json.dumps(key), tuple(key)) for key in keys])
+        with self._lock:
+            result = dict([
+                (key, self._values[k][1]) for k, key in encoded.items()
+                if k in self._values
+            ])
+        missing = [key for key in encoded.values() if key not in result]
+        if missing:
+            found = lookup(missing)
+            with self._lock:
+                expires = time.time() + self.ttl if persist else None
+                for key in missing:
+                    result[key] = found.get(key)
+                    found_key = _is_found(result[key])
+                    self._values[json.dumps(key)] = (expires if found_key else None, result[key])
+                    self._dirty = self._dirty or (persist and found_key)
+        return result
+
+    def scoped(self, account_id, region):
+        """
+        Gets a view of the cache whose keys are prefixed with the account and
+        region.
+        """
+        return ScopedResolutionCache(self, account_id, region)
+
+
+class ScopedResolutionCache:
+
+    def __init__(self, cache, account_id, region):
+        self.cache = cache
+        self.scope = (str(account_id), region)
+
+    def get(self, query, lookup, persist=True):
+        return self.cache.get(self.scope + tuple(query), lookup, persist)
+
+    def get_many(self, queries, lookup, persist=True):
+        keys = dict([(self.scope + tuple(query), tuple(query)) for query in queries])
+
+        def lookup_keys(missing):
+            found = lookup([keys[key] for key in missing])
+            return dict([(key, found.get(keys[key])) for key in missing])
+
+        values = self.cache.get_many(list(keys), lookup_keys, persist)
+        return dict([(keys[key], value) for key, value in values.items()])
+
+
+def cached(cache, query, lookup):
+    """
+    Looks up a value through a (scoped) cache, if one is given.
+    """
+    if cache is None:
+        return lookup()
+    return cache.get(query, lookup)
+
+
+def cached_many(cache, queries, lookup):
+    """
+    Looks up several values through a (scoped) cache, if one is given.
+    """
+    queries = [tuple(query) for query in queries]
+    if not queries:
+        return {}
+    elif cache is None:
+        return lookup(queries)
+    return cache.get_many(queries, lookup)
@@ -8,6 +8,9 @@ This involves:
  (c) Zip it all up
 """
 
+import base64
+import hashlib
+import json
 import os
 import os.path
 import re
@@ -20,11 +23,71 @@ import factoryfactory
 import pip
 
 from . import configuration
+from . import warmup
 
 class TestError(Exception):
     pass
 
 
+# The platforms for which pip must fetch wheels when building packages for
+# an architecture other than the host's, and the corresponding Docker
+# platforms.
+PIP_PLATFORMS = {
+    'arm64': 'manylinux2014_aarch64'
+}
+
+DOCKER_PLATFORMS = {
+    'x86_64': 'linux/amd64',
+    'arm64': 'linux/arm64'
+}
+
+
+def code_sha256(filename):
+    """
+    Calculates the base64-encoded SHA-256 hash of a file, in the same format
+    as the CodeSha256 value reported by AWS Lambda.
+    """
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return base64.b64encode(sha.digest()).decode('ascii')
+
+
+def record_code_sha256(filename, sha256=None):
+    """
+    Records the CodeSha256 of a package in a file alongside it, together
+    with the size and modification time of the package, so that it can be
+    reused for as long as the package has not been replaced.
+
+    @param sha256
+        The hash to record. If not specified, it is calculated.
+    """
+    stat = os.stat(filename)
+    with open(filename + '.sha256', 'w') as f:
+        json.dump({
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha256 or code_sha256(filename)
+        }, f)
+
+
+def get_code_sha256(filename):
+    """
+    Gets the CodeSha256 of a package, using the value recorded when it was
+    built if the package still has the same size and modification time.
+    """
+    try:
+        with open(filename + '.sha256') as f:
+            recorded = json.load(f)
+        stat = os.stat(filename)
+        if recorded['size'] == stat.st_size and recorded['mtime_ns'] == stat.st_mtime_ns:
+            return recorded['sha256']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+    return code_sha256(filename)
+
+
 class Package(factoryfactory.Serviceable):
     """
     Creates a bundled package
@@ -39,14 +102,16 @@ class Package(factoryfactory.Serviceable):
         @param bundle_folder
             The temporary folder into which the packgage is to be created.
         """
-        self.root = self.services.get(configuration.Configuration).root
+        self.root = self.services.get(configuration.Configuration).get_root(name)
         self.name = name
         self.runtime = cfg.runtime
+        self.architecture = cfg.architecture
         self.terraform = terraform
         self.build = cfg.build
         self.build.resolve(self.root)
         self.test = cfg.test
         self.bundle_folder = cfg.build.bundle
+        self.warmup = cfg.deploy.warmup if cfg.deploy else None
 
     def copy_files(self):
         """
@@ -59,6 +124,55 @@ class Package(factoryfactory.Serviceable):
             ignore=shutil.ignore_patterns(*self.build.ignore)
         )
 
+    def add_warmup_shim(self):
+        """
+        Adds the handler shim which answers warm-up events to the bundle, if
+        the function is to be kept warm.
+        """
+        if self.warmup:
+            shutil.copyfile(
+                warmup.__file__,
+                os.path.join(self.bundle_folder, warmup.MODULE_NAME + '.py')
+            )
+
+    def get_python_version(self):
+        """
+        Gets the Python version of the runtime, e.g. 3.6 for python3.6.
+        """
+        match = re.match(r'^python(\d+\.\d+)$', self.runtime or '')
+        return match.group(1) if match else None
+
+    def get_pip_command(self, requirements_file):
+        """
+        Gets the command which installs a requirements file into the bundle.
+
+        @param requirements_file
+            The path to the requirements file.
+        """
+        compile_args = [ '--compile' if self.build.compile_dependencies else '--no-compile' ]
+        if self.build.use_docker:
+            version = self.get_python_version()
+            image = 'python:3.6.3' if version in (None, '3.6') else 'python:' + version
+            return [
+                'docker', 'run',
+                '--platform', DOCKER_PLATFORMS[self.architecture],
+                '-v', os.path.realpath(requirements_file) + ':/requirements.txt',
+                '-v', os.path.realpath(self.bundle_folder) + ':/bundle',
+                '--rm', image,
+                'pip', 'install', '-r', '/requirements.txt', '-t', '/bundle'
+            ] + compile_args
+
+        cmd = [ 'pip', 'install', '-r', requirements_file, '-t', self.bundle_folder ]
+        platform = PIP_PLATFORMS.get(self.architecture)
+        if platform:
+            # Fetch binary wheels for the target platform, as anything that
+            # had to be compiled would be built for the host.
+            cmd += [ '--platform', platform, '--only-binary=:all:', '--implementation', 'cp' ]
+            version = self.get_python_version()
+            if version:
+                cmd += [ '--python-version', version ]
+        return cmd + compile_args
+
     def install_requirement_file(self, requirement):
         """
         Installs the requirements specified in requirements.txt into the bundle.
@@ -71,18 +185,7 @@ class Package(factoryfactory.Serviceable):
                 s = re.sub(r'^-e\s+', '', s)
                 t.file.write(s + os.linesep)
             t.flush()
-            compile_args = [ '--compile' if self.build.compile_dependencies else '--no-compile' ]
-            if self.build.use_docker:
-                cmd = [
-                    'docker', 'run',
-                    '-v', os.path.realpath(t.name) + ':/requirements.txt',
-                    '-v', os.path.realpath(self.bundle_folder) + ':/bundle',
-                    '--rm', 'python:3.6.3',
-                    'pip', 'install', '-r', '/requirements.txt', '-t', '/bundle'
-                ]
-            else:
-                cmd = [ 'pip', 'install', '-r', t.name, '-t', self.bundle_folder ]
-            subprocess.run(cmd + compile_args, stdout=stdout_redirect)
+            subprocess.run(self.get_pip_command(t.name), stdout=stdout_redirect)
 
         #
         # pip doesn't preserve timestamps when installing files.
@@ -114,6 +217,7 @@ class Package(factoryfactory.Serviceable):
         base_name, fmt = os.path.splitext(self.build.package)
         fmt = fmt.replace(os.path.extsep, '') or 'zip'
         shutil.make_archive(base_name, fmt, self.bundle_folder, './', True)
+        record_code_sha256(self.build.package)
 
     def create(self):
         """
@@ -121,6 +225,7 @@ class Package(factoryfactory.Serviceable):
         """
         try:
             self.copy_files()
+            self.add_warmup_shim()
             self.install_requirements(self.build.requirements)
             self.create_archive()
         finally:
@@ -183,6 +288,8 @@ class Package(factoryfactory.Serviceable):
             shutil.rmtree(self.build.package)
         elif os.path.exists(self.build.package):
             os.unlink(self.build.package)
+        if os.path.isfile(self.build.package + '.sha256'):
+            os.unlink(self.build.package + '.sha256')
 
     def clean(self, all):
         """
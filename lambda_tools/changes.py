@@ -0,0 +1,164 @@
+"""
+Works out which functions are affected by the changes made to a git working
+tree since a given revision, so that only those need to be processed.
+"""
+
+import copy
+import os.path
+import subprocess
+
+from . import configuration
+from . import mapper
+
+
+class ChangesError(Exception):
+    pass
+
+
+def git(folder, *args):
+    """
+    Runs a git command and returns its output, as bytes.
+
+    @param folder
+        The folder in which to run it.
+    """
+    result = subprocess.run(['git'] + list(args), cwd=folder,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode:
+        raise ChangesError('git {0} failed: {1}'.format(
+            args[0], result.stderr.decode('utf-8', 'replace').strip()
+        ))
+    return result.stdout
+
+
+def get_changed_files(folder, ref):
+    """
+    Gets the files that have been changed, added or removed since a
+    revision, including changes that have not been committed and files that
+    git does not yet know about.
+
+    @param folder
+        A folder in the working tree.
+    @param ref
+        The revision to compare the working tree against.
+    @returns
+        The top level folder of the working tree, and a set of the absolute
+        paths of the changed files.
+    """
+    top = os.path.realpath(os.fsdecode(git(folder, 'rev-parse', '--show-toplevel').strip()))
+    names = git(top, 'diff', '--name-only', '--no-renames', ref, '--').splitlines()
+    names += git(top, 'ls-files', '--others', '--exclude-standard').splitlines()
+    return top, set([
+        os.path.join(top, os.path.normpath(os.fsdecode(name))) for name in names if name
+    ])
+
+
+def _read_functions(content, filename):
+    """
+    Gets the raw functions section from the content of a configuration file,
+    or an empty dict if it can not be read.
+    """
+    try:
+        data = configuration.upgrade(configuration.read_data(content, filename))
+        return dict(data.get('functions') or {})
+    except Exception:
+        return {}
+
+
+def get_changed_sections(top, ref, filenames, changed_files):
+    """
+    Finds the functions whose configuration sections have changed.
+
+    @param top
+        The top level folder of the working tree.
+    @param ref
+        The revision to compare the working tree against.
+    @param filenames
+        The names of the configuration file and the files it includes.
+    @param changed_files
+        The set of changed files, as returned by get_changed_files().
+    """
+    changed = set()
+    for filename in filenames:
+        path = os.path.realpath(filename)
+        if path not in changed_files:
+            continue
+        with open(path, 'rb') as f:
+            current = _read_functions(f.read(), path)
+        git_path = os.path.relpath(path, top).replace(os.sep, '/')
+        try:
+            previous = _read_functions(git(top, 'show', ref + ':' + git_path), path)
+        except ChangesError:
+            # The file did not exist at that revision.
+            previous = {}
+        changed.update([
+            name for name in current if current[name] != previous.get(name)
+        ])
+    return changed
+
+
+def get_function_paths(config, name):
+    """
+    Gets the files and folders that a function is built and tested from.
+    """
+    func = config.functions[name]
+    root = config.get_root(name)
+    paths = []
+    for section in (func.build, func.test):
+        if section:
+            section = copy.deepcopy(section)
+            section.resolve(root)
+            paths.append(section.source)
+            paths.extend([requirement.file for requirement in section.requirements])
+    return [os.path.realpath(path) for path in paths if path]
+
+
+def get_changed_functions(config, ref, names=None):
+    """
+    Finds the functions affected by the changes made since a revision:
+    those with changes to their source or test folders or their requirement
+    files, or to their sections of the configuration.
+
+    @param config
+        The Configuration.
+    @param ref
+        The revision to compare the working tree against.
+    @param names
+        The names of the functions to consider. If empty, all of them are.
+    @returns
+        A sorted list of the names of the affected functions.
+    """
+    names = list(names or config.functions)
+    top, changed_files = get_changed_files(config.root or '.', ref)
+    if not changed_files:
+        return []
+
+    if config.filename:
+        filenames = [config.filename] + configuration.find_includes(
+            config.filename, config.include)
+        changed = get_changed_sections(top, ref, filenames, changed_files)
+    else:
+        changed = set()
+
+    # A function is affected by a change to any of its paths or to anything
+    # inside them, so look its paths up among the changed files and all the
+    # folders that contain them, up to and including the top level folder.
+    changed_paths = set()
+    for changed_file in changed_files:
+        while changed_file not in changed_paths:
+            changed_paths.add(changed_file)
+            if changed_file == top:
+                break
+            changed_file = os.path.dirname(changed_file)
+    for name in names:
+        if name in changed:
+            continue
+        try:
+            paths = get_function_paths(config, name)
+        except mapper.MappingError:
+            # Let whatever processes the function report the error.
+            changed.add(name)
+            continue
+        if any(path in changed_paths for path in paths):
+            changed.add(name)
+    return sorted(set(names) & changed)
@@ -4,7 +4,9 @@ import os.path
 import sys
 import factoryfactory
 
+from . import aws
 from . import configuration
+from . import mapper
 from .build import Package
 
 # ====== Command base class ====== #
@@ -48,6 +50,17 @@ class ConfiguredCommand(Command):
             help='Specifies the source file containing the lambda definitions. '
                 'Default: aws-lambda.yml or aws-lambda.json.'
         )
+        parser.add_argument('--no-cache', action='store_true',
+            help='Parses the configuration file without using or updating the '
+                'cached copy of its data in the user\'s cache directory.'
+        )
+
+    def retain_data(self):
+        """
+        Whether the command needs the data read from the configuration file
+        as well as the parsed configuration.
+        """
+        return False
 
     def register_dependencies(self, args):
         lambda_file = args.source
@@ -59,7 +72,12 @@ class ConfiguredCommand(Command):
             lambda_file = found_files[0]
         filename = os.path.realpath(lambda_file)
         folder = os.path.dirname(filename)
-        config = configuration.load(filename)
+        if args.no_cache:
+            cache_file = None
+        else:
+            cache_file = configuration.get_cache_file(filename)
+        config = configuration.load(filename,
+            retain_data=self.retain_data(), cache_file=cache_file)
         self.services.register(configuration.Configuration, config, singleton=True)
 
 
@@ -72,6 +90,39 @@ class SelectedFunctionsCommand(ConfiguredCommand):
             'specified, will process all the functions defined in the file.',
             metavar='function'
         )
+        parser.add_argument('--changed-since', default=None, metavar='REF',
+            help='Only processes the functions affected by the changes made '
+                'since the specified git revision, to their source, tests, '
+                'requirements or configuration.'
+        )
+
+    def get_function_names(self, args):
+        """
+        Gets the names of the functions to process: those specified on the
+        command line, restricted to the ones affected by the changes since
+        --changed-since if it was given. An empty list means all of them,
+        unless --changed-since was given.
+        """
+        if not args.changed_since:
+            return args.functions
+        from .changes import get_changed_functions
+        config = self.services.get(configuration.Configuration)
+        if args.functions:
+            config._check_names(args.functions)
+        return get_changed_functions(config, args.changed_since, args.functions)
+
+    def select_functions(self, args):
+        """
+        Gets the functions to process, as a dict mapping their names to their
+        FunctionConfigs.
+        """
+        config = self.services.get(configuration.Configuration)
+        names = self.get_function_names(args)
+        if args.changed_since and not names:
+            print('No functions have changed since {0}.'.format(args.changed_since),
+                file=sys.stderr)
+            return {}
+        return config.get_functions(names)
 
     def process_function(self, args, function, name):
         """
@@ -87,8 +138,7 @@ class SelectedFunctionsCommand(ConfiguredCommand):
         pass
 
     def run(self, args):
-        config = self.services.get(configuration.Configuration)
-        functions = config.get_functions(args.functions)
+        functions = self.select_functions(args)
         for name in functions:
             funcdef = functions[name]
             self.process_function(args, funcdef, name)
@@ -173,10 +223,196 @@ class DeployCommand(SelectedFunctionsCommand):
                 'Deploys the specified lambda functions to AWS.'
         }
 
-    def process_function(self, args, function, name):
-        from .deploy import Deployer
-        package = self.services.get(Deployer, function, name)
-        package.deploy()
+    def register_arguments(self, parser):
+        SelectedFunctionsCommand.register_arguments(self, parser)
+        parser.add_argument('--jobs', '-j', type=int, default=1,
+            help='The number of functions to deploy concurrently. Default: 1.'
+        )
+        parser.add_argument('--max-package-memory', type=int, default=256,
+            help='The maximum total size, in megabytes, of the packages being '
+                'uploaded at any one time. Default: 256.'
+        )
+        parser.add_argument('--resume', action='store_true',
+            help='Resumes the previous run, only deploying the functions that '
+                'it did not deploy, or that have changed since.'
+        )
+        parser.add_argument('--journal', default=None, metavar='FILE',
+            help='The file in which to record which functions have been '
+                'deployed. Default: .ltools-deploy-journal.json alongside '
+                'the configuration file.'
+        )
+        parser.add_argument('--resolution-cache', default=None, metavar='FILE',
+            help='A file in which to cache the IDs and ARNs of resources that '
+                'are specified by name, so that they are not looked up again '
+                'on subsequent runs.'
+        )
+        parser.add_argument('--resolution-cache-ttl', type=int, default=3600,
+            metavar='SECONDS',
+            help='How long to keep entries in the resolution cache file. '
+                'Default: 3600.'
+        )
+
+    def retain_data(self):
+        # The journal hashes each function's configuration as it was written.
+        return True
+
+    def register_dependencies(self, args):
+        from .deploy import PackageBudget, Throttle, UpdateWaiter
+        SelectedFunctionsCommand.register_dependencies(self, args)
+        self.services.register(Throttle, Throttle(), singleton=True)
+        self.services.register(UpdateWaiter, self.services.get(UpdateWaiter), singleton=True)
+        self.services.register(PackageBudget,
+            PackageBudget(args.max_package_memory * 1024 * 1024), singleton=True)
+        self.services.register(aws.ResolutionCache, aws.ResolutionCache(
+            args.resolution_cache, args.resolution_cache_ttl
+        ), singleton=True)
+        # Create the client pool up front so that the deploy threads share it.
+        self.services.register(aws.ClientPool,
+            self.services.get(aws.ClientPool, max(10, args.jobs * 2)), singleton=True)
+
+    def run(self, args):
+        try:
+            self.deploy_functions(args)
+        finally:
+            self.services.get(aws.ResolutionCache).save()
+
+    def deploy_functions(self, args):
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        from .deploy import DeployError, FunctionInventory, deploy_regions, get_regional_configs
+        from .journal import DeployJournal
+        config = self.services.get(configuration.Configuration)
+        functions = self.select_functions(args)
+        regional = dict([
+            (name, get_regional_configs(functions[name])) for name in functions
+        ])
+
+        # Skip whatever the run being resumed has already deployed.
+        journal = self.services.get(DeployJournal, args.journal or
+            os.path.join(config.root, '.ltools-deploy-journal.json'))
+        if args.resume:
+            for name in list(regional):
+                remaining = []
+                for func in regional[name]:
+                    state = journal.get_state(name, func)
+                    if journal.is_deployed(state):
+                        print('Skipping {0}{1}: already deployed.'.format(
+                            name, ' (' + state['region'] + ')' if state['region'] else ''
+                        ))
+                    else:
+                        remaining.append(func)
+                if remaining:
+                    regional[name] = remaining
+                else:
+                    del regional[name]
+        else:
+            journal.clear()
+
+        # When deploying more than one function, find out which ones already
+        # exist in bulk rather than asking about each one in turn.
+        if sum([len(funcs) for funcs in regional.values()]) > 1:
+            inventory = self.services.get(FunctionInventory)
+        else:
+            inventory = None
+
+        # Resolve the VPC settings of all the functions in one go.
+        configuration.resolve_all_vpc_configs(self.services, [
+            func.deploy for name in regional for func in regional[name] if func.deploy
+        ])
+
+        if args.jobs <= 1:
+            for name in regional:
+                deploy_regions(self.services, regional[name], name, inventory, journal)
+            return
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            futures = dict([
+                (executor.submit(
+                    deploy_regions, self.services, regional[name], name, inventory, journal
+                ), name)
+                for name in regional
+            ])
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print('Failed to deploy {0}: {1}'.format(name, e), file=sys.stderr)
+                    failed.append(name)
+        if failed:
+            raise DeployError('The following functions could not be deployed: ' +
+                ', '.join(sorted(failed)))
+
+
+# ====== Validate command ====== #
+
+class ValidateCommand(SelectedFunctionsCommand):
+
+    def name(self):
+        return 'validate'
+
+    def meta(self):
+        return {
+            'description':
+                'Checks the configuration of the specified lambda functions, '
+                'reporting every one that is invalid.'
+        }
+
+    def run(self, args):
+        config = self.services.get(configuration.Configuration)
+        names = self.get_function_names(args)
+        if args.changed_since and not names:
+            print('No functions have changed since {0}.'.format(args.changed_since),
+                file=sys.stderr)
+            return
+        errors = config.check_functions(names)
+        for name in sorted(errors):
+            print('{0}: {1}'.format(name, errors[name]), file=sys.stderr)
+        if errors:
+            raise mapper.MappingError('The following functions are invalid: ' +
+                ', '.join(sorted(errors)))
+        count = len(names or config.functions)
+        print('{0} function{1} valid.'.format(count, ' is' if count == 1 else 's are'))
+
+
+# ====== Serve command ====== #
+
+class ServeCommand(SelectedFunctionsCommand):
+
+    def name(self):
+        return 'serve'
+
+    def meta(self):
+        return {
+            'description':
+                'Serves the specified lambda functions locally over HTTP, '
+                'in the same way as API Gateway\'s Lambda proxy integration.'
+        }
+
+    def register_arguments(self, parser):
+        SelectedFunctionsCommand.register_arguments(self, parser)
+        parser.add_argument('--host', default='127.0.0.1',
+            help='The address on which to listen. Default: 127.0.0.1.'
+        )
+        parser.add_argument('--port', '-p', type=int, default=3000,
+            help='The port on which to listen. Default: 3000.'
+        )
+        parser.add_argument('--concurrency', '-c', type=int, default=1,
+            help='The number of warm workers to start for each function that '
+                'does not specify its own concurrency. Default: 1.'
+        )
+
+    def run(self, args):
+        from .serve import Gateway, create_pool
+        config = self.services.get(configuration.Configuration)
+        functions = self.select_functions(args)
+        pools = [
+            create_pool(functions[name], name, config.get_root(name), args.concurrency)
+            for name in functions
+            if args.functions or functions[name].deploy
+        ]
+        gateway = self.services.get(Gateway, pools)
+        gateway.serve(args.host, args.port)
 
 
 # ====== Version command ====== #
@@ -195,17 +431,19 @@ class VersionCommand(Command):
 
 def get_command_classes():
     return (
-        clazz() for clazz in globals().values()
+        clazz for clazz in globals().values()
         if inspect.isclass(clazz) and issubclass(clazz, Command) and clazz != Command
     )
 
 
 def register_core_dependencies(services):
-    pass
+    services.register(aws.ResolutionCache, aws.ResolutionCache, singleton=True)
+    services.register(aws.ClientPool, aws.ClientPool, singleton=True)
 
 
-def entrypoint(args):
-    service_locator = factoryfactory.ServiceLocator()
+def entrypoint(args, service_locator=None):
+    if service_locator is None:
+        service_locator = factoryfactory.ServiceLocator()
     register_core_dependencies(service_locator)
 
     parser = argparse.ArgumentParser(
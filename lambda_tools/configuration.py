@@ -3,14 +3,28 @@ A set of classes and functions to parse the  `aws-lambda.yml` file and load in
 the lambda configurations.
 """
 
+import concurrent.futures
+import glob
+import hashlib
+import json
 import os
 import os.path
+import re
+import tempfile
 
-import boto3
 import yaml
 
+try:
+    # The libyaml bindings are much faster, but are not always installed.
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+from . import VERSION
+from . import aws
 from . import mapper
 
+@mapper.record
 class DeadLetterTargetConfig:
     sns = mapper.StringField()
     sqs = mapper.StringField()
@@ -24,6 +38,7 @@ class DeadLetterTargetConfig:
             region + ':' + str(account_id) + ':' + str(self.sns or self.sqs)
 
 
+@mapper.record
 class DeadLetterConfig:
     target = mapper.ClassField(DeadLetterTargetConfig)
     target_arn = mapper.StringField()
@@ -37,6 +52,7 @@ class DeadLetterConfig:
             self.target_arn = self.target.get_arn(account_id, region)
 
 
+@mapper.record
 class EnvironmentConfig:
     variables = mapper.DictField(mapper.StringField(nullable=True), required=True)
 
@@ -45,6 +61,7 @@ class EnvironmentConfig:
             if self.variables[key] == None:
                 self.variables[key] = environment.get(key, '')
 
+@mapper.record
 class KmsKeyConfig:
     name = mapper.StringField()
     arn = mapper.StringField()
@@ -53,15 +70,19 @@ class KmsKeyConfig:
         if bool(self.name) == bool(self.arn):
             return 'You must specify either name or arn, but not both.'
 
-    def resolve(self, kms):
+    def resolve(self, kms, cache=None):
         if self.name:
-            self.arn = kms.describe_key(KeyId='alias/' + self.name)['KeyMetadata']['Arn']
+            self.arn = aws.cached(cache, ('kms:DescribeKey', 'alias/' + self.name),
+                lambda: kms.describe_key(KeyId='alias/' + self.name)['KeyMetadata']['Arn']
+            )
 
 
+@mapper.record
 class TracingConfig:
     mode = mapper.ChoiceField(choices=['PassThrough', 'Active'], required=True)
 
 
+@mapper.record
 class NameOrIdConfig:
     id = mapper.StringField()
     name = mapper.StringField()
@@ -71,6 +92,7 @@ class NameOrIdConfig:
             return 'You must specify eother id or name, but not both.'
 
 
+@mapper.record
 class VpcConfig:
     name = mapper.StringField()
     subnets = mapper.ListField(
@@ -82,59 +104,115 @@ class VpcConfig:
         required=True
     )
 
-    def resolve(self, ec2):
-        # First get the VPC ID
-        if self.name:
-            vpcs = ec2.describe_vpcs(Filters=[{
-                'Name': 'tag:Name',
-                'Values': [self.name]
-            }])
-            vpc_ids = [vpc['VpcId'] for vpc in vpcs['Vpcs']]
-        else:
-            vpc_ids = None
+    def resolve(self, ec2, cache=None):
+        resolve_vpc_configs(ec2, [self], cache)
 
-        # Next get the subnets and SGs that are specified by name
-        subnets = dict([(s.name, s) for s in self.subnets if s.name])
-        sgroups = dict([(s.name, s) for s in self.security_groups if s.name])
 
-        # Next get the filter.
+EC2_FILTER_LIMIT = 200
+
+
+def _describe_by_name(ec2, operation, result_key, filter_name, names):
+    """
+    Queries EC2 for all the resources with any of the specified names, using
+    as few paginated calls as the limit on filter values allows.
+    """
+    paginator = ec2.get_paginator(operation)
+    names = sorted(names)
+    for i in range(0, len(names), EC2_FILTER_LIMIT):
         filter = [{
-            'Name': 'tag:Name',
-            'Values': list(subnets)
+            'Name': filter_name,
+            'Values': names[i:i + EC2_FILTER_LIMIT]
         }]
-        if vpc_ids:
-            filter.append({
-                'Name': 'vpc-id',
-                'Values': vpc_ids
-            })
-
-        # Query EC2.
-        subnet_data = ec2.describe_subnets(Filters=filter)['Subnets']
-        filter[0]['Name'] = 'group-name'
-        filter[0]['Values'] = list(sgroups)
-        sgroup_data = ec2.describe_security_groups(Filters=filter)['SecurityGroups']
-
-        # Construct name -> id mappings
-        subnet_map = dict([
-            (
-                [tag['Value'] for tag in subnet['Tags'] if tag['Key'] == 'Name' ][0],
-                subnet['SubnetId']
-            )
-            for subnet in subnet_data
-        ])
+        for page in paginator.paginate(Filters=filter):
+            for item in page[result_key]:
+                yield item
+
+
+def _get_name_tag(resource):
+    names = [tag['Value'] for tag in resource.get('Tags') or [] if tag['Key'] == 'Name']
+    return names[0] if names else None
+
+
+def _name_lookup(ec2, kind, operation, result_key, filter_name, get_name, get_id):
+    """
+    Creates a function which looks up resources by name in bulk.
+
+    The function takes a list of (kind, name) queries and returns a dict
+    mapping each query to a list of [vpc_id, id] pairs, since the same name
+    may be used in more than one VPC.
+    """
+    def lookup(queries):
+        result = dict([(query, []) for query in queries])
+        names = [query[1] for query in queries]
+        for item in _describe_by_name(ec2, operation, result_key, filter_name, names):
+            query = (kind, get_name(item))
+            if query in result:
+                result[query].append([item.get('VpcId'), get_id(item)])
+        return result
+    return lookup
+
+
+def resolve_vpc_configs(ec2, vpc_configs, cache=None):
+    """
+    Resolves the IDs of the subnets and security groups that are specified by
+    name in any number of VPC configurations at once. The names used by all
+    the configurations are collected and looked up together, so the number
+    of calls to EC2 does not depend on the number of functions.
+
+    Subnets and security groups which already have an ID are left alone.
+
+    @param ec2
+        The EC2 client.
+    @param vpc_configs
+        A list of VpcConfig instances.
+    @param cache
+        The ScopedResolutionCache for the account and region, if any.
+    """
+    vpc_names = set()
+    subnet_names = set()
+    sgroup_names = set()
+    for vpc_config in vpc_configs:
+        subnets = [s.name for s in vpc_config.subnets if s.name and not s.id]
+        sgroups = [s.name for s in vpc_config.security_groups if s.name and not s.id]
+        if vpc_config.name and (subnets or sgroups):
+            vpc_names.add(vpc_config.name)
+        subnet_names.update(subnets)
+        sgroup_names.update(sgroups)
+
+    vpcs = aws.cached_many(cache,
+        [('ec2:Vpcs', name) for name in vpc_names],
+        _name_lookup(ec2, 'ec2:Vpcs', 'describe_vpcs', 'Vpcs', 'tag:Name',
+            _get_name_tag, lambda vpc: vpc['VpcId'])
+    )
+    subnets = aws.cached_many(cache,
+        [('ec2:Subnets', name) for name in subnet_names],
+        _name_lookup(ec2, 'ec2:Subnets', 'describe_subnets', 'Subnets', 'tag:Name',
+            _get_name_tag, lambda subnet: subnet['SubnetId'])
+    )
+    sgroups = aws.cached_many(cache,
+        [('ec2:SecurityGroups', name) for name in sgroup_names],
+        _name_lookup(ec2, 'ec2:SecurityGroups', 'describe_security_groups',
+            'SecurityGroups', 'group-name',
+            lambda sgroup: sgroup['GroupName'], lambda sgroup: sgroup['GroupId'])
+    )
 
-        sgroup_map = dict([
-            (sgroup['GroupName'], sgroup['GroupId'])
-            for sgroup in sgroup_data
-        ])
+    def get_id(found, vpc_ids):
+        ids = [id for vpc_id, id in found or [] if not vpc_ids or vpc_id in vpc_ids]
+        return ids[-1] if ids else None
 
-        # Set IDs
-        for subnet in subnets.values():
-            subnet.id = subnet_map.get(subnet.name)
-        for sgroup in sgroups.values():
-            sgroup.id = sgroup_map.get(sgroup.name)
+    for vpc_config in vpc_configs:
+        vpc_ids = None
+        if vpc_config.name:
+            vpc_ids = [id for vpc_id, id in vpcs.get(('ec2:Vpcs', vpc_config.name)) or []]
+        for subnet in vpc_config.subnets:
+            if subnet.name and not subnet.id:
+                subnet.id = get_id(subnets.get(('ec2:Subnets', subnet.name)), vpc_ids)
+        for sgroup in vpc_config.security_groups:
+            if sgroup.name and not sgroup.id:
+                sgroup.id = get_id(sgroups.get(('ec2:SecurityGroups', sgroup.name)), vpc_ids)
 
 
+@mapper.record
 class RequirementConfig:
     file = mapper.StringField()
 
@@ -142,6 +220,7 @@ class RequirementConfig:
         self.file = os.path.join(root, self.file)
 
 
+@mapper.record
 class BuildConfig:
     source = mapper.StringField(required=True)
     requirements = mapper.ListField(mapper.ClassField(RequirementConfig))
@@ -179,6 +258,7 @@ class BuildConfig:
             requirement.resolve(root)
 
 
+@mapper.record
 class TestConfig:
     source = mapper.StringField(required=True)
     requirements = mapper.ListField(mapper.ClassField(RequirementConfig))
@@ -191,6 +271,35 @@ class TestConfig:
             requirement.resolve(root)
 
 
+@mapper.record
+class ProvisionedConcurrencyConfig:
+    alias = mapper.StringField(default='live')
+    executions = mapper.IntField(required=True)
+
+    def validate(self):
+        if self.executions < 0:
+            return 'The number of provisioned executions cannot be negative.'
+
+
+@mapper.record
+class WarmupConfig:
+    rate = mapper.StringField(default='5 minutes')
+    concurrency = mapper.IntField(default=1)
+    payload = mapper.DictField()
+
+    def validate(self):
+        match = re.match(r'^([1-9]\d*) (minute|hour|day)(s?)$', self.rate)
+        if not match:
+            return 'The warmup rate must be in the format "5 minutes".'
+        # EventBridge wants "1 minute" but "5 minutes".
+        if (match.group(1) == '1') != (match.group(3) == ''):
+            return 'The warmup rate must use a singular unit for 1, such as "1 minute", ' \
+                'and a plural unit otherwise, such as "5 minutes".'
+        if not 1 <= self.concurrency <= 5:
+            return 'The warmup concurrency must be between 1 and 5.'
+
+
+@mapper.record('account_id')
 class DeployConfig:
     handler = mapper.StringField(required=True)
     role = mapper.StringField(required=True)
@@ -198,14 +307,26 @@ class DeployConfig:
     description = mapper.StringField(default='')
     memory_size = mapper.IntField(default=128)
     region = mapper.StringField()
+    regions = mapper.ListField(mapper.StringField(required=True))
     timeout = mapper.IntField(default=3)
+    s3_bucket = mapper.StringField()
+    s3_prefix = mapper.StringField(default='lambda-tools/')
+    reserved_concurrency = mapper.IntField()
 
     dead_letter_config = mapper.ClassField(DeadLetterConfig)
     environment = mapper.ClassField(EnvironmentConfig)
     kms_key = mapper.ClassField(KmsKeyConfig)
+    provisioned_concurrency = mapper.ClassField(ProvisionedConcurrencyConfig)
     tags = mapper.DictField(mapper.StringField(nullable=True))
     tracing_config = mapper.ClassField(TracingConfig)
     vpc_config = mapper.ClassField(VpcConfig)
+    warmup = mapper.ClassField(WarmupConfig)
+
+    def validate(self):
+        if self.region and self.regions:
+            return 'You must specify either region or regions, but not both.'
+        if self.reserved_concurrency is not None and self.reserved_concurrency < 0:
+            return 'The reserved concurrency cannot be negative.'
 
     def resolve(self, services):
         """
@@ -214,15 +335,14 @@ class DeployConfig:
         @param services:
             The factoryfactory.ServiceLocator instance used to locate things.
         """
-        session = services.get(boto3.Session, region_name=self.region)
-        self.region = self.region or session.region_name
-        self.account_id = session.client('sts').get_caller_identity().get('Account')
+        clients, self.region, self.account_id, cache = \
+            get_resolution_context(services, self.region)
         if self.dead_letter_config:
             self.dead_letter_config.resolve(self.account_id, self.region)
         if self.kms_key:
-            self.kms_key.resolve(session.client('kms'))
+            self.kms_key.resolve(clients.client('kms', self.region), cache)
         if self.vpc_config:
-            self.vpc_config.resolve(session.client('ec2'))
+            self.vpc_config.resolve(clients.client('ec2', self.region), cache)
         # Forces the role name into ARN format.
         if not self.role.startswith('arn:aws:iam'):
             self.role = 'arn:aws:iam::{0}:role/{1}'.format(self.account_id, self.role)
@@ -231,6 +351,68 @@ class DeployConfig:
             self.environment.resolve(services.get(os.environ))
 
 
+def get_resolution_context(services, region):
+    """
+    Gets what is needed to resolve names in a given region.
+
+    @param services
+        The factoryfactory.ServiceLocator instance used to locate things.
+    @param region
+        The region, or None for the default region.
+    @returns
+        A tuple of (client pool, region, account ID, scoped resolution cache).
+    """
+    clients = services.get(aws.ClientPool)
+    region = region or clients.region_name
+    cache = services.get(aws.ResolutionCache)
+    account_id = cache.get(('', region, 'sts:GetCallerIdentity'),
+        lambda: clients.client('sts', region).get_caller_identity().get('Account'),
+        persist=False
+    )
+    return clients, region, account_id, cache.scoped(account_id, region)
+
+
+def resolve_all_vpc_configs(services, deploy_configs):
+    """
+    Resolves the VPC configurations of a number of functions before they are
+    deployed, with one batch of EC2 queries per region.
+
+    @param services
+        The factoryfactory.ServiceLocator instance used to locate things.
+    @param deploy_configs
+        A list of DeployConfig instances.
+    """
+    by_region = {}
+    for deploy in deploy_configs:
+        if deploy.vpc_config:
+            by_region.setdefault(deploy.region, []).append(deploy.vpc_config)
+
+    def resolve_region(region):
+        clients, resolved_region, account_id, cache = get_resolution_context(services, region)
+        resolve_vpc_configs(clients.client('ec2', resolved_region), by_region[region], cache)
+
+    if len(by_region) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(by_region)) as executor:
+            list(executor.map(resolve_region, by_region))
+    else:
+        for region in by_region:
+            resolve_region(region)
+
+
+@mapper.record
+class ServeConfig:
+    path = mapper.StringField()
+    concurrency = mapper.IntField()
+
+    def validate(self):
+        if self.path is not None and not self.path.startswith('/'):
+            return 'The serve path must start with a /.'
+        if self.concurrency is not None and self.concurrency < 1:
+            return 'The serve concurrency must be at least 1.'
+
+
+@mapper.record
 class FunctionConfig:
     runtime = mapper.ChoiceField(
         choices=[
@@ -240,45 +422,379 @@ class FunctionConfig:
             'java8',
             'python2.7',
             'python3.6',
+            'python3.7',
+            'python3.8',
+            'python3.9',
+            'python3.10',
+            'python3.11',
+            'python3.12',
             'dotnetcore1.0',
             'nodejs4.3-edge'
         ],
         default='python3.6'
     )
+    architecture = mapper.ChoiceField(choices=['x86_64', 'arm64'], default='x86_64')
     build = mapper.ClassField(BuildConfig, required=True)
     test = mapper.ClassField(TestConfig)
     deploy = mapper.ClassField(DeployConfig)
+    serve = mapper.ClassField(ServeConfig)
 
     x = __builtins__
 
+    # The runtimes that AWS offers on arm64.
+    ARM64_RUNTIMES = ['python3.8', 'python3.9', 'python3.10', 'python3.11', 'python3.12']
+
+    def validate(self):
+        if self.architecture == 'arm64' and self.runtime not in self.ARM64_RUNTIMES:
+            return 'The {0} runtime is not available on arm64.'.format(self.runtime)
+        # The warmup shim is a Python module.
+        if self.deploy and self.deploy.warmup and not self.runtime.startswith('python'):
+            return 'Warmup is only supported for Python runtimes.'
+
+@mapper.record('data', 'filename', 'raw_data', 'root', 'roots')
 class Configuration:
     version = mapper.IntField(default=1)
-    functions = mapper.DictField(mapper.ClassField(FunctionConfig), required=True)
+    # Each function is only parsed when it is first used.
+    functions = mapper.DictField(mapper.ClassField(FunctionConfig), default=None, lazy=True)
+    include = mapper.ListField(mapper.StringField())
     root = ''
 
-    def get_functions(self, names):
-        if not names:
-            return self.functions
+    def validate(self):
+        if self.functions is None and not self.include:
+            return 'Required value "functions" was not provided.'
+
+    def get_root(self, name):
+        """
+        Gets the directory relative to which the paths in a function's
+        configuration are resolved: that of the file in which it is defined.
+        """
+        relative = self.roots.get(name) if self.roots else None
+        return os.path.join(self.root, relative) if relative else self.root
+
+    def _check_names(self, names):
         nonexistent = set(names).difference(self.functions)
         if nonexistent:
             raise ValueError(
                 'Undefined functions: ' + ', '.join(nonexistent)
             )
+
+    def get_functions(self, names):
+        if not names:
+            return self.functions
+        self._check_names(names)
         return dict([
             (name, self.functions[name])
             for name in names
         ])
 
+    def check_functions(self, names):
+        """
+        Parses the specified functions, or all of them if none are specified,
+        without stopping at the first one that is invalid.
+
+        @returns
+            A dict mapping the names of the invalid functions to their
+            MappingErrors.
+        """
+        if not names:
+            return self.functions.parse_all()
+        self._check_names(names)
+        errors = {}
+        for name in names:
+            try:
+                self.functions[name]
+            except mapper.MappingError as e:
+                errors[name] = e
+        return errors
+
 
 def upgrade(data):
     return data
 
-def load(filename):
-    with open(filename) as f:
-        raw_data = yaml.safe_load(f)
-        data = upgrade(raw_data)
-        config = mapper.parse(Configuration, data)
-        config.root = os.path.dirname(filename)
+def read_data(content, filename):
+    """
+    Parses the content of a configuration file, as JSON if the file name ends
+    in .json, or YAML otherwise.
+    """
+    if filename.lower().endswith('.json'):
+        return json.loads(content.decode('utf-8'))
+    return yaml.load(content, Loader=SafeLoader)
+
+
+_schema_fingerprint = None
+
+def get_schema_fingerprint():
+    """
+    Gets a hash of the fields of every configuration class, so that a cache
+    written by code with different configuration classes is not used even if
+    the version of lambda_tools is the same.
+    """
+    global _schema_fingerprint
+    if _schema_fingerprint is None:
+        sha256 = hashlib.sha256()
+        for name, cls in sorted(globals().items()):
+            if isinstance(cls, type) and '__fields__' in cls.__dict__:
+                fields = mapper.get_fields(cls)
+                sha256.update('{0}({1});'.format(name, ','.join([
+                    key + ':' + type(fields[key]).__name__ for key in sorted(fields)
+                ])).encode('utf-8'))
+        _schema_fingerprint = sha256.hexdigest()
+    return _schema_fingerprint
+
+
+def get_cache_key(content):
+    """
+    Gets the key under which the configuration parsed from a file is cached.
+    It changes whenever the file, the version of lambda_tools or the
+    configuration classes change.
+    """
+    return '{0}:{1}:{2}'.format(
+        VERSION, get_schema_fingerprint(), hashlib.sha256(content).hexdigest()
+    )
+
+
+def get_shards_key(root, shards):
+    """
+    Gets the key for the files included by a configuration, which changes
+    whenever any of them is added, removed, renamed or changed.
+
+    @param root
+        The directory containing the main configuration file.
+    @param shards
+        A list of (filename, content) tuples for the included files.
+    """
+    sha256 = hashlib.sha256()
+    for filename, content in shards:
+        sha256.update(os.path.relpath(filename, root).encode('utf-8') + b'\0')
+        sha256.update(hashlib.sha256(content).digest())
+    return sha256.hexdigest()
+
+
+def get_cache_file(filename):
+    """
+    Gets the name of the file in which to cache the configuration loaded
+    from a file. It is kept in the user's cache directory rather than
+    alongside the configuration, so that it can not be supplied along with
+    the project.
+    """
+    folder = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    name = hashlib.sha256(os.path.realpath(filename).encode('utf-8')).hexdigest()[:32]
+    return os.path.join(folder, 'lambda-tools', name + '.json')
+
+
+def read_cache(cache_file, key, get_include_key=None):
+    """
+    Reads the data for a configuration from the cache file, if the file
+    exists and it was written for the same key. Otherwise returns None.
+
+    @param get_include_key
+        A function that takes the include patterns of the cached
+        configuration and returns the key for the files they match, which
+        must also be the same.
+    @returns
+        A dict containing the data, the raw data (or None if it was the same
+        as the data) and the roots of the functions in included files.
+    """
+    try:
+        with open(cache_file, 'rb') as f:
+            header = json.loads(f.readline().decode('utf-8'))
+            if header['key'] != key:
+                return None
+            include = header['include']
+            include_key = get_include_key(include) if include and get_include_key else None
+            if header['include_key'] != include_key:
+                return None
+            return json.loads(f.read().decode('utf-8'))
+    except Exception:
+        # A missing, corrupt or outdated cache just means parsing again.
+        return None
+
+
+def write_cache(cache_file, key, include, include_key, entry):
+    """
+    Writes the data for a configuration to the cache file, as JSON. The
+    keys are written on the first line, so that they can be checked without
+    reading the rest of the file.
+
+    The data is only cached if it survives being converted to JSON
+    unchanged, which YAML's dates and non-string keys do not.
+    """
+    try:
+        content = json.dumps(entry)
+        if json.loads(content) != entry:
+            return
+        folder = os.path.dirname(os.path.abspath(cache_file))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder)
+        with os.fdopen(fd, 'w') as f:
+            f.write(json.dumps({
+                'key': key, 'include': include, 'include_key': include_key
+            }) + '\n')
+            f.write(content)
+        os.replace(tmp, cache_file)
+    except (IOError, OSError, TypeError, ValueError):
+        pass
+
+
+# ====== Included files ====== #
+
+def find_includes(filename, patterns):
+    """
+    Finds the files included by a configuration file.
+
+    @param filename
+        The name of the configuration file.
+    @param patterns
+        Its include patterns. These are globs relative to the file's
+        directory, in which ** matches any number of directories.
+    @returns
+        The names of the matching files, in the order of the patterns that
+        matched them, and sorted for each pattern.
+    """
+    root = os.path.dirname(filename)
+    found = []
+    seen = set([os.path.abspath(filename)])
+    for pattern in patterns:
+        for match in sorted(glob.glob(os.path.join(root, pattern), recursive=True)):
+            path = os.path.abspath(match)
+            if path not in seen and os.path.isfile(path):
+                seen.add(path)
+                found.append(match)
+    return found
+
+
+def _read_file(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+def read_shards(filename, patterns, executor):
+    """
+    Reads the files included by a configuration file, in parallel.
+
+    @returns
+        A list of (filename, content) tuples.
+    """
+    filenames = find_includes(filename, patterns)
+    return list(zip(filenames, executor.map(_read_file, filenames)))
+
+
+def _parse_shard(shard):
+    filename, content = shard
+    data = read_data(content, filename)
+    if not isinstance(data, dict) or 'functions' not in data:
+        raise mapper.MappingError(
+            'Included file {0} does not define any functions.'.format(filename))
+    if 'include' in data:
+        raise mapper.MappingError(
+            'Included file {0} can not include other files.'.format(filename))
+    data = upgrade(data)
+    try:
+        mapper.parse(Configuration, data)
+    except mapper.MappingError as e:
+        raise mapper.MappingError('{0}: {1}'.format(filename, e))
+    return data
+
+
+def merge_shards(config, data, root, shards, executor):
+    """
+    Parses the files included by a configuration, in parallel, and adds
+    their functions to it.
+
+    @param config
+        The Configuration parsed from the main file.
+    @param data
+        The data that it was parsed from.
+    @param root
+        The directory containing the main file.
+    @param shards
+        A list of (filename, content) tuples for the included files, as
+        returned by read_shards().
+    @param executor
+        The executor with which to parse the files.
+    @returns
+        The raw data for all the functions.
+    """
+    functions = dict(data.get('functions') or {})
+    sources = dict([(name, None) for name in functions])
+    roots = {}
+    for (filename, content), data in zip(shards, executor.map(_parse_shard, shards)):
+        for name in data['functions']:
+            if name in sources:
+                raise mapper.MappingError('Function "{0}" is defined in both {1} and {2}.'.format(
+                    name, sources[name] or 'the main configuration file', filename
+                ))
+            sources[name] = filename
+            functions[name] = data['functions'][name]
+            roots[name] = os.path.relpath(os.path.dirname(filename), root)
+
+    config.functions = mapper.get_fields(Configuration)['functions'].parse(functions, 'functions')
+    config.roots = roots
+    return functions
+
+
+# ====== Loading ====== #
+
+def load(filename, retain_data=False, cache_file=None):
+    """
+    Loads the configuration from a file, along with any files it includes.
+
+    @param filename
+        The name of the file.
+    @param retain_data
+        True to keep the data read from the file in the data and raw_data
+        attributes of the configuration, for commands which need it. By
+        default it is discarded once it has been parsed.
+    @param cache_file
+        The name of a file in which to cache the data read from the files,
+        such as the one returned by get_cache_file(), so that subsequent
+        loads of the same files do not need to parse them again. If None,
+        the configuration is not cached.
+    """
+    root = os.path.dirname(filename)
+    content = _read_file(filename)
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        shards = {}
+        def get_shards(include):
+            key = tuple(include)
+            if key not in shards:
+                shards[key] = read_shards(filename, include, executor)
+            return shards[key]
+
+        def get_include_key(include):
+            return get_shards_key(root, get_shards(include))
+
+        entry = None
+        if cache_file:
+            key = get_cache_key(content)
+            entry = read_cache(cache_file, key, get_include_key)
+
+        if entry is not None:
+            data = entry['data']
+            raw_data = entry['raw_data'] if entry['raw_data'] is not None else data
+            config = mapper.parse(Configuration, data)
+            config.roots = entry['roots']
+        else:
+            raw_data = read_data(content, filename)
+            data = upgrade(raw_data)
+            config = mapper.parse(Configuration, data)
+            if config.include:
+                functions = merge_shards(config, data, root, get_shards(config.include), executor)
+                merged = dict(data, functions=functions)
+                raw_data = merged if raw_data is data else dict(raw_data, functions=functions)
+                data = merged
+            if cache_file:
+                write_cache(cache_file, key, config.include,
+                    get_include_key(config.include) if config.include else None, {
+                        'data': data,
+                        'raw_data': raw_data if raw_data is not data else None,
+                        'roots': config.roots
+                    })
+
+    if retain_data:
         config.data = data
         config.raw_data = raw_data
-        return config
+    config.filename = filename
+    config.root = root
+    return config
@@ -2,16 +2,465 @@
 Functionality to instantiate and upload the lambda in AWS.
 """
 
+import base64
+import concurrent.futures
+import contextlib
+import copy
+import hashlib
+import heapq
+import itertools
+import json
+import mmap
 import os.path
+import random
+import threading
+import time
+import zipfile
 
 import boto3
+import boto3.s3.transfer
+import botocore.exceptions
 import factoryfactory
 
+from lambda_tools import aws
+from lambda_tools import build
 from lambda_tools import configuration
+from lambda_tools import warmup
 
 class DeployError(Exception):
     pass
 
+
+# ====== Throttling ====== #
+
+RETRYABLE_ERRORS = frozenset([
+    'TooManyRequestsException',
+    'ThrottlingException'
+])
+
+# A ResourceConflictException from one of these operations means that the
+# function is busy being updated, so the call can succeed if it is retried.
+# From anything else, such as CreateFunction or AddPermission, it means that
+# the resource already exists, so retrying it would only fail again.
+CONFLICT_RETRY_PREFIXES = ('Update', 'Publish', 'Put')
+
+
+def is_retryable(e):
+    """
+    Tests whether an AWS call that failed with a ClientError can be retried.
+    """
+    error = e.response.get('Error', {})
+    code = error.get('Code')
+    if code in RETRYABLE_ERRORS:
+        return True
+    if code == 'ResourceConflictException':
+        return (e.operation_name or '').startswith(CONFLICT_RETRY_PREFIXES) or \
+            'update is in progress' in (error.get('Message') or '').lower()
+    return False
+
+
+
+class Throttle:
+    """
+    An adaptive rate limiter shared by all the deployers in a run.
+
+    Every AWS call made by a deployer goes through call(). When AWS reports
+    that we are being throttled, or that a function is still being updated,
+    the minimum interval between calls is increased and the call is retried
+    after an exponential backoff with full jitter. Successful calls gradually
+    shrink the interval again, so that throughput settles at whatever the API
+    quotas allow.
+    """
+
+    def __init__(self, base_delay=0.25, max_delay=20.0, max_attempts=8):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.interval = 0.0
+        self._next_call = 0.0
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._next_call - now)
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay:
+            time.sleep(delay)
+
+    def _succeeded(self):
+        with self._lock:
+            self.interval *= 0.8
+            if self.interval < self.base_delay / 10:
+                self.interval = 0.0
+
+    def _throttled(self):
+        with self._lock:
+            self.interval = min(self.max_delay, max(self.interval * 2, self.base_delay))
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, method, **kwargs):
+        """
+        Calls an AWS client method, retrying it if it is throttled.
+        """
+        attempt = 0
+        while True:
+            self._wait()
+            try:
+                result = method(**kwargs)
+            except botocore.exceptions.ClientError as e:
+                attempt += 1
+                if not is_retryable(e) or attempt >= self.max_attempts:
+                    raise
+                self._throttled()
+                time.sleep(self.backoff(attempt))
+            else:
+                self._succeeded()
+                return result
+
+# ====== Waiting for updates to complete ====== #
+
+def is_ready(state):
+    """
+    Tests whether a function can be updated, given its configuration as
+    returned by get_function_configuration or any of the calls that change it.
+    """
+    return state.get('State') != 'Pending' and state.get('LastUpdateStatus') != 'InProgress'
+
+
+class UpdateWaiter(factoryfactory.Serviceable):
+    """
+    Waits for functions to finish being created or updated, so that the next
+    call to change them does not fail with a ResourceConflictException.
+
+    One instance is shared by all the deployers in a run. A single scheduler
+    thread polls every function that is being waited for, in rounds, backing
+    off exponentially for each function, and wakes each deployer as soon as
+    its function is ready. The thread stops when there is nothing left to
+    wait for.
+    """
+
+    def __init__(self, min_interval=0.5, max_interval=8.0, timeout=600):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.throttle = self.services.get(Throttle)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def watch(self, client, name):
+        """
+        Starts waiting for a function to be ready.
+
+        @param client
+            The lambda client for the function's region.
+        @param name
+            The name of the function.
+        @returns
+            A concurrent.futures.Future whose result is the function's
+            configuration once it is ready.
+        """
+        future = concurrent.futures.Future()
+        now = time.monotonic()
+        entry = [now + self.timeout, self.min_interval, client, name, future]
+        with self._condition:
+            heapq.heappush(self._queue, (now + self.min_interval, next(self._sequence), entry))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    def wait(self, client, name):
+        """
+        Waits for a function to be ready.
+
+        @returns
+            The function's configuration.
+        """
+        return self.watch(client, name).result()
+
+    def _get_due(self):
+        """
+        Waits until at least one function is due to be polled, then removes
+        all the ones that are due from the queue.
+        """
+        with self._condition:
+            while True:
+                if not self._queue:
+                    self._thread = None
+                    return None
+                now = time.monotonic()
+                if self._queue[0][0] <= now:
+                    break
+                self._condition.wait(self._queue[0][0] - now)
+            due = []
+            while self._queue and self._queue[0][0] <= now:
+                due.append(heapq.heappop(self._queue)[2])
+            return due
+
+    def _run(self):
+        while True:
+            due = self._get_due()
+            if due is None:
+                return
+            for entry in due:
+                self._poll(entry)
+
+    def _poll(self, entry):
+        deadline, interval, client, name, future = entry
+        try:
+            state = self.throttle.call(client.get_function_configuration, FunctionName=name)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        if is_ready(state):
+            future.set_result(state)
+            return
+        now = time.monotonic()
+        if now >= deadline:
+            future.set_exception(DeployError(
+                'Timed out waiting for {0} to be ready.'.format(name)
+            ))
+            return
+        entry[1] = min(self.max_interval, interval * 2)
+        with self._condition:
+            heapq.heappush(self._queue, (now + entry[1], next(self._sequence), entry))
+
+
+# ====== Configuration diffing ====== #
+
+def _normalise_setting(key, value):
+    """
+    Converts a configuration setting into a form which can be compared with
+    the same setting as reported by get_function_configuration.
+    """
+    if key == 'VpcConfig':
+        value = value or {}
+        return (
+            sorted(value.get('SubnetIds') or []),
+            sorted(value.get('SecurityGroupIds') or [])
+        )
+    elif key == 'Environment':
+        return (value or {}).get('Variables') or {}
+    elif key == 'DeadLetterConfig':
+        return (value or {}).get('TargetArn')
+    elif key == 'TracingConfig':
+        return (value or {}).get('Mode') or 'PassThrough'
+    elif key in ('Description', 'KMSKeyArn'):
+        return value or ''
+    else:
+        return value
+
+
+def get_configuration_changes(desired, remote):
+    """
+    Compares the desired configuration of a function with its current
+    configuration in AWS.
+
+    @param desired
+        The arguments for update_function_configuration.
+    @param remote
+        The configuration returned by get_function_configuration.
+    @returns
+        A dict containing only the settings that have changed.
+    """
+    return dict([
+        (key, value) for key, value in desired.items()
+        if key != 'FunctionName' and
+            _normalise_setting(key, value) != _normalise_setting(key, remote.get(key))
+    ])
+
+
+def get_tag_changes(desired, current):
+    """
+    Compares the desired tags of a function with its current tags.
+
+    @returns
+        A tuple of (tags to add or change, keys of tags to remove).
+    """
+    to_set = dict([
+        (key, value) for key, value in desired.items()
+        if current.get(key) != value
+    ])
+    to_remove = sorted([key for key in current if key not in desired])
+    return to_set, to_remove
+
+
+# ====== Package memory budget ====== #
+
+class PackageBudget:
+    """
+    Limits the total size of the packages that are held open for upload at
+    any one time, so that deploying many functions concurrently does not
+    multiply the amount of memory used.
+
+    A package that is larger than the whole budget is still allowed through,
+    but only when nothing else is in flight.
+    """
+
+    def __init__(self, limit=256 * 1024 * 1024):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def reserve(self, size):
+        with self._condition:
+            while self.limit and self.in_use and self.in_use + size > self.limit:
+                self._condition.wait()
+            self.in_use += size
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_use -= size
+                self._condition.notify_all()
+
+
+# ====== Multi-region deployment ====== #
+
+def get_regional_configs(func):
+    """
+    Splits the configuration of a function that is to be deployed to several
+    regions into one copy per region, each of which can be resolved and
+    deployed independently.
+
+    @returns
+        A list of FunctionConfig instances.
+    """
+    if not func.deploy or not func.deploy.regions:
+        return [func]
+    result = []
+    for region in func.deploy.regions:
+        regional = copy.deepcopy(func)
+        regional.deploy.region = region
+        regional.deploy.regions = []
+        result.append(regional)
+    return result
+
+
+def deploy_region(services, func, name, inventory=None, journal=None):
+    """
+    Deploys the configuration of a function for one region, recording the
+    outcome in the journal if there is one.
+    """
+    if not journal:
+        services.get(Deployer, func, name).deploy(inventory)
+        return
+    state = journal.get_state(name, func)
+    journal.record(state, journal.IN_PROGRESS)
+    try:
+        services.get(Deployer, func, name).deploy(inventory)
+    except Exception:
+        journal.record(state, journal.FAILED)
+        raise
+    journal.record(state, journal.DEPLOYED)
+
+
+def deploy_regions(services, funcs, name, inventory=None, journal=None):
+    """
+    Deploys the regional configurations of a function. If there is more than
+    one, they are deployed concurrently, so that a global rollout takes only
+    as long as the slowest region.
+
+    @param services
+        The factoryfactory.ServiceLocator instance used to locate things.
+    @param funcs
+        The list returned by get_regional_configs().
+    @param name
+        The name of the function.
+    @param inventory
+        The FunctionInventory to use to find out about existing functions,
+        if any.
+    @param journal
+        The DeployJournal in which to record the outcome, if any.
+    """
+    if len(funcs) == 1:
+        deploy_region(services, funcs[0], name, inventory, journal)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+    failed = []
+    def deploy(func):
+        try:
+            deploy_region(services, func, name, inventory, journal)
+        except Exception as e:
+            failed.append('{0} ({1})'.format(func.deploy.region, e))
+    with ThreadPoolExecutor(max_workers=len(funcs)) as executor:
+        list(executor.map(deploy, funcs))
+    if failed:
+        raise DeployError('{0} could not be deployed to: {1}'.format(
+            name, ', '.join(sorted(failed))
+        ))
+
+
+# ====== Remote state discovery ====== #
+
+class FunctionInventory(factoryfactory.Serviceable):
+    """
+    Discovers all the functions that already exist in a region, together with
+    their configuration and tags, using a handful of paginated calls rather
+    than probing each function individually.
+
+    Each region is discovered the first time it is asked for, and the result
+    is shared by all the deployers in the run.
+    """
+
+    def __init__(self):
+        self._regions = {}
+        self._lock = threading.Lock()
+        self._region_locks = {}
+
+    def get(self, region):
+        """
+        Gets the functions in a region.
+
+        @returns
+            A dict mapping function names to dicts in the same format as
+            returned by get_function: Configuration and Tags. Tags is None if
+            the tags could not be discovered.
+        """
+        with self._lock:
+            region_lock = self._region_locks.setdefault(region, threading.Lock())
+        with region_lock:
+            if region not in self._regions:
+                self._regions[region] = self._discover(region)
+        return self._regions[region]
+
+    def _discover(self, region):
+        clients = self.services.get(aws.ClientPool)
+        functions = {}
+        paginator = clients.client('lambda', region).get_paginator('list_functions')
+        for page in paginator.paginate():
+            for function in page['Functions']:
+                functions[function['FunctionName']] = {
+                    'Configuration': function,
+                    'Tags': {}
+                }
+
+        # The tags come from the Resource Groups Tagging API. If we aren't
+        # allowed to use it, the deployers will have to ask for them.
+        paginator = clients.client('resourcegroupstaggingapi', region) \
+            .get_paginator('get_resources')
+        try:
+            for page in paginator.paginate(ResourceTypeFilters=['lambda:function']):
+                for resource in page['ResourceTagMappingList']:
+                    name = resource['ResourceARN'].split(':')[6]
+                    if name in functions:
+                        functions[name]['Tags'] = dict([
+                            (tag['Key'], tag['Value']) for tag in resource['Tags']
+                        ])
+        except botocore.exceptions.ClientError:
+            for function in functions.values():
+                function['Tags'] = None
+        return functions
+
+
 class Deployer(factoryfactory.Serviceable):
 
     def __init__(self, func, name):
@@ -20,15 +469,150 @@ class Deployer(factoryfactory.Serviceable):
 
         self.func = func
         self.name = name
-        self._session = self.services.get(boto3.Session)
-        self.region = self.func.deploy.region or self._session.region_name
+        self._clients = self.services.get(aws.ClientPool)
+        self.region = self.func.deploy.region or self._clients.region_name
+        self.throttle = self.services.get(Throttle)
+        self.package_budget = self.services.get(PackageBudget)
+        self.waiter = self.services.get(UpdateWaiter)
+        self.remote = None
+        self.remote_tags = None
+        self.remote_concurrency = None
+        self.version = None
 
     def _get_aws_client(self, service_name):
-        return self._session.client(service_name, self.region)
+        return self._clients.client(service_name, self.region)
+
+    def _call(self, aws, operation, **kwargs):
+        return self.throttle.call(getattr(aws, operation), **kwargs)
+
+    def _wait_until_ready(self, aws, state):
+        """
+        Waits for the function to be ready to be changed, if the state
+        reported by AWS says that it is still being created or updated.
+
+        Functions found by ListFunctions have no state at all, so in that
+        case it is fetched first.
+
+        @returns
+            The function's latest state.
+        """
+        if 'State' not in state and 'LastUpdateStatus' not in state:
+            state = self._call(aws, 'get_function_configuration', FunctionName=self.name)
+        if is_ready(state):
+            return state
+        return self.waiter.wait(aws, self.name)
+
+    def _wait_for_change(self, aws, result):
+        """
+        Waits for a change that we have made to the function to complete, and
+        checks that it succeeded.
+
+        @param result
+            The result of the call that made the change.
+        """
+        state = self._wait_until_ready(aws, result)
+        if state.get('State') == 'Failed' or state.get('LastUpdateStatus') == 'Failed':
+            raise DeployError('{0} could not be updated: {1}'.format(
+                self.name,
+                state.get('LastUpdateStatusReason') or state.get('StateReason') or 'unknown error'
+            ))
+        return state
 
-    def _get_code(self):
-        with open(self.func.build.package, 'rb') as data:
-            return data.read()
+    @contextlib.contextmanager
+    def _open_code(self):
+        """
+        Opens the package for upload as a read-only memory-mapped buffer, which
+        botocore can encode without first copying it into a bytes object.
+        The package's size counts against the package budget until it is
+        closed.
+
+        Packages that are uploaded to S3 are streamed from the file instead,
+        so in that case this yields None, and _upload_package() reserves
+        their share of the budget.
+        """
+        if self.func.deploy.s3_bucket:
+            yield None
+            return
+        package = self.func.build.package
+        size = os.path.getsize(package)
+        with self.package_budget.reserve(size), open(package, 'rb') as f:
+            if not size:
+                yield b''
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    def _get_code_sha256(self):
+        return build.get_code_sha256(self.func.build.package)
+
+
+    # ====== Upload the package to S3 ====== #
+
+    S3_TRANSFER_CONFIG = boto3.s3.transfer.TransferConfig(
+        multipart_threshold=8 * 1024 * 1024,
+        multipart_chunksize=8 * 1024 * 1024,
+        max_concurrency=8
+    )
+
+    def _get_s3_key(self):
+        """
+        Gets the S3 key for the package. This is based on the package's hash,
+        so identical packages are only uploaded once, whichever functions
+        they are deployed to.
+        """
+        digest = base64.b64decode(self._get_code_sha256())
+        extension = os.path.splitext(self.func.build.package)[1] or '.zip'
+        return (self.func.deploy.s3_prefix or '') + digest.hex() + extension
+
+    def _upload_package(self, s3, bucket, key):
+        """
+        Uploads the package to S3. The transfer holds up to max_concurrency
+        parts in memory at once, so that much counts against the package
+        budget while it is in progress.
+        """
+        package = self.func.build.package
+        config = self.S3_TRANSFER_CONFIG
+        buffered = min(os.path.getsize(package), config.multipart_chunksize * config.max_concurrency)
+        with self.package_budget.reserve(buffered):
+            s3.upload_file(package, bucket, key, Config=config)
+
+    def _upload_to_s3(self):
+        """
+        Uploads the package to S3, unless it is already there.
+
+        @returns
+            The S3Bucket and S3Key arguments for the Lambda API.
+        """
+        bucket = self.func.deploy.s3_bucket.format(region=self.region)
+        key = self._get_s3_key()
+        s3 = self._get_aws_client('s3')
+        try:
+            self._call(s3, 'head_object', Bucket=bucket, Key=key)
+        except botocore.exceptions.ClientError as e:
+            # Without s3:ListBucket, S3 answers 403 rather than 404 for a
+            # missing key, so the package is not known to be there either way.
+            if e.response.get('Error', {}).get('Code') not in \
+                    ('403', '404', 'AccessDenied', 'Forbidden', 'NoSuchKey', 'NotFound'):
+                raise
+            self._upload_package(s3, bucket, key)
+        return {
+            'S3Bucket': bucket,
+            'S3Key': key
+        }
+
+    def _get_code_location(self, code):
+        """
+        Gets the arguments that tell the Lambda API where to find the code.
+
+        @param code
+            The buffer returned by _open_code().
+        """
+        if self.func.deploy.s3_bucket:
+            return self._upload_to_s3()
+        else:
+            return {
+                'ZipFile': code
+            }
 
 
     # ====== Get function configuration data ====== #
@@ -40,7 +624,7 @@ class Deployer(factoryfactory.Serviceable):
             'FunctionName': self.name,
             'Runtime': cfg.runtime,
             'Role': deploy.role,
-            'Handler': deploy.handler,
+            'Handler': warmup.SHIM_HANDLER if deploy.warmup else deploy.handler,
             'Description': deploy.description,
             'Timeout': deploy.timeout,
             'MemorySize': deploy.memory_size
@@ -63,8 +647,11 @@ class Deployer(factoryfactory.Serviceable):
 
         if deploy.environment:
             result['Environment'] = {
-                'Variables': deploy.environment.variables
+                'Variables': dict(deploy.environment.variables)
             }
+        if deploy.warmup:
+            result.setdefault('Environment', { 'Variables': {} })
+            result['Environment']['Variables'][warmup.HANDLER_VARIABLE] = deploy.handler
         if deploy.kms_key:
             result['KMSKeyArn'] = deploy.kms_key.arn
 
@@ -77,25 +664,33 @@ class Deployer(factoryfactory.Serviceable):
 
     # ====== Get function creation data ====== #
 
-    def _get_function_creation_data(self):
+    def _get_function_creation_data(self, code):
         result = self._get_function_configuration_data()
         result['Publish'] = True
-        result['Code'] = {
-            'ZipFile': self._get_code()
-        }
-        if self.func.deploy.tags:
-            result['Tags'] = self.func.deploy.tags
+        result['Architectures'] = [ self.func.architecture ]
+        result['Code'] = self._get_code_location(code)
+        tags = self._get_tags()
+        if tags:
+            result['Tags'] = tags
         return result
 
 
+    # ====== Get function tags ====== #
+
+    def _get_tags(self):
+        return dict([
+            (key, value or '') for key, value in (self.func.deploy.tags or {}).items()
+        ])
+
+
     # ====== Get function code ====== #
 
-    def _get_function_code(self):
-        return {
-            'FunctionName': self.name,
-            'ZipFile': self._get_code(),
-            'Publish': True
-        }
+    def _get_function_code(self, code):
+        result = self._get_code_location(code)
+        result['FunctionName'] = self.name
+        result['Architectures'] = [ self.func.architecture ]
+        result['Publish'] = True
+        return result
 
 
     # ====== Create a function ====== #
@@ -104,10 +699,13 @@ class Deployer(factoryfactory.Serviceable):
         """
         Creates the lambda
         """
-        data = self._get_function_creation_data()
         aws = self._get_aws_client('lambda')
-        result = aws.create_function(**data)
+        with self._open_code() as code:
+            data = self._get_function_creation_data(code)
+            result = self._call(aws, 'create_function', **data)
         self.arn = result['FunctionArn']
+        self.version = result.get('Version')
+        self._wait_for_change(aws, result)
 
 
     # ====== Update a function ====== #
@@ -118,46 +716,310 @@ class Deployer(factoryfactory.Serviceable):
         """
         aws = self._get_aws_client('lambda')
 
-        # Update the configuration data
+        remote = self.remote or {}
+
+        # Update the configuration data, sending only what has changed. If an
+        # earlier update is still in progress, it has to finish first.
         data = self._get_function_configuration_data()
-        result = aws.update_function_configuration(**data)
-        self.arn = result['FunctionArn']
+        changes = get_configuration_changes(data, remote)
+        if changes:
+            self._wait_until_ready(aws, remote)
+            changes['FunctionName'] = self.name
+            result = self._call(aws, 'update_function_configuration', **changes)
+            self.arn = result['FunctionArn']
+            self._wait_for_change(aws, result)
+        else:
+            self.arn = remote['FunctionArn']
 
-        # Update function code
-        code = self._get_function_code()
-        aws.update_function_code(**code)
+        # Update function code, unless the package is already there, in which
+        # case we only need to publish the configuration changes (if any).
+        # The architecture can only be changed along with the code.
+        remote_sha256 = remote.get('CodeSha256')
+        remote_architectures = remote.get('Architectures') or ['x86_64']
+        if remote_sha256 and remote_sha256 == self._get_code_sha256() and \
+                remote_architectures == [ self.func.architecture ]:
+            if changes:
+                result = self._call(aws, 'publish_version', FunctionName=self.name)
+                self.version = result.get('Version')
+        else:
+            if not changes:
+                self._wait_until_ready(aws, remote)
+            with self._open_code() as code:
+                data = self._get_function_code(code)
+                result = self._call(aws, 'update_function_code', **data)
+            self.version = result.get('Version')
+            self._wait_for_change(aws, result)
 
-        # Update the tags
-        tags = aws.list_tags(Resource=self.arn)
-        tags_to_clear = [x for x in tags['Tags'] if x not in self.func.deploy.tags]
+        # Update the tags, sending only what has changed.
+        current_tags = self.remote_tags
+        if current_tags is None:
+            current_tags = self._call(aws, 'list_tags', Resource=self.arn)['Tags']
+        tags_to_set, tags_to_clear = get_tag_changes(self._get_tags(), current_tags)
         if tags_to_clear:
-            aws.untag_resource(Resource=self.arn, TagKeys=tags_to_clear)
-        if self.func.deploy.tags:
-            aws.tag_resource(Resource=self.arn, Tags=self.func.deploy.tags)
+            self._call(aws, 'untag_resource', Resource=self.arn, TagKeys=tags_to_clear)
+        if tags_to_set:
+            self._call(aws, 'tag_resource', Resource=self.arn, Tags=tags_to_set)
+
+
+    # ====== Update concurrency settings ====== #
+
+    def _is_not_found(self, e):
+        return e.response.get('Error', {}).get('Code') in (
+            'ResourceNotFoundException',
+            'ProvisionedConcurrencyConfigNotFoundException'
+        )
+
+    def update_reserved_concurrency(self):
+        """
+        Sets the function's reserved concurrency, if it is configured and has
+        changed.
+        """
+        desired = self.func.deploy.reserved_concurrency
+        if desired is None:
+            return
+        aws = self._get_aws_client('lambda')
+        current = self.remote_concurrency
+        if current is None:
+            current = self._call(aws, 'get_function_concurrency', FunctionName=self.name)
+        if current.get('ReservedConcurrentExecutions') != desired:
+            self._call(aws, 'put_function_concurrency',
+                FunctionName=self.name, ReservedConcurrentExecutions=desired)
+
+    def update_alias(self):
+        """
+        Points the alias for the provisioned concurrency at the version that
+        has just been published, creating the alias if necessary.
+        """
+        aws = self._get_aws_client('lambda')
+        alias = self.func.deploy.provisioned_concurrency.alias
+        try:
+            current = self._call(aws, 'get_alias', FunctionName=self.name, Name=alias)
+        except botocore.exceptions.ClientError as e:
+            if not self._is_not_found(e):
+                raise
+            current = None
+
+        version = self.version
+        if current is None:
+            if version is None:
+                # Nothing new was published, so use the latest version.
+                version = self._call(aws, 'publish_version', FunctionName=self.name)['Version']
+            self._call(aws, 'create_alias',
+                FunctionName=self.name, Name=alias, FunctionVersion=version)
+        elif version is not None and current.get('FunctionVersion') != version:
+            self._call(aws, 'update_alias',
+                FunctionName=self.name, Name=alias, FunctionVersion=version)
+
+    def update_provisioned_concurrency(self):
+        """
+        Sets the provisioned concurrency of the function's alias, if it is
+        configured and has changed. Setting it to zero removes it.
+        """
+        provisioned = self.func.deploy.provisioned_concurrency
+        if not provisioned:
+            return
+        self.update_alias()
+        aws = self._get_aws_client('lambda')
+        try:
+            current = self._call(aws, 'get_provisioned_concurrency_config',
+                FunctionName=self.name, Qualifier=provisioned.alias
+            ).get('RequestedProvisionedConcurrentExecutions')
+        except botocore.exceptions.ClientError as e:
+            if not self._is_not_found(e):
+                raise
+            current = 0
+        if current == provisioned.executions:
+            return
+        if provisioned.executions:
+            self._call(aws, 'put_provisioned_concurrency_config',
+                FunctionName=self.name, Qualifier=provisioned.alias,
+                ProvisionedConcurrentExecutions=provisioned.executions)
+        else:
+            self._call(aws, 'delete_provisioned_concurrency_config',
+                FunctionName=self.name, Qualifier=provisioned.alias)
+
+
+    # ====== Warm-up schedule ====== #
+
+    WARMUP_STATEMENT_ID = 'ltools-warmup'
+
+    def _get_warmup_rule_name(self):
+        name = 'ltools-warmup-' + self.name
+        if len(name) > 64:
+            digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]
+            name = name[:55] + '-' + digest
+        return name
+
+    def _get_warmup_targets(self):
+        settings = self.func.deploy.warmup
+        payload = dict(settings.payload or {})
+        payload[warmup.WARMUP_KEY] = { 'concurrency': settings.concurrency }
+        payload = json.dumps(payload, sort_keys=True)
+        return [
+            {
+                'Id': 'ltools-warmup-{0}'.format(index + 1),
+                'Arn': self.arn,
+                'Input': payload
+            }
+            for index in range(settings.concurrency)
+        ]
+
+    def _get_warmup_rule(self, events, rule_name):
+        try:
+            return self._call(events, 'describe_rule', Name=rule_name)
+        except botocore.exceptions.ClientError as e:
+            if not self._is_not_found(e):
+                raise
+            return None
+
+    def _has_warmup_permission(self, aws):
+        try:
+            policy = self._call(aws, 'get_policy', FunctionName=self.name)['Policy']
+        except botocore.exceptions.ClientError as e:
+            if not self._is_not_found(e):
+                raise
+            return False
+        return any(
+            statement.get('Sid') == self.WARMUP_STATEMENT_ID
+            for statement in json.loads(policy).get('Statement', [])
+        )
+
+    def update_warmup(self):
+        """
+        Creates or updates the EventBridge rule which sends warm-up events to
+        the function on a schedule, and allows it to invoke the function. Only
+        the settings that have changed are sent.
+
+        If warm-up is no longer configured but the function was being warmed
+        up (it still has the shim as its handler), the rule is removed.
+        """
+        settings = self.func.deploy.warmup
+        if not settings:
+            if (self.remote or {}).get('Handler') == warmup.SHIM_HANDLER:
+                self.remove_warmup()
+            return
+
+        aws = self._get_aws_client('lambda')
+        events = self._get_aws_client('events')
+        rule_name = self._get_warmup_rule_name()
+        expression = 'rate({0})'.format(settings.rate)
+        rule = self._get_warmup_rule(events, rule_name)
+        if rule is None or rule.get('ScheduleExpression') != expression \
+                or rule.get('State') != 'ENABLED':
+            rule_arn = self._call(events, 'put_rule',
+                Name=rule_name,
+                ScheduleExpression=expression,
+                State='ENABLED',
+                Description='Keeps the {0} function warm.'.format(self.name)
+            )['RuleArn']
+        else:
+            rule_arn = rule['Arn']
+
+        desired = self._get_warmup_targets()
+        if rule is None:
+            current = []
+        else:
+            current = self._call(events, 'list_targets_by_rule', Rule=rule_name)['Targets']
+        current = dict([(target['Id'], target) for target in current])
+        to_remove = sorted(set(current) - set([target['Id'] for target in desired]))
+        to_put = [
+            target for target in desired
+            if dict([
+                (key, current.get(target['Id'], {}).get(key)) for key in target
+            ]) != target
+        ]
+        if to_remove:
+            self._call(events, 'remove_targets', Rule=rule_name, Ids=to_remove)
+        if to_put:
+            self._call(events, 'put_targets', Rule=rule_name, Targets=to_put)
+
+        if not self._has_warmup_permission(aws):
+            self._call(aws, 'add_permission',
+                FunctionName=self.name,
+                StatementId=self.WARMUP_STATEMENT_ID,
+                Action='lambda:InvokeFunction',
+                Principal='events.amazonaws.com',
+                SourceArn=rule_arn
+            )
+
+    def remove_warmup(self):
+        """
+        Removes the warm-up rule and its permission to invoke the function.
+        """
+        aws = self._get_aws_client('lambda')
+        events = self._get_aws_client('events')
+        rule_name = self._get_warmup_rule_name()
+        if self._get_warmup_rule(events, rule_name) is not None:
+            targets = self._call(events, 'list_targets_by_rule', Rule=rule_name)['Targets']
+            if targets:
+                self._call(events, 'remove_targets',
+                    Rule=rule_name, Ids=[target['Id'] for target in targets])
+            self._call(events, 'delete_rule', Name=rule_name)
+        if self._has_warmup_permission(aws):
+            self._call(aws, 'remove_permission',
+                FunctionName=self.name, StatementId=self.WARMUP_STATEMENT_ID)
 
 
     # ====== Deploy ====== #
 
-    def deploy(self):
+    @staticmethod
+    def _has_warmup_shim(package):
+        """
+        Checks whether a package contains the warmup shim, without which the
+        function could not be invoked once its handler has been switched.
+        """
+        try:
+            with zipfile.ZipFile(package) as zip:
+                return warmup.MODULE_NAME + '.py' in zip.namelist()
+        except zipfile.BadZipFile:
+            return False
+
+    def deploy(self, inventory=None):
+        """
+        Deploys the lambda, creating it if it does not exist.
+
+        @param inventory
+            The FunctionInventory to use to find out whether the function
+            exists. If not specified, AWS is asked about this function alone.
+        """
         config = self.services.get(configuration.Configuration)
-        self.func.build.resolve(config.root)
+        self.func.build.resolve(config.get_root(self.name))
         if not os.path.isfile(self.func.build.package):
             raise DeployError(self.name + ' has not yet been built. Please run ltools build ' + self.name)
+        if self.func.deploy.warmup and not self._has_warmup_shim(self.func.build.package):
+            raise DeployError(self.name + ' was built without the warmup shim. ' +
+                'Please rebuild it with ltools build ' + self.name)
         self.func.deploy.resolve(self.services)
         aws = self._get_aws_client('lambda')
 
-        def exists():
+        def get_remote():
             """
-            Tests to see if the lambda exists.
+            Gets the current configuration and tags of the lambda, or None if
+            it does not exist.
             """
-            import botocore.exceptions
             try:
-                aws.get_function_configuration(FunctionName=self.name)
-                return True
-            except botocore.exceptions.ClientError:
-                return False
+                return self._call(aws, 'get_function', FunctionName=self.name)
+            except botocore.exceptions.ClientError as e:
+                if e.response.get('Error', {}).get('Code') == 'ResourceNotFoundException':
+                    return None
+                raise
 
-        if exists():
+        if inventory:
+            remote = inventory.get(self.region).get(self.name)
+        else:
+            remote = get_remote()
+        if remote is not None:
+            self.remote = remote['Configuration']
+            self.remote_tags = remote.get('Tags')
+            if not inventory:
+                if self.remote_tags is None:
+                    self.remote_tags = {}
+                self.remote_concurrency = remote.get('Concurrency') or {}
             self.update()
         else:
+            self.remote_concurrency = {}
             self.create()
+
+        self.update_reserved_concurrency()
+        self.update_provisioned_concurrency()
+        self.update_warmup()
@@ -0,0 +1,817 @@
+"""
+A stateful, in-process fake of the parts of AWS that Lambda Tools talks to,
+for benchmarking and testing deployments without an AWS account.
+
+The fake keeps track of functions, their versions, aliases, tags, update
+states and concurrency settings, along with the resources that names are
+resolved to. It can inject latency, throttling and update conflicts, and it
+counts the calls made to it, so that changes to the way functions are
+deployed can be measured offline.
+
+To use it, register a FakeSession in place of boto3.Session:
+
+    backend = fake.register(services, latency=0.05)
+"""
+
+import base64
+import collections
+import hashlib
+import json
+import random
+import threading
+import time
+
+import boto3
+import botocore.exceptions
+
+
+def client_error(operation, code, message, status=400):
+    return botocore.exceptions.ClientError({
+        'Error': { 'Code': code, 'Message': message },
+        'ResponseMetadata': { 'HTTPStatusCode': status }
+    }, operation)
+
+
+def _pascal_case(name):
+    return ''.join(part.title() for part in name.split('_'))
+
+
+def _sha256(data):
+    return base64.b64encode(hashlib.sha256(data).digest()).decode('ascii')
+
+
+# ====== Backend ====== #
+
+class FakeBackend:
+    """
+    Holds the state of the fake AWS account, and decides how each call to it
+    behaves.
+
+    @param latency
+        The time, in seconds, that every call takes.
+    @param jitter
+        The maximum random time, in seconds, added to the latency.
+    @param throttle_rate
+        The probability of any call that is retried failing with
+        TooManyRequestsException.
+    @param rate_limit
+        The maximum number of calls per second that are allowed before calls
+        that are retried are throttled, or None for no limit.
+    @param conflict_rate
+        The probability of a call that changes a function failing with
+        ResourceConflictException.
+    @param update_duration
+        How long, in seconds, a function stays Pending after it is created,
+        or InProgress after it is updated. Changing it again in that time
+        fails with ResourceConflictException, as in AWS.
+    @param page_size
+        The number of items returned in each page of paginated results.
+    """
+
+    # The calls that Lambda Tools does not make through its Throttle, and so
+    # does not retry: those that resolve names, discover functions and upload
+    # packages. In AWS, botocore's own retries cover them, which the fake
+    # does not imitate, so no errors are injected into them.
+    UNRETRIED = ('ec2', 'kms', 'sts', 'tag', 'lambda:ListFunctions', 's3:PutObject')
+
+    def __init__(self, latency=0.0, jitter=0.0, throttle_rate=0.0, rate_limit=None,
+            conflict_rate=0.0, update_duration=0.0, page_size=50,
+            account_id='123456789012', region_name='us-east-1', seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.conflict_rate = conflict_rate
+        self.update_duration = update_duration
+        self.page_size = page_size
+        self.account_id = account_id
+        self.region_name = region_name
+        self.random = random.Random(seed)
+
+        self.calls = collections.Counter()
+        self.errors = collections.Counter()
+        # Every call, in order, as a tuple of its name and arguments.
+        self.log = []
+        # The error codes with which calls always fail, keyed by name, such as
+        # { 'tag:GetResources': 'AccessDeniedException' }.
+        self.failures = {}
+        self.functions = {}
+        self.s3_objects = {}
+        self.kms_keys = {}
+        self.vpcs = {}
+        self.rules = {}
+        self.lock = threading.RLock()
+        self._window = collections.deque()
+
+    # ------ Behaviour ------ #
+
+    def call(self, service, operation, kwargs=None, mutates=False):
+        """
+        Records a call, waits for it to take its time, and decides whether
+        it fails, is throttled or conflicts.
+        """
+        name = service + ':' + _pascal_case(operation)
+        retried = service not in self.UNRETRIED and name not in self.UNRETRIED
+        with self.lock:
+            self.calls[name] += 1
+            self.log.append((name, kwargs or {}))
+            failure = self.failures.get(name)
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            throttled = retried and (self._over_rate_limit() or
+                (self.throttle_rate and self.random.random() < self.throttle_rate))
+            conflict = retried and mutates and self.conflict_rate and \
+                self.random.random() < self.conflict_rate
+        if delay:
+            time.sleep(delay)
+        if failure:
+            self._fail(name, client_error(_pascal_case(operation), failure, failure, 403))
+        if throttled:
+            self._fail(name, client_error(_pascal_case(operation),
+                'TooManyRequestsException', 'Rate exceeded', 429))
+        if conflict:
+            self._fail(name, client_error(_pascal_case(operation),
+                'ResourceConflictException', 'The operation cannot be performed at this time. '
+                'An update is in progress for the resource.', 409))
+
+    def _over_rate_limit(self):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        while self._window and self._window[0] <= now - 1.0:
+            self._window.popleft()
+        if len(self._window) >= self.rate_limit:
+            return True
+        self._window.append(now)
+        return False
+
+    def _fail(self, name, error):
+        with self.lock:
+            self.errors[name] += 1
+        raise error
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls.clear()
+            self.errors.clear()
+            del self.log[:]
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    # ------ Resources ------ #
+
+    def arn(self, service, region, resource):
+        return 'arn:aws:{0}:{1}:{2}:{3}'.format(service, region, self.account_id, resource)
+
+    def add_kms_key(self, alias, region_name=None):
+        region = region_name or self.region_name
+        key_id = hashlib.md5(alias.encode('utf-8')).hexdigest()
+        self.kms_keys[(region, 'alias/' + alias)] = self.arn('kms', region, 'key/' + key_id)
+
+    def add_vpc(self, name, subnets=(), security_groups=(), region_name=None):
+        """
+        Adds a VPC, with subnets and security groups with the given names.
+        """
+        region = region_name or self.region_name
+        def make_id(prefix, *parts):
+            return prefix + '-' + hashlib.md5('/'.join(parts).encode('utf-8')).hexdigest()[:8]
+        vpc_id = make_id('vpc', region, name)
+        self.vpcs[(region, vpc_id)] = {
+            'VpcId': vpc_id,
+            'Tags': [{ 'Key': 'Name', 'Value': name }],
+            'Subnets': [
+                {
+                    'SubnetId': make_id('subnet', region, name, subnet),
+                    'VpcId': vpc_id,
+                    'Tags': [{ 'Key': 'Name', 'Value': subnet }]
+                }
+                for subnet in subnets
+            ],
+            'SecurityGroups': [
+                {
+                    'GroupId': make_id('sg', region, name, sgroup),
+                    'GroupName': sgroup,
+                    'VpcId': vpc_id
+                }
+                for sgroup in security_groups
+            ]
+        }
+        return vpc_id
+
+    def session(self, region_name=None, **kwargs):
+        return FakeSession(region_name=region_name, backend=self)
+
+
+def register(services, backend=None, **kwargs):
+    """
+    Registers a FakeSession in place of boto3.Session.
+
+    @param services
+        The factoryfactory.ServiceLocator instance used to locate things.
+    @param backend
+        The FakeBackend to use. If not specified, one is created with the
+        remaining keyword arguments.
+    @returns
+        The FakeBackend.
+    """
+    backend = backend or FakeBackend(**kwargs)
+    services.register(boto3.Session, backend.session)
+    return backend
+
+
+# ====== Session and clients ====== #
+
+class FakeSession:
+
+    def __init__(self, region_name=None, backend=None, **kwargs):
+        self.backend = backend or FakeBackend()
+        self.region_name = region_name or self.backend.region_name
+
+    def client(self, service_name, region_name=None, **kwargs):
+        cls = CLIENTS.get(service_name)
+        if cls is None:
+            raise ValueError('The fake backend does not support ' + service_name + '.')
+        return cls(self.backend, region_name or self.region_name)
+
+
+class FakePaginator:
+
+    def __init__(self, method, input_token, output_token):
+        self.method = method
+        self.input_token = input_token
+        self.output_token = output_token
+
+    def paginate(self, **kwargs):
+        while True:
+            page = self.method(**kwargs)
+            yield page
+            token = page.get(self.output_token)
+            if not token:
+                return
+            kwargs = dict(kwargs)
+            kwargs[self.input_token] = token
+
+
+class FakeClient:
+
+    SERVICE = None
+    PAGINATORS = {}
+
+    def __init__(self, backend, region_name):
+        self.backend = backend
+        self.region_name = region_name
+
+    def _call(self, operation, kwargs=None, mutates=False):
+        self.backend.call(self.SERVICE, operation, kwargs, mutates)
+
+    def _page(self, items, token, key, token_key):
+        """
+        Gets one page of a list of items.
+        """
+        start = int(token or 0)
+        end = start + self.backend.page_size
+        result = { key: items[start:end] }
+        if end < len(items):
+            result[token_key] = str(end)
+        return result
+
+    def get_paginator(self, operation):
+        input_token, output_token = self.PAGINATORS[operation]
+        return FakePaginator(getattr(self, operation), input_token, output_token)
+
+
+class FakeFunction:
+    """
+    The state of a fake lambda function.
+    """
+
+    def __init__(self, configuration, code):
+        self.configuration = configuration
+        self.code = code
+        self.tags = {}
+        self.versions = []
+        self.aliases = {}
+        self.reserved_concurrency = None
+        self.provisioned = {}
+        self.policy = {}
+        self.creating = True
+        self.busy_until = 0.0
+        # Set to make the function's updates fail.
+        self.failed = False
+
+    def is_busy(self):
+        return time.monotonic() < self.busy_until
+
+    def get_configuration(self):
+        result = dict(self.configuration)
+        if self.is_busy():
+            result['State'] = 'Pending' if self.creating else 'Active'
+            result['LastUpdateStatus'] = 'InProgress'
+        elif self.failed:
+            result['State'] = 'Failed' if self.creating else 'Active'
+            result['LastUpdateStatus'] = 'Failed'
+            result['LastUpdateStatusReason'] = 'The fake was told to fail updates.'
+        else:
+            self.creating = False
+            result['State'] = 'Active'
+            result['LastUpdateStatus'] = 'Successful'
+        return result
+
+
+class FakeLambdaClient(FakeClient):
+
+    SERVICE = 'lambda'
+    PAGINATORS = {
+        'list_functions': ('Marker', 'NextMarker')
+    }
+
+    CONFIGURATION_KEYS = (
+        'Runtime', 'Role', 'Handler', 'Description', 'Timeout', 'MemorySize',
+        'VpcConfig', 'DeadLetterConfig', 'Environment', 'KMSKeyArn', 'TracingConfig'
+    )
+
+    def _get(self, operation, name):
+        function = self.backend.functions.get((self.region_name, name))
+        if function is None:
+            raise client_error(_pascal_case(operation), 'ResourceNotFoundException',
+                'Function not found: ' + self.backend.arn('lambda', self.region_name, 'function:' + name),
+                404)
+        return function
+
+    def _get_for_update(self, operation, name):
+        function = self._get(operation, name)
+        if function.is_busy():
+            raise client_error(_pascal_case(operation), 'ResourceConflictException',
+                'The operation cannot be performed at this time. An update is in '
+                'progress for resource: ' + function.configuration['FunctionArn'], 409)
+        return function
+
+    def _start_update(self, function):
+        function.busy_until = time.monotonic() + self.backend.update_duration
+
+    def _get_code(self, operation, code):
+        if 'ZipFile' in code:
+            return bytes(code['ZipFile'])
+        key = (code.get('S3Bucket'), code.get('S3Key'))
+        if key not in self.backend.s3_objects:
+            raise client_error(_pascal_case(operation), 'InvalidParameterValueException',
+                'Error occurred while GetObject. S3 Error Code: NoSuchKey')
+        return self.backend.s3_objects[key]
+
+    def _publish(self, function):
+        version = str(len(function.versions) + 1)
+        function.versions.append(dict(function.configuration, Version=version))
+        return version
+
+    def _result(self, function, version=None):
+        result = function.get_configuration()
+        result['Version'] = version or '$LATEST'
+        return result
+
+    # ------ Functions ------ #
+
+    def create_function(self, **kwargs):
+        self._call('create_function', kwargs, True)
+        with self.backend.lock:
+            key = (self.region_name, kwargs['FunctionName'])
+            if key in self.backend.functions:
+                raise client_error('CreateFunction', 'ResourceConflictException',
+                    'Function already exist: ' + kwargs['FunctionName'], 409)
+            code = self._get_code('create_function', kwargs['Code'])
+            configuration = dict([
+                (k, v) for k, v in kwargs.items() if k in self.CONFIGURATION_KEYS
+            ])
+            configuration.update({
+                'FunctionName': kwargs['FunctionName'],
+                'FunctionArn': self.backend.arn('lambda', self.region_name,
+                    'function:' + kwargs['FunctionName']),
+                'CodeSha256': _sha256(code),
+                'CodeSize': len(code),
+                'Architectures': kwargs.get('Architectures') or ['x86_64']
+            })
+            function = FakeFunction(configuration, code)
+            function.tags = dict(kwargs.get('Tags') or {})
+            self.backend.functions[key] = function
+            self._start_update(function)
+            version = self._publish(function) if kwargs.get('Publish') else None
+            return self._result(function, version)
+
+    def get_function(self, **kwargs):
+        self._call('get_function', kwargs)
+        with self.backend.lock:
+            function = self._get('get_function', kwargs['FunctionName'])
+            result = {
+                'Configuration': function.get_configuration(),
+                'Code': { 'RepositoryType': 'S3' }
+            }
+            if function.tags:
+                result['Tags'] = dict(function.tags)
+            if function.reserved_concurrency is not None:
+                result['Concurrency'] = {
+                    'ReservedConcurrentExecutions': function.reserved_concurrency
+                }
+            return result
+
+    def get_function_configuration(self, **kwargs):
+        self._call('get_function_configuration', kwargs)
+        with self.backend.lock:
+            return self._get('get_function_configuration', kwargs['FunctionName']) \
+                .get_configuration()
+
+    def list_functions(self, **kwargs):
+        self._call('list_functions', kwargs)
+        with self.backend.lock:
+            functions = [
+                dict(function.configuration)
+                for (region, name), function in sorted(self.backend.functions.items())
+                if region == self.region_name
+            ]
+        return self._page(functions, kwargs.get('Marker'), 'Functions', 'NextMarker')
+
+    def update_function_configuration(self, **kwargs):
+        self._call('update_function_configuration', kwargs, True)
+        with self.backend.lock:
+            function = self._get_for_update('update_function_configuration', kwargs['FunctionName'])
+            function.configuration.update(dict([
+                (k, v) for k, v in kwargs.items() if k in self.CONFIGURATION_KEYS
+            ]))
+            self._start_update(function)
+            return self._result(function)
+
+    def update_function_code(self, **kwargs):
+        self._call('update_function_code', kwargs, True)
+        with self.backend.lock:
+            function = self._get_for_update('update_function_code', kwargs['FunctionName'])
+            code = self._get_code('update_function_code', kwargs)
+            function.code = code
+            function.configuration['CodeSha256'] = _sha256(code)
+            function.configuration['CodeSize'] = len(code)
+            if kwargs.get('Architectures'):
+                function.configuration['Architectures'] = kwargs['Architectures']
+            self._start_update(function)
+            version = self._publish(function) if kwargs.get('Publish') else None
+            return self._result(function, version)
+
+    def publish_version(self, **kwargs):
+        self._call('publish_version', kwargs, True)
+        with self.backend.lock:
+            function = self._get_for_update('publish_version', kwargs['FunctionName'])
+            latest = function.versions[-1] if function.versions else None
+            if latest and all(
+                latest.get(k) == v for k, v in function.configuration.items()
+            ):
+                # Nothing has changed, so no new version is published.
+                version = latest['Version']
+            else:
+                version = self._publish(function)
+            return self._result(function, version)
+
+    # ------ Tags ------ #
+
+    def _get_by_arn(self, operation, arn):
+        return self._get(operation, arn.split(':')[6])
+
+    def list_tags(self, **kwargs):
+        self._call('list_tags', kwargs)
+        with self.backend.lock:
+            return { 'Tags': dict(self._get_by_arn('list_tags', kwargs['Resource']).tags) }
+
+    def tag_resource(self, **kwargs):
+        self._call('tag_resource', kwargs, True)
+        with self.backend.lock:
+            self._get_by_arn('tag_resource', kwargs['Resource']).tags.update(kwargs['Tags'])
+
+    def untag_resource(self, **kwargs):
+        self._call('untag_resource', kwargs, True)
+        with self.backend.lock:
+            tags = self._get_by_arn('untag_resource', kwargs['Resource']).tags
+            for key in kwargs['TagKeys']:
+                tags.pop(key, None)
+
+    # ------ Concurrency ------ #
+
+    def get_function_concurrency(self, **kwargs):
+        self._call('get_function_concurrency', kwargs)
+        with self.backend.lock:
+            function = self._get('get_function_concurrency', kwargs['FunctionName'])
+            if function.reserved_concurrency is None:
+                return {}
+            return { 'ReservedConcurrentExecutions': function.reserved_concurrency }
+
+    def put_function_concurrency(self, **kwargs):
+        self._call('put_function_concurrency', kwargs, True)
+        with self.backend.lock:
+            function = self._get('put_function_concurrency', kwargs['FunctionName'])
+            function.reserved_concurrency = kwargs['ReservedConcurrentExecutions']
+            return { 'ReservedConcurrentExecutions': function.reserved_concurrency }
+
+    def delete_function_concurrency(self, **kwargs):
+        self._call('delete_function_concurrency', kwargs, True)
+        with self.backend.lock:
+            self._get('delete_function_concurrency', kwargs['FunctionName']) \
+                .reserved_concurrency = None
+
+    def _alias_result(self, function, name):
+        return {
+            'AliasArn': function.configuration['FunctionArn'] + ':' + name,
+            'Name': name,
+            'FunctionVersion': function.aliases[name]
+        }
+
+    def get_alias(self, **kwargs):
+        self._call('get_alias', kwargs)
+        with self.backend.lock:
+            function = self._get('get_alias', kwargs['FunctionName'])
+            if kwargs['Name'] not in function.aliases:
+                raise client_error('GetAlias', 'ResourceNotFoundException',
+                    'Alias not found: ' + kwargs['Name'], 404)
+            return self._alias_result(function, kwargs['Name'])
+
+    def create_alias(self, **kwargs):
+        self._call('create_alias', kwargs, True)
+        with self.backend.lock:
+            function = self._get('create_alias', kwargs['FunctionName'])
+            if kwargs['Name'] in function.aliases:
+                raise client_error('CreateAlias', 'ResourceConflictException',
+                    'Alias already exists: ' + kwargs['Name'], 409)
+            function.aliases[kwargs['Name']] = kwargs['FunctionVersion']
+            return self._alias_result(function, kwargs['Name'])
+
+    def update_alias(self, **kwargs):
+        self._call('update_alias', kwargs, True)
+        with self.backend.lock:
+            function = self._get('update_alias', kwargs['FunctionName'])
+            if kwargs['Name'] not in function.aliases:
+                raise client_error('UpdateAlias', 'ResourceNotFoundException',
+                    'Alias not found: ' + kwargs['Name'], 404)
+            function.aliases[kwargs['Name']] = kwargs['FunctionVersion']
+            return self._alias_result(function, kwargs['Name'])
+
+    def get_provisioned_concurrency_config(self, **kwargs):
+        self._call('get_provisioned_concurrency_config', kwargs)
+        with self.backend.lock:
+            function = self._get('get_provisioned_concurrency_config', kwargs['FunctionName'])
+            if kwargs['Qualifier'] not in function.provisioned:
+                raise client_error('GetProvisionedConcurrencyConfig',
+                    'ProvisionedConcurrencyConfigNotFoundException',
+                    'No Provisioned Concurrency Config found for this function', 404)
+            requested = function.provisioned[kwargs['Qualifier']]
+            return {
+                'RequestedProvisionedConcurrentExecutions': requested,
+                'AllocatedProvisionedConcurrentExecutions': requested,
+                'Status': 'READY'
+            }
+
+    def put_provisioned_concurrency_config(self, **kwargs):
+        self._call('put_provisioned_concurrency_config', kwargs, True)
+        with self.backend.lock:
+            function = self._get('put_provisioned_concurrency_config', kwargs['FunctionName'])
+            function.provisioned[kwargs['Qualifier']] = kwargs['ProvisionedConcurrentExecutions']
+            return {
+                'RequestedProvisionedConcurrentExecutions': kwargs['ProvisionedConcurrentExecutions'],
+                'Status': 'IN_PROGRESS'
+            }
+
+    def delete_provisioned_concurrency_config(self, **kwargs):
+        self._call('delete_provisioned_concurrency_config', kwargs, True)
+        with self.backend.lock:
+            self._get('delete_provisioned_concurrency_config', kwargs['FunctionName']) \
+                .provisioned.pop(kwargs['Qualifier'], None)
+
+    # ------ Permissions ------ #
+
+    def get_policy(self, **kwargs):
+        self._call('get_policy', kwargs)
+        with self.backend.lock:
+            function = self._get('get_policy', kwargs['FunctionName'])
+            if not function.policy:
+                raise client_error('GetPolicy', 'ResourceNotFoundException',
+                    'The resource you requested does not exist.', 404)
+            return { 'Policy': json.dumps({
+                'Version': '2012-10-17',
+                'Statement': list(function.policy.values())
+            }) }
+
+    def add_permission(self, **kwargs):
+        self._call('add_permission', kwargs, True)
+        with self.backend.lock:
+            function = self._get('add_permission', kwargs['FunctionName'])
+            if kwargs['StatementId'] in function.policy:
+                raise client_error('AddPermission', 'ResourceConflictException',
+                    'The statement id (' + kwargs['StatementId'] + ') provided already exists.', 409)
+            statement = {
+                'Sid': kwargs['StatementId'],
+                'Effect': 'Allow',
+                'Principal': { 'Service': kwargs['Principal'] },
+                'Action': kwargs['Action'],
+                'Resource': function.configuration['FunctionArn']
+            }
+            if kwargs.get('SourceArn'):
+                statement['Condition'] = { 'ArnLike': { 'AWS:SourceArn': kwargs['SourceArn'] } }
+            function.policy[kwargs['StatementId']] = statement
+            return { 'Statement': json.dumps(statement) }
+
+    def remove_permission(self, **kwargs):
+        self._call('remove_permission', kwargs, True)
+        with self.backend.lock:
+            function = self._get('remove_permission', kwargs['FunctionName'])
+            if function.policy.pop(kwargs['StatementId'], None) is None:
+                raise client_error('RemovePermission', 'ResourceNotFoundException',
+                    'Statement ' + kwargs['StatementId'] + ' is not found in resource policy.', 404)
+
+
+class FakeTaggingClient(FakeClient):
+
+    SERVICE = 'tag'
+    PAGINATORS = {
+        'get_resources': ('PaginationToken', 'PaginationToken')
+    }
+
+    def get_resources(self, **kwargs):
+        self._call('get_resources', kwargs)
+        with self.backend.lock:
+            resources = [
+                {
+                    'ResourceARN': function.configuration['FunctionArn'],
+                    'Tags': [{ 'Key': k, 'Value': v } for k, v in sorted(function.tags.items())]
+                }
+                for (region, name), function in sorted(self.backend.functions.items())
+                if region == self.region_name and function.tags
+            ]
+        return self._page(resources, kwargs.get('PaginationToken'),
+            'ResourceTagMappingList', 'PaginationToken')
+
+
+class FakeStsClient(FakeClient):
+
+    SERVICE = 'sts'
+
+    def get_caller_identity(self, **kwargs):
+        self._call('get_caller_identity', kwargs)
+        return {
+            'Account': self.backend.account_id,
+            'Arn': 'arn:aws:iam::{0}:user/fake'.format(self.backend.account_id),
+            'UserId': 'FAKE'
+        }
+
+
+class FakeKmsClient(FakeClient):
+
+    SERVICE = 'kms'
+
+    def describe_key(self, **kwargs):
+        self._call('describe_key', kwargs)
+        with self.backend.lock:
+            arn = self.backend.kms_keys.get((self.region_name, kwargs['KeyId']))
+        if arn is None:
+            raise client_error('DescribeKey', 'NotFoundException',
+                'Alias ' + kwargs['KeyId'] + ' is not found.')
+        return { 'KeyMetadata': {
+            'KeyId': arn.rsplit('/', 1)[1],
+            'AWSAccountId': self.backend.account_id,
+            'Arn': arn
+        } }
+
+
+class FakeEc2Client(FakeClient):
+
+    SERVICE = 'ec2'
+    PAGINATORS = {
+        'describe_vpcs': ('NextToken', 'NextToken'),
+        'describe_subnets': ('NextToken', 'NextToken'),
+        'describe_security_groups': ('NextToken', 'NextToken')
+    }
+
+    FILTERS = {
+        'vpc-id': 'VpcId',
+        'subnet-id': 'SubnetId',
+        'group-id': 'GroupId',
+        'group-name': 'GroupName'
+    }
+
+    def _describe(self, operation, items, filters, token, key):
+        self._call(operation, { 'Filters': filters })
+        def get_values(item, name):
+            if name.startswith('tag:'):
+                return [t['Value'] for t in item.get('Tags', []) if t['Key'] == name[4:]]
+            return [item.get(self.FILTERS[name])]
+        def matches(item):
+            return all(
+                set(get_values(item, f['Name'])) & set(f['Values'])
+                for f in filters or []
+            )
+        return self._page([dict(item) for item in items if matches(item)], token, key, 'NextToken')
+
+    def _vpcs(self):
+        with self.backend.lock:
+            return [
+                vpc for (region, id), vpc in sorted(self.backend.vpcs.items())
+                if region == self.region_name
+            ]
+
+    def describe_vpcs(self, Filters=None, NextToken=None, **kwargs):
+        vpcs = [
+            { 'VpcId': vpc['VpcId'], 'Tags': vpc['Tags'] } for vpc in self._vpcs()
+        ]
+        return self._describe('describe_vpcs', vpcs, Filters, NextToken, 'Vpcs')
+
+    def describe_subnets(self, Filters=None, NextToken=None, **kwargs):
+        subnets = [subnet for vpc in self._vpcs() for subnet in vpc['Subnets']]
+        return self._describe('describe_subnets', subnets, Filters, NextToken, 'Subnets')
+
+    def describe_security_groups(self, Filters=None, NextToken=None, **kwargs):
+        sgroups = [sgroup for vpc in self._vpcs() for sgroup in vpc['SecurityGroups']]
+        return self._describe('describe_security_groups', sgroups, Filters, NextToken,
+            'SecurityGroups')
+
+
+class FakeS3Client(FakeClient):
+
+    SERVICE = 's3'
+
+    def head_object(self, **kwargs):
+        self._call('head_object', kwargs)
+        with self.backend.lock:
+            data = self.backend.s3_objects.get((kwargs['Bucket'], kwargs['Key']))
+        if data is None:
+            raise client_error('HeadObject', '404', 'Not Found', 404)
+        return { 'ContentLength': len(data) }
+
+    def put_object(self, **kwargs):
+        self._call('put_object', kwargs, True)
+        body = kwargs.get('Body', b'')
+        if hasattr(body, 'read'):
+            body = body.read()
+        with self.backend.lock:
+            self.backend.s3_objects[(kwargs['Bucket'], kwargs['Key'])] = bytes(body)
+        return {}
+
+    def upload_file(self, filename, bucket, key, **kwargs):
+        with open(filename, 'rb') as f:
+            self.put_object(Bucket=bucket, Key=key, Body=f.read())
+
+
+class FakeEventsClient(FakeClient):
+
+    SERVICE = 'events'
+
+    def _get_rule(self, operation, name):
+        rule = self.backend.rules.get((self.region_name, name))
+        if rule is None:
+            raise client_error(_pascal_case(operation), 'ResourceNotFoundException',
+                'Rule ' + name + ' does not exist.')
+        return rule
+
+    def describe_rule(self, **kwargs):
+        self._call('describe_rule', kwargs)
+        with self.backend.lock:
+            rule = self._get_rule('describe_rule', kwargs['Name'])
+            return dict([(k, v) for k, v in rule.items() if k != 'Targets'])
+
+    def put_rule(self, **kwargs):
+        self._call('put_rule', kwargs, True)
+        with self.backend.lock:
+            rule = self.backend.rules.setdefault(
+                (self.region_name, kwargs['Name']), { 'Targets': {} }
+            )
+            rule.update(kwargs)
+            rule['Arn'] = self.backend.arn('events', self.region_name, 'rule/' + kwargs['Name'])
+            return { 'RuleArn': rule['Arn'] }
+
+    def delete_rule(self, **kwargs):
+        self._call('delete_rule', kwargs, True)
+        with self.backend.lock:
+            self.backend.rules.pop((self.region_name, kwargs['Name']), None)
+
+    def list_targets_by_rule(self, **kwargs):
+        self._call('list_targets_by_rule', kwargs)
+        with self.backend.lock:
+            rule = self._get_rule('list_targets_by_rule', kwargs['Rule'])
+            return { 'Targets': [dict(target) for target in rule['Targets'].values()] }
+
+    def put_targets(self, **kwargs):
+        self._call('put_targets', kwargs, True)
+        with self.backend.lock:
+            rule = self._get_rule('put_targets', kwargs['Rule'])
+            for target in kwargs['Targets']:
+                rule['Targets'][target['Id']] = dict(target)
+            return { 'FailedEntryCount': 0, 'FailedEntries': [] }
+
+    def remove_targets(self, **kwargs):
+        self._call('remove_targets', kwargs, True)
+        with self.backend.lock:
+            rule = self._get_rule('remove_targets', kwargs['Rule'])
+            for id in kwargs['Ids']:
+                rule['Targets'].pop(id, None)
+            return { 'FailedEntryCount': 0, 'FailedEntries': [] }
+
+
+CLIENTS = {
+    'lambda': FakeLambdaClient,
+    'resourcegroupstaggingapi': FakeTaggingClient,
+    'sts': FakeStsClient,
+    'kms': FakeKmsClient,
+    'ec2': FakeEc2Client,
+    's3': FakeS3Client,
+    'events': FakeEventsClient
+}
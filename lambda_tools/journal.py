@@ -0,0 +1,134 @@
+"""
+Keeps track of which functions have been deployed during a run, so that a run
+which fails part way through can be resumed without redeploying everything.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import os.path
+import tempfile
+import threading
+import time
+
+import factoryfactory
+
+from . import build
+from . import configuration
+from . import mapper
+
+
+def _plain(value):
+    """
+    Converts a parsed configuration object into plain data that can be
+    serialised, for configurations whose raw data was not kept.
+    """
+    if isinstance(value, dict):
+        return dict([(key, _plain(item)) for key, item in value.items()])
+    elif isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    elif hasattr(type(value), '__fields__') or hasattr(value, '__dict__'):
+        return dict([
+            (key, _plain(getattr(value, key))) for key in mapper.get_fields(type(value))
+        ])
+    return value
+
+
+class DeployJournal(factoryfactory.Serviceable):
+    """
+    A record of the functions deployed in a run, saved to disk after every
+    change so that it survives the run failing.
+
+    Each function is recorded for each region it is deployed to, along with
+    the hashes of its package and its configuration. A function only counts
+    as having been deployed if those hashes are still the same.
+    """
+
+    DEPLOYED = 'deployed'
+    FAILED = 'failed'
+    IN_PROGRESS = 'in-progress'
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.config = self.services.get(configuration.Configuration)
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.filename) as f:
+                self.entries = json.load(f).get('entries', {})
+        except (IOError, ValueError):
+            self.entries = {}
+
+    def _save(self):
+        folder = os.path.dirname(os.path.abspath(self.filename))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({ 'entries': self.entries }, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.filename)
+
+    def clear(self):
+        """
+        Forgets everything, ready for a new run.
+        """
+        with self._lock:
+            self.entries = {}
+            self._save()
+
+    def _get_config_data(self, name, func):
+        raw_data = getattr(self.config, 'raw_data', None)
+        if raw_data:
+            return raw_data['functions'][name]
+        return _plain(func)
+
+    def get_state(self, name, func):
+        """
+        Describes what is to be deployed for a function in one region.
+
+        @param name
+            The name of the function.
+        @param func
+            The function's FunctionConfig, as returned by get_regional_configs().
+        """
+        package = copy.deepcopy(func.build)
+        package.resolve(self.config.get_root(name))
+        if os.path.isfile(package.package):
+            package_sha256 = build.get_code_sha256(package.package)
+        else:
+            package_sha256 = None
+        config_data = json.dumps(self._get_config_data(name, func), sort_keys=True, default=str)
+        return {
+            'function': name,
+            'region': (func.deploy.region if func.deploy else None) or '',
+            'package_sha256': package_sha256,
+            'config_sha256': hashlib.sha256(config_data.encode('utf-8')).hexdigest()
+        }
+
+    def _get_key(self, state):
+        return state['function'] + '@' + state['region']
+
+    def is_deployed(self, state):
+        """
+        Tests whether a function was deployed by the run being resumed, and
+        has not changed since.
+        """
+        with self._lock:
+            entry = self.entries.get(self._get_key(state))
+        return bool(entry) and entry['status'] == self.DEPLOYED and all(
+            entry.get(key) == state[key] for key in state
+        )
+
+    def record(self, state, status):
+        """
+        Records the status of a function's deployment to one region.
+        """
+        entry = dict(state)
+        entry['status'] = status
+        entry['time'] = time.time()
+        with self._lock:
+            self.entries[self._get_key(state)] = entry
+            self._save()
@@ -3,10 +3,33 @@ Contains classes and functions for mapping raw JSON/YAML output onto an
 object hierarchy.
 """
 
+from collections.abc import Mapping
+
 class MappingError(Exception):
     pass
 
 
+class ItemName:
+    """
+    The name of an item in a list or dictionary, for use in error messages.
+
+    It is only formatted if an error message actually needs it, so that
+    parsing large lists and dictionaries does not pay for building a name
+    for every item.
+    """
+    __slots__ = ('parent', 'key')
+
+    def __init__(self, parent, key):
+        self.parent = parent
+        self.key = key
+
+    def __str__(self):
+        return '{0}[{1}]'.format(self.parent, self.key)
+
+    def __format__(self, spec):
+        return format(str(self), spec)
+
+
 class Field:
 
     def __init__(self, required=False, nullable=False, default=None):
@@ -15,7 +38,7 @@ class Field:
         self.required = bool(required)
 
     def parse(self, value, field_name):
-        if value == None and not self.nullable:
+        if value is None and not self.nullable:
             raise MappingError('Value "{0}" can not be null.'.format(field_name))
         return value
 
@@ -32,7 +55,7 @@ class StringField(Field):
         Field.__init__(self, **kwargs)
 
     def parse(self, value, field_name):
-        if value != None and not isinstance(value, str):
+        if value is not None and not isinstance(value, str):
             raise MappingError('Value "{0}" must be a string.'.format(field_name))
         return Field.parse(self, value, field_name)
 
@@ -44,7 +67,7 @@ class IntField(Field):
 
     def parse(self, value, field_name):
         value = Field.parse(self, value, field_name)
-        if value != None:
+        if value is not None:
             try:
                 return int(value)
             except ValueError:
@@ -58,7 +81,7 @@ class BoolField(Field):
 
     def parse(self, value, field_name):
         value = Field.parse(self, value, field_name)
-        if value != None:
+        if value is not None:
             try:
                 return bool(value)
             except ValueError:
@@ -73,7 +96,7 @@ class ChoiceField(Field):
 
     def parse(self, value, field_name):
         value = Field.parse(self, value, field_name)
-        if value != None and value not in self.choices:
+        if value is not None and value not in self.choices:
             raise MappingError('Value "{0}" must be one of: {1}.'.format(
                 field_name,
                 ', '.join((str(choice) for choice in self.choices))
@@ -93,28 +116,89 @@ class ListField(Field):
             # Strings and dicts are iterable but we want to disallow them.
             raise MappingError('Value "{0}" must be a list.'.format(field_name))
         elif hasattr(value, '__iter__'):
+            parse_item = self.item_field.parse
             return [
-                self.item_field.parse(item, '{0}[{1}]'.format(field_name, index))
+                parse_item(item, ItemName(field_name, index))
                 for index, item in enumerate(value)
             ]
         else:
             raise MappingError('Value "{0}" must be a list.'.format(field_name))
 
 
+class LazyDict(Mapping):
+    """
+    A read-only dictionary whose items are only parsed when they are first
+    accessed, for dictionaries which are large but of which only a few items
+    are usually needed.
+
+    Once an item has been parsed, its data is dropped, so that it is not
+    held in memory twice.
+    """
+
+    def __init__(self, item_field, data, field_name):
+        self.item_field = item_field
+        # The data of the items that have not been parsed yet. This is a copy,
+        # so dropping items from it leaves the caller's dictionary alone.
+        self.data = dict(data)
+        self.field_name = field_name
+        self.parsed = {}
+        self._keys = list(data)
+
+    def __getitem__(self, key):
+        try:
+            return self.parsed[key]
+        except KeyError:
+            pass
+        value = self.item_field.parse(self.data[key], ItemName(self.field_name, key))
+        self.parsed[key] = value
+        del self.data[key]
+        return value
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self.parsed or key in self.data
+
+    def __repr__(self):
+        return 'LazyDict({0!r})'.format(self._keys)
+
+    def parse_all(self):
+        """
+        Parses every item that has not been parsed yet.
+
+        @returns
+            A dict mapping the keys of the items that could not be parsed to
+            their MappingErrors.
+        """
+        errors = {}
+        for key in list(self.data):
+            try:
+                self[key]
+            except MappingError as e:
+                errors[key] = e
+        return errors
+
+
 class DictField(Field):
 
-    def __init__(self, item_field=None, default={}, **kwargs):
+    def __init__(self, item_field=None, default={}, lazy=False, **kwargs):
         Field.__init__(self, default=default, **kwargs)
         self.item_field = item_field or Field()
+        self.lazy = bool(lazy)
 
     def parse(self, value, field_name):
         value = Field.parse(self, value, field_name)
-        if isinstance(value, dict):
+        if isinstance(value, dict) and self.lazy:
+            return LazyDict(self.item_field, value, field_name)
+        elif isinstance(value, dict):
+            parse_item = self.item_field.parse
             return dict([
-                (key, self.item_field.parse(
-                    value[key], '{0}[{1}]'.format(field_name, key)
-                ))
-                for key in value
+                (key, parse_item(item, ItemName(field_name, key)))
+                for key, item in value.items()
             ])
         else:
             raise MappingError('Value "{0}" must be a dictionary.'.format(field_name))
@@ -136,10 +220,130 @@ class ClassField(Field):
     def parse(self, value, field_name):
         value = Field.parse(self, value, field_name)
         if self.default_field and not isinstance(value, dict):
-            return parse(self.cls, { self.default_field: value }, field_name)
+            value = { self.default_field: value }
+        return get_schema(self.cls).parse(value, field_name)
+
+
+def get_fields(cls):
+    """
+    Gets the fields declared by a class, as a dict mapping their names to
+    their Field instances.
+    """
+    fields = cls.__dict__.get('__fields__')
+    if fields is not None:
+        return dict(fields)
+    import inspect
+    return dict(inspect.getmembers(cls, lambda m: issubclass(type(m), Field)))
+
+
+def record(*args):
+    """
+    A class decorator which turns a class with Field declarations into a
+    compact record class, whose instances store the fields in __slots__
+    rather than in a per-instance __dict__.
+
+    It can be used either as @record, or as @record('name', ...) to add
+    slots for attributes that are not fields but that are set on instances
+    after they have been parsed. If the class has an attribute with the same
+    name, it is used as the initial value; otherwise the initial value is
+    None.
+    """
+    def decorate(cls):
+        fields = get_fields(cls)
+        namespace = dict(cls.__dict__)
+        for name in fields:
+            namespace.pop(name, None)
+        namespace.pop('__dict__', None)
+        namespace.pop('__weakref__', None)
+        extras = [(name, namespace.pop(name, None)) for name in extra]
+        initial = [(name, field.default) for name, field in fields.items()] + extras
+
+        def __init__(self):
+            for name, value in initial:
+                setattr(self, name, value)
+
+        namespace['__slots__'] = tuple(fields) + tuple(extra)
+        namespace['__fields__'] = fields
+        namespace['__extras__'] = extras
+        namespace['__init__'] = __init__
+        return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+    if len(args) == 1 and isinstance(args[0], type):
+        extra = ()
+        return decorate(args[0])
+    extra = args
+    return decorate
+
+
+class Schema:
+    """
+    The fields of a class, collected once so that parsing any number of
+    instances of the class does not have to inspect it again.
+    """
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.fields = get_fields(cls)
+        self.parsers = dict([(key, field.parse) for key, field in self.fields.items()])
+        self.required = [key for key, field in self.fields.items() if field.required]
+        self.defaults = [
+            (key, field.default) for key, field in self.fields.items() if not field.required
+        ]
+        self.extras = cls.__dict__.get('__extras__')
+        validate = getattr(cls, 'validate', None)
+        self.validate = validate if callable(validate) and not isinstance(validate, Field) \
+            else None
+
+    def parse(self, data, field_name=None):
+        if not isinstance(data, dict):
+            if field_name:
+                raise MappingError('Field {0} must be a dictionary.'.format(field_name))
+            else:
+                raise MappingError('Data must be a dictionary.')
+
+        parsers = self.parsers
+        values = {}
+        for key, value in data.items():
+            parser = parsers.get(key)
+            if parser is None:
+                raise MappingError('Unrecognised value "{0}".'.format(key))
+            values[key] = parser(value, key)
+        if len(values) < len(parsers):
+            for key in self.required:
+                if key not in values:
+                    self.fields[key].get_default(key)
+            for key, default in self.defaults:
+                if key not in values:
+                    values[key] = default
+
+        if self.extras is None:
+            instance = self.cls()
+            instance.__dict__.update(values)
         else:
-            return parse(self.cls, value, field_name)
+            # Every field has a value by now, so the slots can be filled in
+            # without running the record's constructor.
+            instance = self.cls.__new__(self.cls)
+            for key, value in values.items():
+                setattr(instance, key, value)
+            for key, value in self.extras:
+                setattr(instance, key, value)
+        if self.validate:
+            msg = self.validate(instance)
+            if msg:
+                raise MappingError(msg)
+        return instance
+
 
+_schemas = {}
+
+def get_schema(clz):
+    """
+    Gets the schema for a class, compiling it the first time it is needed.
+    """
+    schema = _schemas.get(clz)
+    if schema is None:
+        schema = _schemas[clz] = Schema(clz)
+    return schema
 
 
 def parse(clz, data, field_name=None):
@@ -147,28 +351,4 @@ def parse(clz, data, field_name=None):
     if not isinstance(clz, type):
         raise MappingError('Target class must be a type.')
 
-    import inspect
-    members = dict(inspect.getmembers(clz, lambda m: issubclass(type(m), Field)))
-
-    if isinstance(data, dict):
-        instance = clz()
-        for key in data:
-            field = members.pop(key, None)
-            if not field:
-                raise MappingError('Unrecognised value "{0}".'.format(key))
-            value = field.parse(data[key], key)
-            setattr(instance, key, value)
-        for key in members:
-            field = members[key]
-            value = field.get_default(key)
-            setattr(instance, key, value)
-        if hasattr(clz, 'validate') and callable(clz.validate) and not isinstance(clz.validate, Field):
-            msg = clz.validate(instance)
-            if msg:
-                raise MappingError(msg)
-        return instance
-    else:
-        if field_name:
-            raise MappingError('Field {0} must be a dictionary.'.format(field_name))
-        else:
-            raise MappingError('Data must be a dictionary.')
\ No newline at end of file
+    return get_schema(clz).parse(data, field_name)
\ No newline at end of file
@@ -0,0 +1,564 @@
+"""
+A local HTTP gateway that sits in front of your lambda functions in the same
+way as API Gateway's Lambda proxy integration.
+
+Each function is served by a pool of pre-forked worker processes. The handler
+is imported when the worker starts, so every request is served by a warm
+container. Requests for a function are queued until one of its workers becomes
+free, which means that the configured concurrency behaves in much the same way
+as Lambda's own concurrency limit.
+"""
+
+import asyncio
+import base64
+import concurrent.futures
+import importlib
+import json
+import multiprocessing
+import os
+import os.path
+import random
+import sys
+import time
+import uuid
+from urllib.parse import parse_qsl, urlsplit
+
+import factoryfactory
+
+class ServeError(Exception):
+    pass
+
+
+STATUS_TEXT = {
+    200: 'OK',
+    404: 'Not Found',
+    411: 'Length Required',
+    500: 'Internal Server Error',
+    502: 'Bad Gateway',
+    504: 'Gateway Timeout'
+}
+
+METRICS_PATH = '/_ltools/metrics'
+
+
+# ====== Worker processes ====== #
+
+class LambdaContext:
+    """
+    A stand-in for the context object that AWS Lambda passes to the handler.
+    """
+
+    def __init__(self, function_name, memory_size, timeout):
+        self.function_name = function_name
+        self.function_version = '$LATEST'
+        self.invoked_function_arn = \
+            'arn:aws:lambda:local:000000000000:function:' + function_name
+        self.memory_limit_in_mb = memory_size
+        self.aws_request_id = str(uuid.uuid4())
+        self.log_group_name = '/aws/lambda/' + function_name
+        self.log_stream_name = 'ltools-serve/' + str(os.getpid())
+        self._deadline = time.time() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.time()) * 1000))
+
+
+def _worker_main(conn, path, handler, function_name, memory_size, timeout):
+    """
+    The main loop of a worker process. The handler is imported up front, then
+    events are read from the pipe and the JSON-serialised results are written
+    back to it.
+    """
+    try:
+        os.chdir(path)
+        sys.path.insert(0, path)
+        module_name, _, attr = handler.rpartition('.')
+        func = getattr(importlib.import_module(module_name), attr)
+    except Exception as e:
+        conn.send(('error', '{0}: {1}'.format(type(e).__name__, e)))
+        return
+    conn.send(('ready', None))
+
+    while True:
+        try:
+            event = conn.recv()
+        except EOFError:
+            break
+        if event is None:
+            break
+        try:
+            context = LambdaContext(function_name, memory_size, timeout)
+            conn.send(('result', json.dumps(func(event, context))))
+        except Exception as e:
+            conn.send(('error', json.dumps({
+                'errorMessage': str(e),
+                'errorType': type(e).__name__
+            })))
+
+
+class Worker:
+    """
+    A single pre-forked worker process, serving one function.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_main,
+            args=(child, pool.path, pool.handler, pool.name,
+                pool.memory_size, pool.timeout),
+            daemon=True
+        )
+        self.process.start()
+        child.close()
+
+    def wait_until_ready(self):
+        try:
+            status, message = self.conn.recv()
+        except EOFError:
+            status, message = 'error', 'the worker process exited unexpectedly'
+        if status != 'ready':
+            self.stop()
+            raise ServeError('Function {0} could not be started: {1}'.format(
+                self.pool.name, message
+            ))
+
+    def invoke(self, event):
+        """
+        Sends an event to the worker and waits for the result. This blocks, so
+        it is run on a thread rather than on the event loop.
+
+        @returns
+            A tuple of (status, payload), where status is 'result', 'error'
+            or 'timeout'.
+        """
+        self.conn.send(event)
+        if not self.conn.poll(self.pool.timeout):
+            return 'timeout', None
+        try:
+            return self.conn.recv()
+        except EOFError:
+            return 'error', json.dumps({
+                'errorMessage': 'The worker process exited unexpectedly.',
+                'errorType': 'Runtime.ExitError'
+            })
+
+    @property
+    def alive(self):
+        return self.process.is_alive()
+
+    def stop(self, kill=False):
+        """
+        Stops the worker. This blocks, so it is run on a thread rather than on
+        the event loop.
+
+        @param kill
+            True to terminate the worker straight away, for a worker that is
+            still busy with an invocation that timed out. Otherwise it is
+            asked to exit, and only terminated if it does not.
+        """
+        if self.process.is_alive() and not kill:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        self.conn.close()
+
+
+# ====== Latency metrics ====== #
+
+class Metrics:
+    """
+    Records the latency of each invocation of a function.
+
+    The count, mean and maximum cover every invocation, but the percentiles
+    are worked out from a uniform random sample of at most sample_size
+    latencies, so that a long-running server does not hold on to them all.
+    """
+
+    def __init__(self, sample_size=1024):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = None
+        self.sample_size = sample_size
+        self.latencies = []
+        self.random = random.Random()
+
+    def record(self, latency, error=False):
+        self.count += 1
+        if error:
+            self.errors += 1
+        self.total += latency
+        if self.max is None or latency > self.max:
+            self.max = latency
+        # Reservoir sampling: each latency recorded so far has the same
+        # chance of being in the sample.
+        if len(self.latencies) < self.sample_size:
+            self.latencies.append(latency)
+        else:
+            index = self.random.randrange(self.count)
+            if index < self.sample_size:
+                self.latencies[index] = latency
+
+    def percentile(self, latencies, p):
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(round(p / 100.0 * (len(latencies) - 1))))
+        return latencies[index]
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        ms = lambda x: None if x is None else round(x * 1000, 3)
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': ms(self.total / self.count) if self.count else None,
+            'p50_ms': ms(self.percentile(latencies, 50)),
+            'p95_ms': ms(self.percentile(latencies, 95)),
+            'p99_ms': ms(self.percentile(latencies, 99)),
+            'max_ms': ms(self.max)
+        }
+
+
+# ====== Function pools ====== #
+
+class FunctionPool:
+    """
+    The pool of warm workers serving a single function.
+    """
+
+    def __init__(self, name, path, handler, route, concurrency,
+            memory_size=128, timeout=3):
+        self.name = name
+        self.path = path
+        self.handler = handler
+        self.route = route.rstrip('/')
+        self.concurrency = concurrency
+        self.memory_size = memory_size
+        self.timeout = timeout
+        self.metrics = Metrics()
+        self.workers = []
+        self.idle = None
+
+    def start(self):
+        self.workers = [Worker(self) for i in range(self.concurrency)]
+        for worker in self.workers:
+            worker.wait_until_ready()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    async def invoke(self, loop, executor, event):
+        if self.idle is None:
+            self.idle = asyncio.Queue()
+            for worker in self.workers:
+                self.idle.put_nowait(worker)
+        worker = await self.idle.get()
+        status, payload = 'error', None
+        try:
+            if worker is None:
+                # The worker in this slot could not be replaced, so try again.
+                worker = await loop.run_in_executor(executor, self._replace_worker)
+            if worker is not None:
+                status, payload = await loop.run_in_executor(executor, worker.invoke, event)
+        finally:
+            if worker is not None and (not worker.alive or status == 'timeout'):
+                worker = await loop.run_in_executor(
+                    executor, self._replace_worker, worker, status == 'timeout'
+                )
+            # If the worker could not be replaced, keep its slot so that the
+            # next request can try again.
+            self.idle.put_nowait(worker)
+        return status, payload
+
+    def _replace_worker(self, worker=None, kill=False):
+        """
+        Stops a worker that has died or timed out and starts another one in
+        its place.
+
+        @returns
+            The new worker, or None if it could not be started.
+        """
+        if worker is not None:
+            worker.stop(kill)
+            self.workers.remove(worker)
+        try:
+            worker = Worker(self)
+            worker.wait_until_ready()
+        except (ServeError, OSError) as e:
+            print(e, file=sys.stderr)
+            return None
+        self.workers.append(worker)
+        return worker
+
+
+# ====== Event and response translation ====== #
+
+def make_event(method, target, headers, body, route):
+    """
+    Translates an HTTP request into an API Gateway proxy integration event.
+
+    @param method
+        The HTTP method.
+    @param target
+        The request target (path and query string) from the request line.
+    @param headers
+        A list of (name, value) tuples.
+    @param body
+        The request body, as bytes.
+    @param route
+        The path prefix under which the function is mounted.
+    """
+    url = urlsplit(target)
+    query = parse_qsl(url.query, keep_blank_values=True)
+
+    single_headers = {}
+    multi_headers = {}
+    for name, value in headers:
+        single_headers[name] = value
+        multi_headers.setdefault(name, []).append(value)
+
+    single_query = {}
+    multi_query = {}
+    for name, value in query:
+        single_query[name] = value
+        multi_query.setdefault(name, []).append(value)
+
+    proxy = url.path[len(route):].lstrip('/')
+
+    if not body:
+        body_text, is_base64 = None, False
+    else:
+        try:
+            body_text, is_base64 = body.decode('utf-8'), False
+        except UnicodeDecodeError:
+            body_text, is_base64 = base64.b64encode(body).decode('ascii'), True
+
+    return {
+        'resource': (route or '') + '/{proxy+}',
+        'path': url.path,
+        'httpMethod': method,
+        'headers': single_headers or None,
+        'multiValueHeaders': multi_headers or None,
+        'queryStringParameters': single_query or None,
+        'multiValueQueryStringParameters': multi_query or None,
+        'pathParameters': { 'proxy': proxy } if proxy else None,
+        'stageVariables': None,
+        'requestContext': {
+            'resourcePath': (route or '') + '/{proxy+}',
+            'httpMethod': method,
+            'path': url.path,
+            'stage': 'local',
+            'requestId': str(uuid.uuid4()),
+            'requestTimeEpoch': int(time.time() * 1000),
+            'identity': {
+                'sourceIp': '127.0.0.1',
+                'userAgent': single_headers.get('User-Agent')
+            }
+        },
+        'body': body_text,
+        'isBase64Encoded': is_base64
+    }
+
+
+def make_response(result):
+    """
+    Translates the (JSON-encoded) result of a proxy integration handler into an
+    HTTP response.
+
+    @returns
+        A tuple of (status code, list of (header, value) tuples, body bytes).
+    """
+    try:
+        result = json.loads(result)
+        status = int(result['statusCode'])
+    except (ValueError, TypeError, KeyError):
+        return error_response(502, 'Malformed Lambda proxy response')
+
+    headers = []
+    for name, value in (result.get('headers') or {}).items():
+        headers.append((name, str(value)))
+    for name, values in (result.get('multiValueHeaders') or {}).items():
+        headers.extend((name, str(value)) for value in values)
+
+    body = result.get('body') or ''
+    if result.get('isBase64Encoded'):
+        body = base64.b64decode(body)
+    else:
+        body = str(body).encode('utf-8')
+    return status, headers, body
+
+
+def error_response(status, message):
+    body = json.dumps({ 'message': message }).encode('utf-8')
+    return status, [('Content-Type', 'application/json')], body
+
+
+# ====== The gateway ====== #
+
+class Gateway(factoryfactory.Serviceable):
+    """
+    An asyncio HTTP server which routes requests to function pools.
+    """
+
+    def __init__(self, pools):
+        self.pools = sorted(pools, key=lambda pool: len(pool.route), reverse=True)
+
+    def find_pool(self, path):
+        for pool in self.pools:
+            if path == pool.route or path.startswith(pool.route + '/'):
+                return pool
+        return None
+
+    def metrics(self):
+        return dict([
+            (pool.name, pool.metrics.summary()) for pool in self.pools
+        ])
+
+    async def dispatch(self, method, target, headers, body):
+        path = urlsplit(target).path
+        if path == METRICS_PATH:
+            return 200, [('Content-Type', 'application/json')], \
+                json.dumps(self.metrics(), indent=2).encode('utf-8')
+
+        pool = self.find_pool(path)
+        if not pool:
+            return error_response(404, 'Not Found')
+
+        event = make_event(method, target, headers, body, pool.route)
+        started = time.perf_counter()
+        status, payload = await pool.invoke(self.loop, self.executor, event)
+        latency = time.perf_counter() - started
+        pool.metrics.record(latency, status != 'result')
+
+        if status == 'result':
+            return make_response(payload)
+        elif status == 'timeout':
+            return error_response(504, 'Endpoint request timed out')
+        else:
+            return error_response(502, 'Internal server error')
+
+    async def write_response(self, writer, response, keep_alive):
+        status, headers, body = response
+        lines = ['HTTP/1.1 {0} {1}'.format(status, STATUS_TEXT.get(status, ''))]
+        lines.extend('{0}: {1}'.format(name, value)
+            for name, value in headers
+            if name.lower() not in ('content-length', 'connection'))
+        lines.append('Content-Length: {0}'.format(len(body)))
+        lines.append('Connection: ' + ('keep-alive' if keep_alive else 'close'))
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        writer.write(body)
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = []
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers.append((name.strip(), value.strip()))
+                lower = dict((name.lower(), value) for name, value in headers)
+                if lower.get('transfer-encoding', 'identity').lower() != 'identity':
+                    # Chunked bodies are not supported, and as the body can
+                    # not be skipped, the connection can not be kept alive.
+                    await self.write_response(writer, error_response(
+                        411, 'Transfer-Encoding is not supported; send a Content-Length.'
+                    ), False)
+                    break
+                length = int(lower.get('content-length') or 0)
+                body = await reader.readexactly(length) if length else b''
+
+                response = await self.dispatch(method, target, headers, body)
+
+                keep_alive = version == 'HTTP/1.1' and \
+                    lower.get('connection', '').lower() != 'close'
+                await self.write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def start(self):
+        """
+        Pre-forks the workers for all the functions.
+        """
+        for pool in self.pools:
+            print('Starting {0} worker(s) for {1} at {2}/'.format(
+                pool.concurrency, pool.name, pool.route
+            ))
+            pool.start()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=sum(pool.concurrency for pool in self.pools) or 1
+        )
+
+    def stop(self):
+        for pool in self.pools:
+            pool.stop()
+        self.executor.shutdown(wait=False)
+
+    def serve(self, host, port):
+        self.loop = asyncio.new_event_loop()
+        self.start()
+        try:
+            server = self.loop.run_until_complete(
+                asyncio.start_server(self.handle_connection, host, port)
+            )
+            print('Serving on http://{0}:{1}/ (metrics at {2})'.format(
+                host, port, METRICS_PATH
+            ))
+            try:
+                self.loop.run_forever()
+            except KeyboardInterrupt:
+                pass
+            server.close()
+            self.loop.run_until_complete(server.wait_closed())
+        finally:
+            self.stop()
+            self.loop.close()
+        print(json.dumps(self.metrics(), indent=2))
+
+
+def create_pool(func, name, root, default_concurrency=1):
+    """
+    Creates the function pool for a function from its configuration.
+
+    @param func
+        The FunctionConfig for the function.
+    @param name
+        The name of the function.
+    @param root
+        The directory relative to which paths are to be resolved.
+    @param default_concurrency
+        The number of workers to start if the function does not specify it.
+    """
+    if not func.deploy:
+        raise ServeError(name + ' has no deploy section, so its handler is not known.')
+    func.build.resolve(root)
+    serve = func.serve
+    path = func.build.bundle if os.path.isdir(func.build.bundle) else func.build.source
+    return FunctionPool(
+        name=name,
+        path=os.path.realpath(path),
+        handler=func.deploy.handler,
+        route=(serve and serve.path) or '/' + name,
+        concurrency=(serve and serve.concurrency) or default_concurrency,
+        memory_size=func.deploy.memory_size,
+        timeout=func.deploy.timeout
+    )
@@ -0,0 +1,63 @@
+"""
+The handler shim for functions that are kept warm by scheduled warm-up events.
+
+This module is copied into the bundle of any function with a deploy.warmup
+section, and its handler is deployed in place of the function's own handler,
+which is named by an environment variable. Warm-up events are answered
+straight away, before they reach the function's code; everything else is
+passed through to it.
+
+It is imported inside Lambda, so it must not depend on anything except the
+standard library.
+"""
+
+import importlib
+import os
+import time
+
+# The key which marks an event as a warm-up event.
+WARMUP_KEY = 'ltools-warmup'
+
+# The environment variable naming the function's own handler.
+HANDLER_VARIABLE = 'LTOOLS_WARMUP_HANDLER'
+
+# The name of this module in the bundle, and its handler.
+MODULE_NAME = 'ltools_warmup'
+SHIM_HANDLER = MODULE_NAME + '.handler'
+
+# How long to hold each instance when warming several at once, so that the
+# concurrent warm-up events are not all handled by the same instance.
+CONCURRENT_DELAY = 0.1
+
+
+def load_handler(name):
+    """
+    Imports a handler specified in the format module.function.
+    """
+    module_name, function_name = name.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def is_warmup_event(event):
+    return isinstance(event, dict) and bool(event.get(WARMUP_KEY))
+
+
+def handler(event, context):
+    if is_warmup_event(event):
+        warmup = event[WARMUP_KEY]
+        if isinstance(warmup, dict) and warmup.get('concurrency', 1) > 1:
+            time.sleep(CONCURRENT_DELAY)
+        return { 'warmup': True }
+    return _handler(event, context)
+
+
+# Import the function's code now, so that warm-up events initialise it. This
+# is only done inside Lambda, where the module is imported as the shim, and
+# not when lambda-tools itself imports it for the names above.
+if __name__ == MODULE_NAME:
+    if not os.environ.get(HANDLER_VARIABLE):
+        raise RuntimeError(
+            'The environment variable ' + HANDLER_VARIABLE + ' is not set, ' +
+            'so the handler to pass events to is not known.'
+        )
+    _handler = load_handler(os.environ[HANDLER_VARIABLE])
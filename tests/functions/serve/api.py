@@ -0,0 +1,21 @@
+import json
+import time
+
+def handler(event, context):
+    return {
+        'statusCode': 200,
+        'headers': { 'Content-Type': 'application/json' },
+        'body': json.dumps({
+            'path': event['path'],
+            'proxy': (event['pathParameters'] or {}).get('proxy'),
+            'query': event['queryStringParameters'],
+            'body': event['body']
+        })
+    }
+
+def broken(event, context):
+    raise ValueError('broken')
+
+def slow(event, context):
+    time.sleep(float(event['queryStringParameters']['sleep']))
+    return handler(event, context)
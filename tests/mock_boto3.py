@@ -7,6 +7,22 @@ MOCK_AWS_REGION = "eu-west-1"
 
 mock_clients = {}
 
+# The calls that have been made to the mock clients. The mocks keep no other
+# state: tests that need a stateful AWS use lambda_tools.fake.
+recorded_calls = []
+
+
+def reset_calls():
+    del recorded_calls[:]
+
+
+def calls(*names):
+    """
+    Gets the names of the calls that have been made, optionally filtered to
+    only the specified names.
+    """
+    return [c[0] for c in recorded_calls if not names or c[0] in names]
+
 
 def client(name):
     def register(cls):
@@ -15,13 +31,26 @@ def client(name):
     return register
 
 
+class MockPaginator(object):
+
+    def __init__(self, method):
+        self.method = method
+
+    def paginate(self, *args, **kwargs):
+        return [self.method(*args, **kwargs)]
+
+
 @client('ec2')
 class MockEc2Client(object):
 
     def __init__(self, *args, **kwargs):
         pass
 
+    def get_paginator(self, name):
+        return MockPaginator(getattr(self, name))
+
     def describe_vpcs(self, *args, **kwargs):
+        recorded_calls.append(('describe_vpcs', kwargs))
         return {
             "Vpcs": [
                 {
@@ -34,16 +63,19 @@ class MockEc2Client(object):
         }
 
     def describe_subnets(self, *args, **kwargs):
+        recorded_calls.append(('describe_subnets', kwargs))
         return {
             "Subnets": [
                 {
                     "SubnetId": "subnet-12345678",
+                    "VpcId": "vpc-12345678",
                     "Tags": [
                         { "Key": "Name", "Value": "Public subnet" }
                     ]
                 },
                 {
                     "SubnetId": "subnet-11111111",
+                    "VpcId": "vpc-12345678",
                     "Tags": [
                         { "Key": "Name", "Value": "Private subnet" }
                     ]
@@ -52,6 +84,7 @@ class MockEc2Client(object):
         }
 
     def describe_security_groups(self, *args, **kwargs):
+        recorded_calls.append(('describe_security_groups', kwargs))
         return {
             "SecurityGroups": [
                 {
@@ -131,8 +164,8 @@ class MockSession(object):
     def client(self, service, region_name=None, *args, **kwargs):
         c = mock_clients.get(service)
         if c:
-            result = c(region_name=self.region_name, *args, **kwargs)
-            result.region_name = self.region_name or region_name
+            result = c(region_name=region_name or self.region_name, *args, **kwargs)
+            result.region_name = region_name or self.region_name
             return result
         else:
             return None
@@ -0,0 +1,98 @@
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import boto3
+import factoryfactory
+from lambda_tools import aws
+import mock_boto3
+
+
+class TestResolutionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'cache.json')
+        self.lookups = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def lookup(self):
+        self.lookups += 1
+        return 'value-{0}'.format(self.lookups)
+
+    def test_values_are_looked_up_once(self):
+        cache = aws.ResolutionCache()
+        self.assertEqual('value-1', cache.get(('a', 'b'), self.lookup))
+        self.assertEqual('value-1', cache.get(('a', 'b'), self.lookup))
+        self.assertEqual('value-2', cache.get(('a', 'c'), self.lookup))
+        self.assertEqual(2, self.lookups)
+
+    def test_scoped(self):
+        cache = aws.ResolutionCache()
+        cache.scoped(123, 'eu-west-1').get(('query',), self.lookup)
+        cache.scoped(123, 'eu-west-2').get(('query',), self.lookup)
+        cache.scoped(123, 'eu-west-1').get(('query',), self.lookup)
+        self.assertEqual(2, self.lookups)
+
+    def test_persisted(self):
+        cache = aws.ResolutionCache(self.filename)
+        cache.get(('a',), self.lookup)
+        cache.get(('b',), self.lookup, persist=False)
+        cache.save()
+        cache = aws.ResolutionCache(self.filename)
+        self.assertEqual('value-1', cache.get(('a',), self.lookup))
+        self.assertEqual('value-3', cache.get(('b',), self.lookup))
+
+    def test_empty_results_are_not_persisted(self):
+        cache = aws.ResolutionCache(self.filename)
+        self.assertEqual([], cache.get(('a',), lambda: []))
+        self.assertDictEqual({ ('b',): [], ('c',): [['vpc', 'id']], ('d',): None },
+            cache.get_many([('b',), ('c',), ('d',)], lambda keys: {
+                ('b',): [], ('c',): [['vpc', 'id']]
+            }))
+        # Within the run, the empty results are not looked up again.
+        self.assertEqual([], cache.get(('a',), self.lookup))
+        self.assertEqual(0, self.lookups)
+        cache.save()
+
+        cache = aws.ResolutionCache(self.filename)
+        self.assertEqual('value-1', cache.get(('a',), self.lookup))
+        self.assertDictEqual({ ('b',): 'found', ('c',): [['vpc', 'id']], ('d',): 'found' },
+            cache.get_many([('b',), ('c',), ('d',)], lambda keys: dict([
+                (key, 'found') for key in keys
+            ])))
+
+    def test_expired(self):
+        cache = aws.ResolutionCache(self.filename, ttl=-1)
+        cache.get(('a',), self.lookup)
+        cache.save()
+        cache = aws.ResolutionCache(self.filename)
+        self.assertEqual('value-2', cache.get(('a',), self.lookup))
+
+
+class TestClientPool(unittest.TestCase):
+
+    def setUp(self):
+        services = factoryfactory.ServiceLocator()
+        services.register(boto3.Session, mock_boto3.MockSession)
+        self.pool = services.get(aws.ClientPool)
+
+    def test_default_region(self):
+        self.assertEqual(mock_boto3.MOCK_AWS_REGION, self.pool.region_name)
+
+    def test_clients_are_reused(self):
+        self.assertIs(self.pool.client('lambda'), self.pool.client('lambda'))
+        self.assertIs(
+            self.pool.client('lambda', 'us-east-1'),
+            self.pool.client('lambda', 'us-east-1')
+        )
+
+    def test_one_client_per_service_and_region(self):
+        self.assertIsNot(self.pool.client('lambda'), self.pool.client('kms'))
+        self.assertIsNot(
+            self.pool.client('lambda', 'eu-west-1'),
+            self.pool.client('lambda', 'us-east-1')
+        )
@@ -1,4 +1,6 @@
 import os.path
+import shutil
+import tempfile
 import unittest
 import zipfile
 
@@ -19,3 +21,58 @@ class TestIgnores(unittest.TestCase):
         zf = zipfile.ZipFile(self.package.build.package)
         files = zf.namelist()
         self.assertListEqual(files, ['another.py', 'main.py'])
+
+
+class TestPipCommand(unittest.TestCase):
+
+    def setUp(self):
+        root = os.path.join(os.path.dirname(__file__), 'functions')
+        cfg = configuration.load(os.path.join(root, 'aws-lambda.yml'))
+        self.func = cfg.functions['ignores']
+
+    def get_command(self, architecture, use_docker=False, runtime='python3.6'):
+        self.func.architecture = architecture
+        self.func.build.use_docker = use_docker
+        self.func.runtime = runtime
+        package = build.Package(self.func, '')
+        return package.get_pip_command('requirements.txt')
+
+    def test_x86_64(self):
+        cmd = self.get_command('x86_64')
+        self.assertNotIn('--platform', cmd)
+
+    def test_arm64(self):
+        cmd = self.get_command('arm64', runtime='python3.11')
+        self.assertEqual('manylinux2014_aarch64', cmd[cmd.index('--platform') + 1])
+        self.assertEqual('3.11', cmd[cmd.index('--python-version') + 1])
+        self.assertIn('--only-binary=:all:', cmd)
+
+    def test_arm64_docker(self):
+        cmd = self.get_command('arm64', use_docker=True, runtime='python3.11')
+        self.assertEqual('linux/arm64', cmd[cmd.index('--platform') + 1])
+        self.assertIn('python:3.11', cmd)
+
+
+class TestWarmupShim(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        root = os.path.join(os.path.dirname(__file__), 'functions')
+        cfg = configuration.load(os.path.join(root, 'aws-lambda.yml'))
+        self.func = cfg.functions['serve']
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def add_shim(self):
+        package = build.Package(self.func, 'serve')
+        package.bundle_folder = self.folder
+        package.add_warmup_shim()
+        return os.path.isfile(os.path.join(self.folder, 'ltools_warmup.py'))
+
+    def test_shim_is_added(self):
+        self.func.deploy.warmup = configuration.WarmupConfig()
+        self.assertTrue(self.add_shim())
+
+    def test_shim_is_not_added(self):
+        self.assertFalse(self.add_shim())
@@ -0,0 +1,149 @@
+import os
+import os.path
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import yaml
+
+from lambda_tools import changes
+from lambda_tools import command
+from lambda_tools import configuration
+
+
+class TestChangedFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = os.path.realpath(tempfile.mkdtemp())
+        self.filename = os.path.join(self.folder, 'aws-lambda.yml')
+        self.functions = {
+            'alpha': {
+                'build': {
+                    'source': 'src/alpha',
+                    'requirements': [{ 'file': 'requirements/alpha.txt' }]
+                }
+            },
+            'beta': {
+                'build': { 'source': 'src/beta' },
+                'test': { 'source': 'tests/beta' }
+            },
+            'gamma': {
+                'build': { 'source': 'src/gamma' }
+            }
+        }
+        self.write_config()
+        for name in ['src/alpha/main.py', 'requirements/alpha.txt',
+                'src/beta/main.py', 'tests/beta/test_main.py', 'src/gamma/main.py']:
+            self.write(name, '# ' + name)
+        self.git('init', '-q')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'Initial commit')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def git(self, *args):
+        subprocess.run(
+            ['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com'] + list(args),
+            cwd=self.folder, check=True, stdout=subprocess.PIPE
+        )
+
+    def write(self, name, content):
+        filename = os.path.join(self.folder, name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w') as f:
+            f.write(content)
+
+    def write_config(self):
+        self.write('aws-lambda.yml', yaml.safe_dump({ 'functions': self.functions }))
+
+    def get_changed(self, names=None):
+        config = configuration.load(self.filename)
+        return changes.get_changed_functions(config, 'HEAD', names)
+
+    def test_no_changes(self):
+        self.assertListEqual([], self.get_changed())
+
+    def test_source_changed(self):
+        self.write('src/alpha/main.py', '# changed')
+        self.assertListEqual(['alpha'], self.get_changed())
+
+    def test_requirements_changed(self):
+        self.write('requirements/alpha.txt', 'requests')
+        self.assertListEqual(['alpha'], self.get_changed())
+
+    def test_untracked_test_file(self):
+        self.write('tests/beta/test_other.py', '# new')
+        self.assertListEqual(['beta'], self.get_changed())
+
+    def test_deleted_file(self):
+        os.remove(os.path.join(self.folder, 'src/gamma/main.py'))
+        self.assertListEqual(['gamma'], self.get_changed())
+
+    def test_committed_change(self):
+        self.write('src/gamma/main.py', '# changed')
+        self.git('commit', '-q', '-a', '-m', 'Change gamma')
+        config = configuration.load(self.filename)
+        self.assertListEqual(['gamma'], changes.get_changed_functions(config, 'HEAD~1'))
+        self.assertListEqual([], changes.get_changed_functions(config, 'HEAD'))
+
+    def test_configuration_changed(self):
+        self.functions['beta']['runtime'] = 'python3.8'
+        self.functions['delta'] = { 'build': { 'source': 'src/delta' } }
+        self.write_config()
+        self.assertListEqual(['beta', 'delta'], self.get_changed())
+
+    def test_unrelated_change(self):
+        self.write('README.md', 'Read me')
+        self.write('src/alphabet/main.py', '# not alpha')
+        self.assertListEqual([], self.get_changed())
+
+    def test_source_is_top_folder(self):
+        self.functions['delta'] = { 'build': { 'source': '.' } }
+        self.write_config()
+        self.git('commit', '-q', '-a', '-m', 'Add delta')
+        self.write('README.md', 'Read me')
+        self.assertListEqual(['delta'], self.get_changed())
+
+    def test_selected_names(self):
+        self.write('src/alpha/main.py', '# changed')
+        self.write('src/beta/main.py', '# changed')
+        self.assertListEqual(['beta'], self.get_changed(['beta', 'gamma']))
+
+    def test_included_file_changed(self):
+        self.write('aws-lambda.yml', yaml.safe_dump({
+            'include': ['services/*.yml'],
+            'functions': self.functions
+        }))
+        self.write('services/epsilon.yml', yaml.safe_dump({
+            'functions': { 'epsilon': { 'build': { 'source': 'src' } } }
+        }))
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'Add a service')
+        self.write('services/epsilon.yml', yaml.safe_dump({
+            'functions': { 'epsilon': { 'build': { 'source': 'src' }, 'runtime': 'python3.8' } }
+        }))
+        self.assertListEqual(['epsilon'], self.get_changed())
+
+    def test_bad_revision(self):
+        config = configuration.load(self.filename)
+        self.assertRaises(changes.ChangesError,
+            lambda: changes.get_changed_functions(config, 'no-such-revision'))
+
+    def test_command(self):
+        self.write('src/alpha/main.py', '# changed')
+        self.functions['gamma']['runtime'] = 'cobol'
+        self.write_config()
+        with self.assertRaises(Exception) as cm:
+            command.entrypoint(['validate', '-s', self.filename, '--no-cache',
+                '--changed-since', 'HEAD'])
+        self.assertIn('gamma', str(cm.exception))
+        self.assertNotIn('alpha', str(cm.exception))
+
+    def test_undefined_function(self):
+        self.write('src/alpha/main.py', '# changed')
+        with self.assertRaises(ValueError) as cm:
+            command.entrypoint(['validate', '-s', self.filename, '--no-cache',
+                '--changed-since', 'HEAD', 'nosuch'])
+        self.assertIn('Undefined functions: nosuch', str(cm.exception))
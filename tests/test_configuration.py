@@ -1,9 +1,14 @@
+import json
 import os.path
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 import yaml
 
 import boto3
 import factoryfactory
+from lambda_tools import aws
 from lambda_tools import configuration
 from lambda_tools import mapper
 import mock_boto3
@@ -29,6 +34,9 @@ class TestSchema(unittest.TestCase):
     def test_runtime(self):
         self.assertEqual(self.func.runtime, 'python3.6')
 
+    def test_architecture(self):
+        self.assertEqual('x86_64', self.func.architecture)
+
 
     def test_build(self):
         build = self.func.build
@@ -87,6 +95,254 @@ class TestSchema(unittest.TestCase):
         self.assertEqual('some-dead-letter-arn', self.func.deploy.dead_letter_config.target_arn)
 
 
+class TestLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.filename = os.path.join(os.path.dirname(__file__), 'aws-lambda-1.yml')
+
+    def test_data_is_discarded(self):
+        config = configuration.load(self.filename)
+        self.assertEqual('python3.6', config.functions['test-0.1'].runtime)
+        self.assertEqual(os.path.dirname(self.filename), config.root)
+        self.assertIsNone(config.data)
+        self.assertIsNone(config.raw_data)
+
+    def test_retain_data(self):
+        config = configuration.load(self.filename, retain_data=True)
+        self.assertEqual(load_yaml('aws-lambda-1.yml'), config.raw_data)
+        self.assertIn('test-0.1', config.data['functions'])
+
+    def test_json(self):
+        folder = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(folder, 'aws-lambda.json')
+            with open(filename, 'w') as f:
+                json.dump(load_yaml('aws-lambda-1.yml'), f)
+            config = configuration.load(filename, retain_data=True)
+            self.assertEqual(load_yaml('aws-lambda-1.yml'), config.raw_data)
+            self.assertEqual('python3.6', config.functions['test-0.1'].runtime)
+        finally:
+            shutil.rmtree(folder)
+
+    def test_read_data(self):
+        with open(self.filename, 'rb') as f:
+            content = f.read()
+        self.assertEqual(yaml.safe_load(content), configuration.read_data(content, self.filename))
+        self.assertRaises(ValueError, lambda: configuration.read_data(b'version: 1', 'a.json'))
+
+    def test_no_instance_dicts(self):
+        config = configuration.load(self.filename)
+        self.assertFalse(hasattr(config, '__dict__'))
+        self.assertFalse(hasattr(config.functions['test-0.1'].deploy, '__dict__'))
+
+
+class TestLoadCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'aws-lambda.yml')
+        self.cache_file = os.path.join(self.folder, '.ltools-config-cache')
+        shutil.copy(os.path.join(os.path.dirname(__file__), 'aws-lambda-1.yml'), self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_cached_load_does_not_parse(self):
+        configuration.load(self.filename, cache_file=self.cache_file)
+        self.assertTrue(os.path.isfile(self.cache_file))
+        with mock.patch('lambda_tools.configuration.read_data', side_effect=AssertionError('parsed')):
+            config = configuration.load(self.filename, cache_file=self.cache_file)
+        self.assertEqual('python3.6', config.functions['test-0.1'].runtime)
+        self.assertEqual(self.folder, config.root)
+
+    def test_changed_file_is_parsed(self):
+        configuration.load(self.filename, cache_file=self.cache_file)
+        with open(self.filename, 'a') as f:
+            f.write('version: 2\n')
+        config = configuration.load(self.filename, cache_file=self.cache_file)
+        self.assertEqual(2, config.version)
+
+    def test_retained_data_comes_from_cache(self):
+        configuration.load(self.filename, cache_file=self.cache_file)
+        with mock.patch('lambda_tools.configuration.read_data',
+                side_effect=AssertionError('parsed')):
+            config = configuration.load(self.filename, retain_data=True,
+                cache_file=self.cache_file)
+        self.assertIn('test-0.1', config.raw_data['functions'])
+
+    def test_cache_is_json(self):
+        configuration.load(self.filename, cache_file=self.cache_file)
+        with open(self.cache_file) as f:
+            header = json.loads(f.readline())
+            entry = json.loads(f.read())
+        self.assertEqual(configuration.get_cache_key(open(self.filename, 'rb').read()),
+            header['key'])
+        self.assertEqual(load_yaml('aws-lambda-1.yml'), entry['data'])
+
+    def test_data_that_is_not_json_is_not_cached(self):
+        configuration.write_cache(self.cache_file, 'key', None, None, { 'data': { 1: 'one' } })
+        self.assertFalse(os.path.exists(self.cache_file))
+        configuration.write_cache(self.cache_file, 'key', None, None, { 'data': { 'one': 1 } })
+        self.assertEqual({ 'data': { 'one': 1 } }, configuration.read_cache(self.cache_file, 'key'))
+
+    def test_changed_schema_is_parsed(self):
+        configuration.load(self.filename, cache_file=self.cache_file)
+        with mock.patch('lambda_tools.configuration._schema_fingerprint', 'other'):
+            with mock.patch('lambda_tools.configuration.read_data',
+                    side_effect=AssertionError('parsed')):
+                self.assertRaises(AssertionError,
+                    lambda: configuration.load(self.filename, cache_file=self.cache_file))
+
+    def test_schema_fingerprint(self):
+        fingerprint = configuration.get_schema_fingerprint()
+        with mock.patch('lambda_tools.configuration._schema_fingerprint', None):
+            with mock.patch.dict(configuration.WarmupConfig.__fields__,
+                    { 'extra': mapper.StringField() }):
+                self.assertNotEqual(fingerprint, configuration.get_schema_fingerprint())
+
+    def test_cache_file_is_outside_project(self):
+        with mock.patch.dict(os.environ, { 'XDG_CACHE_HOME': '/cache' }):
+            cache_file = configuration.get_cache_file(self.filename)
+        self.assertEqual(os.path.join('/cache', 'lambda-tools'), os.path.dirname(cache_file))
+        self.assertTrue(cache_file.endswith('.json'))
+
+    def test_new_version_is_parsed(self):
+        configuration.load(self.filename, cache_file=self.cache_file)
+        with mock.patch('lambda_tools.configuration.VERSION', 'next'):
+            with mock.patch('lambda_tools.configuration.read_data', side_effect=AssertionError('parsed')):
+                self.assertRaises(AssertionError,
+                    lambda: configuration.load(self.filename, cache_file=self.cache_file))
+
+    def test_corrupt_cache_is_ignored(self):
+        with open(self.cache_file, 'wb') as f:
+            f.write(b'not a cache')
+        config = configuration.load(self.filename, cache_file=self.cache_file)
+        self.assertEqual(1, config.version)
+
+
+class TestLazyFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'aws-lambda.yml')
+        with open(self.filename, 'w') as f:
+            yaml.safe_dump({
+                'functions': {
+                    'valid': { 'build': { 'source': 'src' } },
+                    'invalid': { 'build': { 'source': 'src' }, 'runtime': 'cobol' }
+                }
+            }, f)
+        self.config = configuration.load(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_only_used_functions_are_parsed(self):
+        functions = self.config.get_functions(['valid'])
+        self.assertEqual('src', functions['valid'].build.source)
+        self.assertRaises(mapper.MappingError, lambda: self.config.get_functions(['invalid']))
+
+    def test_check_functions(self):
+        self.assertDictEqual({}, self.config.check_functions(['valid']))
+        self.assertListEqual(['invalid'], list(self.config.check_functions([])))
+        self.assertRaises(ValueError, lambda: self.config.check_functions(['missing']))
+
+    def test_validate_command(self):
+        from lambda_tools import command
+        command.entrypoint(['validate', '-s', self.filename, '--no-cache', 'valid'])
+        self.assertRaises(mapper.MappingError, lambda: command.entrypoint(
+            ['validate', '-s', self.filename, '--no-cache']
+        ))
+
+
+class TestInclude(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'aws-lambda.yml')
+        self.cache_file = os.path.join(self.folder, '.ltools-config-cache')
+        self.write('aws-lambda.yml', {
+            'include': ['services/*/functions.yml'],
+            'functions': { 'main': { 'build': { 'source': 'src' } } }
+        })
+        self.write('services/one/functions.yml', {
+            'functions': { 'one': { 'build': { 'source': 'src' } } }
+        })
+        self.write('services/two/functions.yml', {
+            'functions': { 'two': { 'build': { 'source': 'src' }, 'runtime': 'python3.8' } }
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, name, data):
+        filename = os.path.join(self.folder, name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w') as f:
+            yaml.safe_dump(data, f)
+
+    def test_functions_are_merged(self):
+        config = configuration.load(self.filename)
+        self.assertListEqual(['main', 'one', 'two'], sorted(config.functions))
+        self.assertEqual('python3.8', config.functions['two'].runtime)
+
+    def test_paths_are_relative_to_each_file(self):
+        config = configuration.load(self.filename)
+        self.assertEqual(self.folder, config.get_root('main'))
+        root = config.get_root('one')
+        self.assertEqual(os.path.join(self.folder, 'services', 'one'), root)
+        build = config.functions['one'].build
+        build.resolve(root)
+        self.assertEqual(os.path.join(root, 'src'), build.source)
+
+    def test_duplicate_names(self):
+        self.write('services/three/functions.yml', {
+            'functions': { 'one': { 'build': { 'source': 'src' } } }
+        })
+        with self.assertRaises(mapper.MappingError) as cm:
+            configuration.load(self.filename)
+        self.assertIn('Function "one" is defined in both', str(cm.exception))
+
+    def test_nested_include(self):
+        self.write('services/one/functions.yml', {
+            'include': ['*.yml'],
+            'functions': { 'one': { 'build': { 'source': 'src' } } }
+        })
+        self.assertRaises(mapper.MappingError, lambda: configuration.load(self.filename))
+
+    def test_only_includes(self):
+        self.write('aws-lambda.yml', { 'include': ['services/**/*.yml'] })
+        config = configuration.load(self.filename)
+        self.assertListEqual(['one', 'two'], sorted(config.functions))
+
+    def test_no_functions(self):
+        self.write('aws-lambda.yml', { 'version': 1 })
+        self.assertRaises(mapper.MappingError, lambda: configuration.load(self.filename))
+
+    def test_retained_data(self):
+        config = configuration.load(self.filename, retain_data=True)
+        self.assertEqual('python3.8', config.raw_data['functions']['two']['runtime'])
+
+    def test_cache_covers_included_files(self):
+        configuration.load(self.filename, cache_file=self.cache_file)
+        with mock.patch('lambda_tools.configuration.read_data',
+                side_effect=AssertionError('parsed')):
+            config = configuration.load(self.filename, cache_file=self.cache_file)
+        self.assertEqual(os.path.join(self.folder, 'services', 'two'), config.get_root('two'))
+
+        self.write('services/two/functions.yml', {
+            'functions': { 'two': { 'build': { 'source': 'src' }, 'runtime': 'python3.9' } }
+        })
+        config = configuration.load(self.filename, cache_file=self.cache_file)
+        self.assertEqual('python3.9', config.functions['two'].runtime)
+
+        self.write('services/three/functions.yml', {
+            'functions': { 'three': { 'build': { 'source': 'src' } } }
+        })
+        config = configuration.load(self.filename, cache_file=self.cache_file)
+        self.assertIn('three', config.functions)
+
+
 class TestBuildResolve(unittest.TestCase):
 
     def assertPathEqual(self, path1, path2, *args, **kwargs):
@@ -203,3 +459,53 @@ class TestDeployResolve(unittest.TestCase):
             ['subnet-12345678', 'subnet-11111111'],
             [x.id for x in deploy.vpc_config.subnets]
         )
+
+
+class TestBatchedVpcResolve(unittest.TestCase):
+
+    def get_deploy(self, subnets):
+        return mapper.parse(configuration.DeployConfig, {
+            'handler': 'hello.handler',
+            'role': 'service-role/NONTF-lambda',
+            'vpc_config': {
+                'subnets': subnets,
+                'security_groups': ['allow_database']
+            }
+        })
+
+    def setUp(self):
+        mock_boto3.reset_calls()
+        self.services = factoryfactory.ServiceLocator()
+        self.services.register(boto3.Session, mock_boto3.MockSession)
+        self.services.register(aws.ResolutionCache, aws.ResolutionCache, singleton=True)
+        self.deploys = [
+            self.get_deploy(['Public subnet']),
+            self.get_deploy(['Private subnet', {'id': 'subnet-99999999'}]),
+            self.get_deploy(['Public subnet', 'Private subnet'])
+        ]
+
+    def test_one_query_per_resource_type(self):
+        configuration.resolve_all_vpc_configs(self.services, self.deploys)
+        self.assertListEqual(
+            ['describe_subnets', 'describe_security_groups'],
+            sorted(mock_boto3.calls(), reverse=True)
+        )
+
+    def test_ids_are_distributed(self):
+        configuration.resolve_all_vpc_configs(self.services, self.deploys)
+        self.assertListEqual(
+            [['subnet-12345678'], ['subnet-11111111', 'subnet-99999999'],
+                ['subnet-12345678', 'subnet-11111111']],
+            [[s.id for s in d.vpc_config.subnets] for d in self.deploys]
+        )
+        self.assertListEqual(
+            ['sg-12345678'] * 3,
+            [d.vpc_config.security_groups[0].id for d in self.deploys]
+        )
+
+    def test_no_further_queries_when_deploying(self):
+        configuration.resolve_all_vpc_configs(self.services, self.deploys)
+        mock_boto3.reset_calls()
+        for deploy in self.deploys:
+            deploy.resolve(self.services)
+        self.assertListEqual([], mock_boto3.calls())
@@ -0,0 +1,806 @@
+import base64
+import hashlib
+import json
+import mmap
+import os.path
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from unittest import mock
+
+import botocore.exceptions
+import factoryfactory
+from lambda_tools import build
+from lambda_tools import configuration
+from lambda_tools import deploy
+from lambda_tools import fake
+from lambda_tools import journal
+from lambda_tools import mapper
+
+
+def sha256(data):
+    return base64.b64encode(hashlib.sha256(data).digest()).decode('ascii')
+
+
+def client_error(code, operation='UpdateFunctionCode', message=None):
+    return botocore.exceptions.ClientError(
+        { 'Error': { 'Code': code, 'Message': message or code } }, operation
+    )
+
+
+class TestThrottle(unittest.TestCase):
+
+    def setUp(self):
+        self.throttle = deploy.Throttle(base_delay=0.001, max_delay=0.01, max_attempts=4)
+        self.calls = 0
+
+    def flaky(self, failures, code, operation='UpdateFunctionCode', message=None):
+        def method(**kwargs):
+            self.calls += 1
+            if self.calls <= failures:
+                raise client_error(code, operation, message)
+            return kwargs
+        return method
+
+    def test_success(self):
+        result = self.throttle.call(self.flaky(0, None), x=1)
+        self.assertDictEqual({ 'x': 1 }, result)
+        self.assertEqual(1, self.calls)
+
+    def test_retries_when_throttled(self):
+        result = self.throttle.call(self.flaky(2, 'TooManyRequestsException'), x=1)
+        self.assertDictEqual({ 'x': 1 }, result)
+        self.assertEqual(3, self.calls)
+
+    def test_retries_on_conflict(self):
+        self.throttle.call(self.flaky(1, 'ResourceConflictException'))
+        self.assertEqual(2, self.calls)
+
+    def test_does_not_retry_when_resource_exists(self):
+        for operation in ('CreateFunction', 'CreateAlias', 'AddPermission'):
+            self.calls = 0
+            self.assertRaises(
+                botocore.exceptions.ClientError,
+                lambda: self.throttle.call(self.flaky(1, 'ResourceConflictException', operation))
+            )
+            self.assertEqual(1, self.calls)
+        self.assertEqual(0.0, self.throttle.interval)
+
+    def test_retries_create_when_update_is_in_progress(self):
+        self.throttle.call(self.flaky(1, 'ResourceConflictException', 'CreateAlias',
+            'The operation cannot be performed at this time. An update is in progress '
+            'for resource: hello'))
+        self.assertEqual(2, self.calls)
+
+    def test_gives_up_eventually(self):
+        self.assertRaises(
+            botocore.exceptions.ClientError,
+            lambda: self.throttle.call(self.flaky(10, 'TooManyRequestsException'))
+        )
+        self.assertEqual(4, self.calls)
+
+    def test_other_errors_are_not_retried(self):
+        self.assertRaises(
+            botocore.exceptions.ClientError,
+            lambda: self.throttle.call(self.flaky(1, 'AccessDeniedException'))
+        )
+        self.assertEqual(1, self.calls)
+
+    def test_interval_adapts(self):
+        self.throttle.call(self.flaky(2, 'TooManyRequestsException'))
+        self.assertGreater(self.throttle.interval, 0)
+
+
+class TestUpdateWaiter(unittest.TestCase):
+
+    class Client:
+
+        def __init__(self, polls):
+            self.polls = polls
+            self.calls = []
+            self.lock = threading.Lock()
+
+        def get_function_configuration(self, FunctionName):
+            with self.lock:
+                self.calls.append((FunctionName, threading.current_thread()))
+                self.polls[FunctionName] -= 1
+                status = 'InProgress' if self.polls[FunctionName] > 0 else 'Successful'
+            return { 'FunctionName': FunctionName, 'LastUpdateStatus': status }
+
+    def setUp(self):
+        self.services = factoryfactory.ServiceLocator()
+        self.waiter = self.services.get(deploy.UpdateWaiter, 0.001, 0.01, 5)
+
+    def test_ready(self):
+        self.assertTrue(deploy.is_ready({}))
+        self.assertTrue(deploy.is_ready({ 'State': 'Active', 'LastUpdateStatus': 'Successful' }))
+        self.assertFalse(deploy.is_ready({ 'State': 'Pending' }))
+        self.assertFalse(deploy.is_ready({ 'State': 'Active', 'LastUpdateStatus': 'InProgress' }))
+
+    def test_wait(self):
+        client = self.Client({ 'hello': 3 })
+        state = self.waiter.wait(client, 'hello')
+        self.assertEqual('Successful', state['LastUpdateStatus'])
+        self.assertEqual(3, len(client.calls))
+
+    def test_many_functions_are_polled_by_one_thread(self):
+        polls = dict([('fn{0}'.format(i), i % 4 + 1) for i in range(20)])
+        client = self.Client(dict(polls))
+        futures = [self.waiter.watch(client, name) for name in polls]
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(sum(polls.values()), len(client.calls))
+        self.assertEqual(1, len(set([thread for name, thread in client.calls])))
+
+    def test_timeout(self):
+        waiter = self.services.get(deploy.UpdateWaiter, 0.001, 0.01, 0.05)
+        client = self.Client({ 'hello': 1000000 })
+        self.assertRaises(deploy.DeployError, lambda: waiter.wait(client, 'hello'))
+
+    def test_scheduler_stops_when_idle(self):
+        self.waiter.wait(self.Client({ 'hello': 2 }), 'hello')
+        time.sleep(0.05)
+        self.assertIsNone(self.waiter._thread)
+
+
+class TestPackageBudget(unittest.TestCase):
+
+    def test_budget_blocks_until_released(self):
+        budget = deploy.PackageBudget(100)
+        events = []
+        def second():
+            with budget.reserve(60):
+                events.append('second')
+        with budget.reserve(60):
+            thread = threading.Thread(target=second)
+            thread.start()
+            thread.join(0.1)
+            events.append('first')
+        thread.join()
+        self.assertListEqual(['first', 'second'], events)
+        self.assertEqual(0, budget.in_use)
+
+    def test_oversized_package_is_allowed_alone(self):
+        budget = deploy.PackageBudget(100)
+        with budget.reserve(500):
+            self.assertEqual(500, budget.in_use)
+
+
+class DeployerTestCase(unittest.TestCase):
+    """
+    Base class for tests that deploy a function to the fake AWS backend.
+    """
+
+    CODE = b'PK\x05\x06' + b'\x00' * 18
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.package = os.path.join(self.folder, 'hello.zip')
+        self.write_package(self.CODE)
+        self.services = factoryfactory.ServiceLocator()
+        self.backend = fake.register(self.services)
+        config = configuration.Configuration()
+        config.root = self.folder
+        self.services.register(configuration.Configuration, config)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_package(self, data):
+        with open(self.package, 'wb') as f:
+            f.write(data)
+
+    def get_function_data(self):
+        return {
+            'build': {
+                'source': 'src',
+                'package': 'hello.zip'
+            },
+            'deploy': {
+                'handler': 'hello.handler',
+                'role': 'service-role/NONTF-lambda',
+                'tags': { 'wibble': 'wobble' }
+            }
+        }
+
+    def deploy(self, data=None):
+        func = mapper.parse(configuration.FunctionConfig, data or self.get_function_data())
+        deployer = self.services.get(deploy.Deployer, func, 'hello')
+        deployer.deploy()
+        return deployer
+
+    def calls(self, *names):
+        """
+        Gets the names of the calls that have been made with the specified
+        names, in order.
+        """
+        return [name for name, kwargs in self.backend.log if name in names]
+
+    def get_arguments(self, name):
+        """
+        Gets the arguments of each call that has been made with a name.
+        """
+        return [kwargs for call, kwargs in self.backend.log if call == name]
+
+    def get_function(self, name='hello', region=None):
+        return self.backend.functions[(region or self.backend.region_name, name)]
+
+
+class TestDeployCode(DeployerTestCase):
+
+    def test_create(self):
+        deployer = self.deploy()
+        self.assertEqual(['lambda:CreateFunction'], self.calls('lambda:CreateFunction', 'lambda:UpdateFunctionCode'))
+        self.assertEqual('1', deployer.version)
+
+    def test_code_is_memory_mapped(self):
+        self.deploy()
+        code = self.get_arguments('lambda:CreateFunction')[0]['Code']['ZipFile']
+        self.assertIsInstance(code, mmap.mmap)
+        self.assertTrue(code.closed)
+
+    def test_code_is_uploaded_when_changed(self):
+        self.deploy()
+        self.write_package(self.CODE + b'changed')
+        deployer = self.deploy()
+        self.assertEqual(['lambda:UpdateFunctionCode'], self.calls('lambda:UpdateFunctionCode', 'lambda:PublishVersion'))
+        self.assertEqual('2', deployer.version)
+
+    def test_code_is_not_uploaded_when_unchanged(self):
+        self.deploy()
+        self.deploy()
+        self.assertEqual([], self.calls('lambda:UpdateFunctionCode', 'lambda:PublishVersion'))
+
+    def test_recorded_hash_is_used(self):
+        self.deploy()
+        self.write_package(self.CODE + b'changed')
+        build.record_code_sha256(self.package, sha256(self.CODE))
+        self.deploy()
+        self.assertEqual([], self.calls('lambda:UpdateFunctionCode'))
+
+    def test_recorded_hash_is_ignored_for_replaced_package(self):
+        self.deploy()
+        build.record_code_sha256(self.package)
+        mtime = os.stat(self.package).st_mtime_ns
+        # Replace the package with one of the same size, as cp -p would.
+        self.write_package(self.CODE[:-1] + b'!')
+        os.utime(self.package, ns=(mtime - 10 ** 9, mtime - 10 ** 9))
+        self.deploy()
+        self.assertEqual(['lambda:UpdateFunctionCode'], self.calls('lambda:UpdateFunctionCode'))
+
+
+class TestDeployConfiguration(DeployerTestCase):
+
+    def get_update(self):
+        calls = self.get_arguments('lambda:UpdateFunctionConfiguration')
+        return calls[0] if calls else None
+
+    def test_unchanged_configuration_is_not_sent(self):
+        self.deploy()
+        self.deploy()
+        self.assertIsNone(self.get_update())
+
+    def test_only_changes_are_sent(self):
+        self.deploy()
+        data = self.get_function_data()
+        data['deploy']['memory_size'] = 256
+        self.deploy(data)
+        self.assertDictEqual({ 'FunctionName': 'hello', 'MemorySize': 256 }, self.get_update())
+
+    def test_configuration_changes_are_published(self):
+        self.deploy()
+        data = self.get_function_data()
+        data['deploy']['timeout'] = 30
+        deployer = self.deploy(data)
+        self.assertEqual(['lambda:PublishVersion'], self.calls('lambda:UpdateFunctionCode', 'lambda:PublishVersion'))
+        self.assertEqual('2', deployer.version)
+
+
+class TestWaitForUpdates(DeployerTestCase):
+
+    def setUp(self):
+        DeployerTestCase.setUp(self)
+        self.services.register(deploy.UpdateWaiter,
+            self.services.get(deploy.UpdateWaiter, 0.001, 0.01), singleton=True)
+        self.backend.update_duration = 0.02
+
+    def test_create_waits_until_active(self):
+        self.deploy()
+        self.assertEqual('Active', self.get_function().get_configuration()['State'])
+        self.assertGreater(len(self.calls('lambda:GetFunctionConfiguration')), 0)
+        self.assertEqual(0, sum(self.backend.errors.values()))
+
+    def test_code_is_updated_after_configuration(self):
+        self.deploy()
+        data = self.get_function_data()
+        data['deploy']['timeout'] = 30
+        self.write_package(self.CODE + b'changed')
+        self.backend.reset_calls()
+        self.deploy(data)
+        calls = self.calls(
+            'lambda:UpdateFunctionConfiguration', 'lambda:UpdateFunctionCode', 'lambda:GetFunctionConfiguration'
+        )
+        self.assertListEqual(
+            ['lambda:UpdateFunctionConfiguration', 'lambda:UpdateFunctionCode'],
+            [call for call in calls if call != 'lambda:GetFunctionConfiguration']
+        )
+        self.assertEqual('lambda:GetFunctionConfiguration',
+            calls[calls.index('lambda:UpdateFunctionCode') - 1])
+        self.assertEqual(0, sum(self.backend.errors.values()))
+
+    def test_failed_update(self):
+        self.deploy()
+        data = self.get_function_data()
+        data['deploy']['timeout'] = 30
+        self.get_function().failed = True
+        self.assertRaises(deploy.DeployError, lambda: self.deploy(data))
+
+
+class TestDeployTags(DeployerTestCase):
+
+    TAG_CALLS = ('lambda:ListTags', 'lambda:TagResource', 'lambda:UntagResource')
+
+    def get_tags(self):
+        return self.get_function().tags
+
+    def test_tags_on_create(self):
+        self.deploy()
+        self.assertDictEqual({ 'wibble': 'wobble' }, self.get_tags())
+
+    def test_unchanged_tags(self):
+        self.deploy()
+        self.backend.reset_calls()
+        self.deploy()
+        self.assertListEqual([], self.calls(*self.TAG_CALLS))
+
+    def test_changed_tags(self):
+        self.deploy()
+        data = self.get_function_data()
+        data['deploy']['tags'] = { 'wibble': 'wubble', 'foo': 'bar' }
+        self.backend.reset_calls()
+        self.deploy(data)
+        self.assertListEqual(['lambda:TagResource'], self.calls(*self.TAG_CALLS))
+        self.assertDictEqual({ 'wibble': 'wubble', 'foo': 'bar' }, self.get_tags())
+
+    def test_removed_tags(self):
+        self.deploy()
+        data = self.get_function_data()
+        del data['deploy']['tags']
+        self.deploy(data)
+        self.assertDictEqual({}, self.get_tags())
+
+    def test_tag_changes(self):
+        to_set, to_remove = deploy.get_tag_changes(
+            { 'a': '1', 'b': '2', 'c': '3' },
+            { 'a': '1', 'b': '1', 'd': '4' }
+        )
+        self.assertDictEqual({ 'b': '2', 'c': '3' }, to_set)
+        self.assertListEqual(['d'], to_remove)
+
+
+class TestDeployConcurrency(DeployerTestCase):
+
+    WRITES = (
+        'lambda:PutFunctionConcurrency', 'lambda:CreateAlias', 'lambda:UpdateAlias',
+        'lambda:PutProvisionedConcurrencyConfig', 'lambda:DeleteProvisionedConcurrencyConfig'
+    )
+
+    def get_function_data(self):
+        data = DeployerTestCase.get_function_data(self)
+        data['deploy']['reserved_concurrency'] = 10
+        data['deploy']['provisioned_concurrency'] = { 'executions': 2 }
+        return data
+
+    def test_not_configured(self):
+        DeployerTestCase.deploy(self, DeployerTestCase.get_function_data(self))
+        self.assertListEqual([], self.calls(
+            'lambda:GetFunctionConcurrency', 'lambda:GetAlias', 'lambda:GetProvisionedConcurrencyConfig',
+            *self.WRITES
+        ))
+
+    def test_create(self):
+        self.deploy()
+        function = self.get_function()
+        self.assertEqual(10, function.reserved_concurrency)
+        self.assertEqual('1', function.aliases['live'])
+        self.assertEqual(2, function.provisioned['live'])
+
+    def test_unchanged(self):
+        self.deploy()
+        self.backend.reset_calls()
+        self.deploy()
+        self.assertListEqual([], self.calls(*self.WRITES))
+
+    def test_alias_follows_new_version(self):
+        self.deploy()
+        self.write_package(self.CODE + b'changed')
+        self.backend.reset_calls()
+        self.deploy()
+        self.assertListEqual(['lambda:UpdateAlias'], self.calls(*self.WRITES))
+        self.assertEqual('2', self.get_function().aliases['live'])
+
+    def test_changed(self):
+        self.deploy()
+        data = self.get_function_data()
+        data['deploy']['reserved_concurrency'] = 20
+        data['deploy']['provisioned_concurrency'] = { 'alias': 'live', 'executions': 0 }
+        self.backend.reset_calls()
+        self.deploy(data)
+        self.assertListEqual(
+            ['lambda:PutFunctionConcurrency', 'lambda:DeleteProvisionedConcurrencyConfig'],
+            self.calls(*self.WRITES)
+        )
+
+    def test_alias_is_created_for_existing_function(self):
+        DeployerTestCase.deploy(self, DeployerTestCase.get_function_data(self))
+        self.backend.reset_calls()
+        self.deploy()
+        self.assertListEqual(
+            ['lambda:PublishVersion', 'lambda:CreateAlias'],
+            self.calls('lambda:PublishVersion', 'lambda:CreateAlias', 'lambda:UpdateAlias')
+        )
+
+    def test_negative_values(self):
+        data = self.get_function_data()
+        data['deploy']['reserved_concurrency'] = -1
+        self.assertRaises(
+            mapper.MappingError,
+            lambda: mapper.parse(configuration.FunctionConfig, data)
+        )
+
+
+class TestDeployArchitecture(DeployerTestCase):
+
+    def get_function_data(self):
+        data = DeployerTestCase.get_function_data(self)
+        data['runtime'] = 'python3.11'
+        return data
+
+    def get_architectures(self):
+        return self.get_function().configuration['Architectures']
+
+    def test_default(self):
+        self.deploy()
+        self.assertListEqual(['x86_64'], self.get_architectures())
+
+    def test_change_architecture(self):
+        self.deploy()
+        data = self.get_function_data()
+        data['architecture'] = 'arm64'
+        self.backend.reset_calls()
+        self.deploy(data)
+        self.assertListEqual(['lambda:UpdateFunctionCode'], self.calls(
+            'lambda:UpdateFunctionConfiguration', 'lambda:UpdateFunctionCode', 'lambda:PublishVersion'
+        ))
+        self.assertListEqual(['arm64'], self.get_architectures())
+
+    def test_unsupported_runtime(self):
+        data = self.get_function_data()
+        data['architecture'] = 'arm64'
+        data['runtime'] = 'python3.6'
+        self.assertRaises(
+            mapper.MappingError,
+            lambda: mapper.parse(configuration.FunctionConfig, data)
+        )
+
+    def test_unchanged_architecture(self):
+        data = self.get_function_data()
+        data['architecture'] = 'arm64'
+        self.deploy(data)
+        self.backend.reset_calls()
+        self.deploy(data)
+        self.assertListEqual([], self.calls('lambda:UpdateFunctionCode'))
+
+
+class TestDeployWarmup(DeployerTestCase):
+
+    WRITES = (
+        'events:PutRule', 'events:DeleteRule', 'events:PutTargets', 'events:RemoveTargets',
+        'lambda:AddPermission', 'lambda:RemovePermission'
+    )
+
+    def setUp(self):
+        DeployerTestCase.setUp(self)
+        with zipfile.ZipFile(self.package, 'w') as zip:
+            zip.writestr('hello.py', 'def handler(event, context): pass\n')
+            zip.writestr('ltools_warmup.py', '')
+
+    def get_function_data(self):
+        data = DeployerTestCase.get_function_data(self)
+        data['deploy']['warmup'] = { 'concurrency': 3, 'payload': { 'source': 'warmer' } }
+        return data
+
+    def get_rule(self):
+        return self.backend.rules.get((self.backend.region_name, 'ltools-warmup-hello'))
+
+    def test_not_configured(self):
+        DeployerTestCase.deploy(self, DeployerTestCase.get_function_data(self))
+        self.assertListEqual([], self.calls('events:DescribeRule', 'lambda:GetPolicy', *self.WRITES))
+
+    def test_create(self):
+        self.deploy()
+        function = self.get_function()
+        self.assertEqual('ltools_warmup.handler', function.configuration['Handler'])
+        self.assertEqual('hello.handler',
+            function.configuration['Environment']['Variables']['LTOOLS_WARMUP_HANDLER'])
+        self.assertEqual('rate(5 minutes)', self.get_rule()['ScheduleExpression'])
+        targets = self.get_rule()['Targets']
+        self.assertEqual(3, len(targets))
+        self.assertDictEqual(
+            { 'source': 'warmer', 'ltools-warmup': { 'concurrency': 3 } },
+            json.loads(targets['ltools-warmup-1']['Input'])
+        )
+        self.assertIn('ltools-warmup', function.policy)
+
+    def test_unchanged(self):
+        self.deploy()
+        self.backend.reset_calls()
+        self.deploy()
+        self.assertListEqual([], self.calls(*self.WRITES))
+
+    def test_changed(self):
+        self.deploy()
+        data = self.get_function_data()
+        data['deploy']['warmup'] = { 'rate': '1 hour', 'payload': { 'source': 'warmer' } }
+        self.backend.reset_calls()
+        self.deploy(data)
+        self.assertListEqual(
+            ['events:PutRule', 'events:RemoveTargets', 'events:PutTargets'],
+            self.calls(*self.WRITES)
+        )
+        self.assertListEqual(['ltools-warmup-1'], list(self.get_rule()['Targets']))
+
+    def test_removed(self):
+        self.deploy()
+        DeployerTestCase.deploy(self, DeployerTestCase.get_function_data(self))
+        self.assertEqual('hello.handler', self.get_function().configuration['Handler'])
+        self.assertIsNone(self.get_rule())
+        self.assertDictEqual({}, self.get_function().policy)
+
+    def test_valid_rates(self):
+        for rate in ('1 minute', '10 minutes', '1 day', '2 hours'):
+            data = self.get_function_data()
+            data['deploy']['warmup'] = { 'rate': rate }
+            function = mapper.parse(configuration.FunctionConfig, data)
+            self.assertEqual(rate, function.deploy.warmup.rate)
+
+    def test_invalid_settings(self):
+        for warmup in ({ 'concurrency': 6 }, { 'rate': '5 fortnights' },
+                { 'rate': '1 minutes' }, { 'rate': '5 minute' }):
+            data = self.get_function_data()
+            data['deploy']['warmup'] = warmup
+            self.assertRaises(
+                mapper.MappingError,
+                lambda: mapper.parse(configuration.FunctionConfig, data)
+            )
+
+    def test_not_python(self):
+        data = self.get_function_data()
+        data['runtime'] = 'nodejs6.10'
+        self.assertRaises(
+            mapper.MappingError,
+            lambda: mapper.parse(configuration.FunctionConfig, data)
+        )
+
+    def test_built_without_shim(self):
+        self.write_package(self.CODE)
+        with self.assertRaises(deploy.DeployError) as cm:
+            self.deploy()
+        self.assertIn('ltools build hello', str(cm.exception))
+        self.assertListEqual([], self.calls('lambda:CreateFunction', 'lambda:UpdateFunctionCode'))
+
+
+class TestDeployToRegions(DeployerTestCase):
+
+    def get_function_data(self):
+        data = DeployerTestCase.get_function_data(self)
+        data['deploy']['regions'] = ['eu-west-1', 'us-east-1', 'ap-southeast-2']
+        return data
+
+    def deploy(self, data=None):
+        func = mapper.parse(configuration.FunctionConfig, data or self.get_function_data())
+        deploy.deploy_regions(self.services, deploy.get_regional_configs(func), 'hello')
+
+    def test_regional_configs(self):
+        func = mapper.parse(configuration.FunctionConfig, self.get_function_data())
+        regions = [f.deploy.region for f in deploy.get_regional_configs(func)]
+        self.assertListEqual(['eu-west-1', 'us-east-1', 'ap-southeast-2'], regions)
+        self.assertListEqual(['eu-west-1', 'us-east-1', 'ap-southeast-2'], func.deploy.regions)
+
+    def test_deployed_to_all_regions(self):
+        self.deploy()
+        self.assertListEqual(
+            sorted([('ap-southeast-2', 'hello'), ('eu-west-1', 'hello'), ('us-east-1', 'hello')]),
+            sorted(self.backend.functions)
+        )
+
+    def test_role_is_resolved(self):
+        self.deploy()
+        self.assertSetEqual(
+            set(['arn:aws:iam::123456789012:role/service-role/NONTF-lambda']),
+            set([f.configuration['Role'] for f in self.backend.functions.values()])
+        )
+
+    def test_region_and_regions(self):
+        data = self.get_function_data()
+        data['deploy']['region'] = 'eu-west-1'
+        self.assertRaises(
+            mapper.MappingError,
+            lambda: mapper.parse(configuration.FunctionConfig, data)
+        )
+
+
+class TestDeployJournal(DeployerTestCase):
+
+    def deploy_with_journal(self, data=None):
+        func = mapper.parse(configuration.FunctionConfig, data or self.get_function_data())
+        deploy_journal = self.services.get(journal.DeployJournal,
+            os.path.join(self.folder, 'journal.json'))
+        state = deploy_journal.get_state('hello', func)
+        try:
+            deploy.deploy_regions(self.services, [func], 'hello', journal=deploy_journal)
+        finally:
+            self.entry = deploy_journal.entries['hello@']
+        return deploy_journal.is_deployed(state)
+
+    def test_success_is_recorded(self):
+        self.assertTrue(self.deploy_with_journal())
+        self.assertEqual('deployed', self.entry['status'])
+        self.assertEqual(sha256(self.CODE), self.entry['package_sha256'])
+
+    def test_failure_is_recorded(self):
+        os.unlink(self.package)
+        self.assertRaises(deploy.DeployError, self.deploy_with_journal)
+        self.assertEqual('failed', self.entry['status'])
+
+
+class TestFunctionInventory(DeployerTestCase):
+
+    def deploy_with_inventory(self, data=None):
+        func = mapper.parse(configuration.FunctionConfig, data or self.get_function_data())
+        inventory = self.services.get(deploy.FunctionInventory)
+        self.services.get(deploy.Deployer, func, 'hello').deploy(inventory)
+        return inventory
+
+    def test_create(self):
+        self.deploy_with_inventory()
+        self.assertListEqual(
+            ['lambda:ListFunctions', 'tag:GetResources', 'lambda:CreateFunction'],
+            self.calls('lambda:ListFunctions', 'tag:GetResources', 'lambda:GetFunction', 'lambda:CreateFunction')
+        )
+
+    def test_existing_function_is_not_probed(self):
+        self.deploy()
+        self.backend.reset_calls()
+        self.deploy_with_inventory()
+        self.assertListEqual([], self.calls(
+            'lambda:GetFunction', 'lambda:ListTags', 'lambda:TagResource', 'lambda:UpdateFunctionCode'
+        ))
+
+    def test_waits_for_update_in_progress(self):
+        self.services.register(deploy.UpdateWaiter,
+            self.services.get(deploy.UpdateWaiter, 0.001, 0.01), singleton=True)
+        self.deploy()
+        # ListFunctions does not say whether an update is in progress.
+        self.get_function().busy_until = time.monotonic() + 0.05
+        data = self.get_function_data()
+        data['deploy']['timeout'] = 30
+        self.backend.reset_calls()
+        self.deploy_with_inventory(data)
+        calls = self.calls('lambda:GetFunctionConfiguration', 'lambda:UpdateFunctionConfiguration')
+        self.assertEqual('lambda:GetFunctionConfiguration', calls[0])
+        self.assertIn('lambda:UpdateFunctionConfiguration', calls)
+        self.assertEqual(0, sum(self.backend.errors.values()))
+
+    def test_tags_are_discovered(self):
+        self.deploy()
+        inventory = self.deploy_with_inventory()
+        self.assertDictEqual(
+            { 'wibble': 'wobble' },
+            inventory.get(self.backend.region_name)['hello']['Tags']
+        )
+
+    def test_tags_are_listed_when_tagging_api_is_denied(self):
+        self.deploy()
+        self.backend.failures['tag:GetResources'] = 'AccessDeniedException'
+        self.backend.reset_calls()
+        self.deploy_with_inventory()
+        self.assertListEqual(['lambda:ListTags'], self.calls('lambda:ListTags', 'lambda:TagResource'))
+
+    def test_regions_are_discovered_once(self):
+        data = self.get_function_data()
+        data['deploy']['regions'] = ['eu-west-1', 'us-east-1']
+        func = mapper.parse(configuration.FunctionConfig, data)
+        inventory = self.services.get(deploy.FunctionInventory)
+        funcs = deploy.get_regional_configs(func)
+        deploy.deploy_regions(self.services, funcs, 'hello', inventory)
+        deploy.deploy_regions(self.services, funcs, 'world', inventory)
+        self.assertEqual(4, len(self.backend.functions))
+        self.assertEqual(2, len(self.calls('lambda:ListFunctions')))
+
+
+class TestDeployFromS3(DeployerTestCase):
+
+    def get_function_data(self):
+        data = DeployerTestCase.get_function_data(self)
+        data['deploy']['s3_bucket'] = 'my-bucket'
+        return data
+
+    def test_create(self):
+        self.deploy()
+        code = self.get_arguments('lambda:CreateFunction')[0]['Code']
+        self.assertEqual('my-bucket', code['S3Bucket'])
+        self.assertEqual(
+            'lambda-tools/' + base64.b64decode(sha256(self.CODE)).hex() + '.zip',
+            code['S3Key']
+        )
+        self.assertNotIn('ZipFile', code)
+
+    def test_regional_bucket(self):
+        data = self.get_function_data()
+        data['deploy']['s3_bucket'] = 'my-bucket-{region}'
+        data['deploy']['regions'] = ['eu-west-1', 'us-east-1']
+        func = mapper.parse(configuration.FunctionConfig, data)
+        deploy.deploy_regions(self.services, deploy.get_regional_configs(func), 'hello')
+        self.assertListEqual(
+            ['my-bucket-eu-west-1', 'my-bucket-us-east-1'],
+            sorted([bucket for bucket, key in self.backend.s3_objects])
+        )
+
+    def test_identical_packages_are_uploaded_once(self):
+        self.deploy()
+        self.write_package(self.CODE + b'changed')
+        self.deploy()
+        self.write_package(self.CODE)
+        self.deploy()
+        self.assertEqual(2, len(self.calls('s3:PutObject')))
+        self.assertEqual(2, len(self.calls('lambda:UpdateFunctionCode')))
+
+    def test_uploaded_when_existence_is_forbidden(self):
+        # S3 answers 403 for a missing key without s3:ListBucket.
+        self.backend.failures['s3:HeadObject'] = '403'
+        self.deploy()
+        self.assertEqual(1, len(self.calls('s3:PutObject')))
+        self.assertIn((self.backend.region_name, 'hello'), self.backend.functions)
+
+    def test_upload_counts_against_budget(self):
+        budget = deploy.PackageBudget()
+        self.services.register(deploy.PackageBudget, budget)
+        in_use = []
+        upload_file = fake.FakeS3Client.upload_file
+        def record(client, *args, **kwargs):
+            in_use.append(budget.in_use)
+            return upload_file(client, *args, **kwargs)
+        with mock.patch.object(fake.FakeS3Client, 'upload_file', record):
+            self.deploy()
+        self.assertListEqual([len(self.CODE)], in_use)
+        self.assertEqual(0, budget.in_use)
+
+
+class TestGetConfigurationChanges(unittest.TestCase):
+
+    def test_vpc_config_order_is_ignored(self):
+        changes = deploy.get_configuration_changes({
+            'VpcConfig': { 'SubnetIds': ['a', 'b'], 'SecurityGroupIds': ['c'] }
+        }, {
+            'VpcConfig': { 'SubnetIds': ['b', 'a'], 'SecurityGroupIds': ['c'], 'VpcId': 'v' }
+        })
+        self.assertDictEqual({}, changes)
+
+    def test_environment(self):
+        changes = deploy.get_configuration_changes({
+            'Environment': { 'Variables': { 'one': '1' } }
+        }, {
+            'Environment': { 'Variables': { 'one': '2' } }
+        })
+        self.assertDictEqual({ 'Environment': { 'Variables': { 'one': '1' } } }, changes)
+
+    def test_missing_remote_values(self):
+        changes = deploy.get_configuration_changes({
+            'Description': '',
+            'TracingConfig': { 'Mode': 'PassThrough' }
+        }, {})
+        self.assertDictEqual({}, changes)
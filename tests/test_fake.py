@@ -0,0 +1,134 @@
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import factoryfactory
+import yaml
+from lambda_tools import command
+from lambda_tools import configuration
+from lambda_tools import deploy
+from lambda_tools import fake
+from lambda_tools import mapper
+
+
+class FakeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.services = factoryfactory.ServiceLocator()
+        command.register_core_dependencies(self.services)
+        self.backend = fake.register(self.services, page_size=2)
+        self.backend.add_vpc('main', subnets=['private'], security_groups=['lambda'])
+        config = configuration.Configuration()
+        config.root = self.folder
+        self.services.register(configuration.Configuration, config)
+        self.services.register(deploy.UpdateWaiter,
+            self.services.get(deploy.UpdateWaiter, 0.001, 0.01), singleton=True)
+        self.write_package(b'code')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_package(self, data, name='hello'):
+        with open(os.path.join(self.folder, name + '.zip'), 'wb') as f:
+            f.write(data)
+
+    def get_function_data(self, name='hello'):
+        return {
+            'build': { 'source': 'src', 'package': name + '.zip' },
+            'deploy': {
+                'handler': 'hello.handler',
+                'role': 'lambda',
+                'tags': { 'team': 'core' },
+                'vpc_config': { 'subnets': ['private'], 'security_groups': ['lambda'] }
+            }
+        }
+
+    def deploy(self, name='hello', inventory=None):
+        func = mapper.parse(configuration.FunctionConfig, self.get_function_data(name))
+        self.services.get(deploy.Deployer, func, name).deploy(inventory)
+
+    def get_function(self, name='hello'):
+        return self.backend.functions[(self.backend.region_name, name)]
+
+
+class TestFakeBackend(FakeTestCase):
+
+    def test_create(self):
+        self.deploy()
+        function = self.get_function()
+        self.assertEqual('arn:aws:iam::123456789012:role/lambda', function.configuration['Role'])
+        self.assertEqual(1, len(function.configuration['VpcConfig']['SubnetIds']))
+        self.assertDictEqual({ 'team': 'core' }, function.tags)
+        self.assertEqual(1, len(function.versions))
+
+    def test_unchanged(self):
+        self.deploy()
+        self.backend.reset_calls()
+        self.deploy()
+        self.assertListEqual(['lambda:GetFunction'], list(self.backend.calls))
+
+    def test_updates_wait_until_ready(self):
+        self.backend.update_duration = 0.05
+        self.deploy()
+        self.write_package(b'changed')
+        self.deploy()
+        self.assertEqual(0, sum(self.backend.errors.values()))
+        self.assertGreater(self.backend.calls['lambda:GetFunctionConfiguration'], 0)
+        self.assertEqual(2, len(self.get_function().versions))
+
+    def test_conflicts_are_retried(self):
+        self.services.register(deploy.Throttle, deploy.Throttle(base_delay=0.001))
+        self.backend.conflict_rate = 0.5
+        self.backend.random.seed(1)
+        self.deploy()
+        self.assertGreater(self.backend.errors['lambda:CreateFunction'], 0)
+        self.assertIn((self.backend.region_name, 'hello'), self.backend.functions)
+
+    def test_rate_limit(self):
+        self.deploy()
+        self.backend.rate_limit = 1
+        aws = self.backend.session().client('lambda')
+        aws.get_function(FunctionName='hello')
+        with self.assertRaises(Exception) as cm:
+            aws.get_function(FunctionName='hello')
+        self.assertEqual('TooManyRequestsException', cm.exception.response['Error']['Code'])
+
+    def test_unretried_calls_are_not_throttled(self):
+        self.backend.throttle_rate = 1.0
+        session = self.backend.session()
+        session.client('sts').get_caller_identity()
+        session.client('ec2').describe_subnets()
+        session.client('lambda').list_functions()
+        self.assertEqual(0, sum(self.backend.errors.values()))
+
+    def test_inventory_is_paginated(self):
+        for name in ('a', 'b', 'c', 'd', 'e'):
+            self.write_package(name.encode('ascii'), name)
+            self.deploy(name)
+        self.backend.reset_calls()
+        inventory = self.services.get(deploy.FunctionInventory)
+        for name in ('a', 'b', 'c', 'd', 'e'):
+            self.deploy(name, inventory)
+        self.assertEqual(3, self.backend.calls['lambda:ListFunctions'])
+        self.assertEqual(3, self.backend.calls['tag:GetResources'])
+        self.assertEqual(0, self.backend.calls['lambda:GetFunction'])
+
+
+class TestDeployCommand(FakeTestCase):
+
+    def test_deploy_and_resume(self):
+        functions = dict([(name, self.get_function_data(name)) for name in ('a', 'b', 'c')])
+        for name in functions:
+            self.write_package(name.encode('ascii'), name)
+        filename = os.path.join(self.folder, 'aws-lambda.yml')
+        with open(filename, 'w') as f:
+            yaml.safe_dump({ 'version': 1, 'functions': functions }, f)
+
+        command.entrypoint(['deploy', '-s', filename, '--no-cache', '-j', '3'], self.services)
+        self.assertEqual(3, self.backend.calls['lambda:CreateFunction'])
+
+        self.backend.reset_calls()
+        command.entrypoint(['deploy', '-s', filename, '--no-cache', '--resume'], self.services)
+        self.assertEqual(0, self.backend.total_calls())
@@ -0,0 +1,77 @@
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import factoryfactory
+from lambda_tools import configuration
+from lambda_tools import journal
+from lambda_tools import mapper
+
+
+class TestDeployJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'journal.json')
+        with open(os.path.join(self.folder, 'hello.zip'), 'wb') as f:
+            f.write(b'hello')
+        self.data = {
+            'functions': {
+                'hello': {
+                    'build': { 'source': 'src', 'package': 'hello.zip' },
+                    'deploy': { 'handler': 'hello.handler', 'role': 'lambda' }
+                }
+            }
+        }
+        self.services = factoryfactory.ServiceLocator()
+        self.configure()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def configure(self):
+        config = mapper.parse(configuration.Configuration, self.data)
+        config.root = self.folder
+        config.raw_data = self.data
+        self.services.register(configuration.Configuration, config)
+        self.func = config.functions['hello']
+
+    def get_journal(self):
+        return self.services.get(journal.DeployJournal, self.filename)
+
+    def test_deployed(self):
+        state = self.get_journal().get_state('hello', self.func)
+        self.get_journal().record(state, journal.DeployJournal.DEPLOYED)
+        self.assertTrue(self.get_journal().is_deployed(state))
+
+    def test_failed(self):
+        state = self.get_journal().get_state('hello', self.func)
+        self.get_journal().record(state, journal.DeployJournal.FAILED)
+        self.assertFalse(self.get_journal().is_deployed(state))
+
+    def test_changed_package(self):
+        state = self.get_journal().get_state('hello', self.func)
+        self.get_journal().record(state, journal.DeployJournal.DEPLOYED)
+        with open(os.path.join(self.folder, 'hello.zip'), 'wb') as f:
+            f.write(b'changed')
+        state = self.get_journal().get_state('hello', self.func)
+        self.assertFalse(self.get_journal().is_deployed(state))
+
+    def test_changed_configuration(self):
+        state = self.get_journal().get_state('hello', self.func)
+        self.get_journal().record(state, journal.DeployJournal.DEPLOYED)
+        self.data['functions']['hello']['deploy']['timeout'] = 30
+        self.configure()
+        state = self.get_journal().get_state('hello', self.func)
+        self.assertFalse(self.get_journal().is_deployed(state))
+
+    def test_clear(self):
+        state = self.get_journal().get_state('hello', self.func)
+        self.get_journal().record(state, journal.DeployJournal.DEPLOYED)
+        self.get_journal().clear()
+        self.assertFalse(self.get_journal().is_deployed(state))
+
+    def test_state_does_not_resolve_configuration(self):
+        self.get_journal().get_state('hello', self.func)
+        self.assertEqual('hello.zip', self.func.build.package)
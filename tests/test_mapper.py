@@ -141,6 +141,10 @@ class DictFieldEntity:
     environment = mapper.DictField(mapper.StringField())
 
 
+class LazyDictFieldEntity:
+    environment = mapper.DictField(mapper.IntField(), lazy=True)
+
+
 class TestDictField(unittest.TestCase):
 
     def test_valid(self):
@@ -223,4 +227,131 @@ class TestClassWithDefaultField(unittest.TestCase):
 
     def test_default_field(self):
         result = mapper.parse(ClassWithDefaultFieldEntity, { 'five': 'George' })
-        self.assertEqual(result.five.name, 'George')
\ No newline at end of file
+        self.assertEqual(result.five.name, 'George')
+
+class ValidatedEntity:
+    low = mapper.IntField(default=0)
+    high = mapper.IntField(required=True)
+
+    def validate(self):
+        if self.low > self.high:
+            return 'low must not be greater than high.'
+
+
+class TestSchema(unittest.TestCase):
+
+    def test_schema_is_compiled_once(self):
+        self.assertIs(mapper.get_schema(ValidatedEntity), mapper.get_schema(ValidatedEntity))
+        self.assertListEqual(['high'], mapper.get_schema(ValidatedEntity).required)
+
+    def test_validate(self):
+        self.assertEqual(5, mapper.parse(ValidatedEntity, { 'high': 5 }).high)
+        self.assertRaises(
+            mapper.MappingError,
+            lambda: mapper.parse(ValidatedEntity, { 'low': 6, 'high': 5 })
+        )
+
+    def test_missing_required_value(self):
+        with self.assertRaises(mapper.MappingError) as cm:
+            mapper.parse(ValidatedEntity, { 'low': 1 })
+        self.assertEqual('Required value "high" was not provided.', str(cm.exception))
+
+    def test_item_names_in_errors(self):
+        with self.assertRaises(mapper.MappingError) as cm:
+            mapper.parse(ListFieldEntity, { 'names': ['Dick', 5] })
+        self.assertEqual('Value "names[1]" must be a string.', str(cm.exception))
+        with self.assertRaises(mapper.MappingError) as cm:
+            mapper.parse(DictFieldEntity, { 'environment': { 'one': [] } })
+        self.assertEqual('Value "environment[one]" must be a string.', str(cm.exception))
+
+
+@mapper.record('label')
+class RecordEntity:
+    name = mapper.StringField(required=True)
+    size = mapper.IntField(default=3)
+    label = 'unlabelled'
+
+    def describe(self):
+        return '{0} ({1})'.format(self.name, self.size)
+
+
+class TestRecord(unittest.TestCase):
+
+    def test_parse(self):
+        result = mapper.parse(RecordEntity, { 'name': 'Timmy' })
+        self.assertIsInstance(result, RecordEntity)
+        self.assertEqual('Timmy (3)', result.describe())
+        self.assertEqual('unlabelled', result.label)
+
+    def test_slots(self):
+        result = mapper.parse(RecordEntity, { 'name': 'Timmy', 'size': 4 })
+        self.assertFalse(hasattr(result, '__dict__'))
+        result.label = 'dog'
+        self.assertEqual('dog', result.label)
+        with self.assertRaises(AttributeError):
+            result.colour = 'brown'
+
+    def test_fields(self):
+        self.assertListEqual(['name', 'size'], sorted(mapper.get_fields(RecordEntity)))
+        self.assertIsInstance(mapper.get_fields(RecordEntity)['size'], mapper.IntField)
+
+    def test_constructor_sets_defaults(self):
+        result = RecordEntity()
+        self.assertEqual(None, result.name)
+        self.assertEqual(3, result.size)
+        self.assertEqual('unlabelled', result.label)
+
+    def test_copy(self):
+        import copy
+        result = copy.deepcopy(mapper.parse(RecordEntity, { 'name': 'Anne', 'size': 5 }))
+        self.assertEqual('Anne (5)', result.describe())
+
+
+class TestLazyDictField(unittest.TestCase):
+
+    def setUp(self):
+        self.result = mapper.parse(LazyDictFieldEntity, {
+            'environment': { 'one': '1', 'two': 'two' }
+        })
+
+    def test_items_are_parsed_on_access(self):
+        environment = self.result.environment
+        self.assertIsInstance(environment, mapper.LazyDict)
+        self.assertDictEqual({}, environment.parsed)
+        self.assertEqual(1, environment['one'])
+        self.assertDictEqual({ 'one': 1 }, environment.parsed)
+
+    def test_keys(self):
+        environment = self.result.environment
+        self.assertEqual(2, len(environment))
+        self.assertListEqual(['one', 'two'], sorted(environment))
+        self.assertIn('two', environment)
+        self.assertNotIn('three', environment)
+        self.assertRaises(KeyError, lambda: environment['three'])
+
+    def test_parsed_data_is_dropped(self):
+        data = { 'one': '1', 'two': '2' }
+        environment = mapper.parse(LazyDictFieldEntity, { 'environment': data }).environment
+        self.assertEqual(1, environment['one'])
+        self.assertListEqual(['two'], list(environment.data))
+        self.assertListEqual(['one', 'two'], list(environment))
+        self.assertIn('one', environment)
+        self.assertEqual(1, environment['one'])
+        self.assertDictEqual({ 'one': '1', 'two': '2' }, data)
+
+    def test_invalid_item(self):
+        with self.assertRaises(mapper.MappingError) as cm:
+            self.result.environment['two']
+        self.assertEqual('Value "environment[two]" must be convertible to an integer.',
+            str(cm.exception))
+
+    def test_parse_all(self):
+        errors = self.result.environment.parse_all()
+        self.assertListEqual(['two'], list(errors))
+        self.assertEqual(1, self.result.environment['one'])
+
+    def test_invalid_dict(self):
+        self.assertRaises(
+            mapper.MappingError,
+            lambda: mapper.parse(LazyDictFieldEntity, { 'environment': ['one'] })
+        )
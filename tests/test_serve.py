@@ -0,0 +1,220 @@
+import asyncio
+import base64
+import json
+import os.path
+import time
+import unittest
+
+from lambda_tools import configuration
+from lambda_tools import serve
+
+
+class TestMakeEvent(unittest.TestCase):
+
+    def setUp(self):
+        self.event = serve.make_event(
+            'POST', '/api/users/1?a=1&a=2&b=',
+            [('Host', 'localhost'), ('X-Thing', 'one'), ('X-Thing', 'two')],
+            b'{"hello": "world"}',
+            '/api'
+        )
+
+    def test_method_and_path(self):
+        self.assertEqual('POST', self.event['httpMethod'])
+        self.assertEqual('/api/users/1', self.event['path'])
+        self.assertEqual('/api/{proxy+}', self.event['resource'])
+
+    def test_path_parameters(self):
+        self.assertDictEqual({ 'proxy': 'users/1' }, self.event['pathParameters'])
+
+    def test_query_string(self):
+        self.assertDictEqual({ 'a': '2', 'b': '' }, self.event['queryStringParameters'])
+        self.assertDictEqual(
+            { 'a': ['1', '2'], 'b': [''] },
+            self.event['multiValueQueryStringParameters']
+        )
+
+    def test_headers(self):
+        self.assertEqual('two', self.event['headers']['X-Thing'])
+        self.assertListEqual(['one', 'two'], self.event['multiValueHeaders']['X-Thing'])
+
+    def test_body(self):
+        self.assertEqual('{"hello": "world"}', self.event['body'])
+        self.assertFalse(self.event['isBase64Encoded'])
+
+    def test_binary_body(self):
+        event = serve.make_event('POST', '/', [], b'\xff\xfe', '')
+        self.assertTrue(event['isBase64Encoded'])
+        self.assertEqual(b'\xff\xfe', base64.b64decode(event['body']))
+
+
+class TestMakeResponse(unittest.TestCase):
+
+    def test_response(self):
+        status, headers, body = serve.make_response(json.dumps({
+            'statusCode': 201,
+            'headers': { 'X-One': '1' },
+            'multiValueHeaders': { 'Set-Cookie': ['a=1', 'b=2'] },
+            'body': 'created'
+        }))
+        self.assertEqual(201, status)
+        self.assertListEqual(
+            [('X-One', '1'), ('Set-Cookie', 'a=1'), ('Set-Cookie', 'b=2')],
+            headers
+        )
+        self.assertEqual(b'created', body)
+
+    def test_base64_response(self):
+        status, headers, body = serve.make_response(json.dumps({
+            'statusCode': 200,
+            'body': base64.b64encode(b'\x00\x01').decode('ascii'),
+            'isBase64Encoded': True
+        }))
+        self.assertEqual(b'\x00\x01', body)
+
+    def test_malformed_response(self):
+        status, headers, body = serve.make_response(json.dumps('Hello world'))
+        self.assertEqual(502, status)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_summary(self):
+        metrics = serve.Metrics()
+        for latency in (0.001, 0.002, 0.003):
+            metrics.record(latency)
+        metrics.record(0.010, error=True)
+        summary = metrics.summary()
+        self.assertEqual(4, summary['count'])
+        self.assertEqual(1, summary['errors'])
+        self.assertEqual(4.0, summary['mean_ms'])
+        self.assertEqual(3.0, summary['p50_ms'])
+        self.assertEqual(10.0, summary['max_ms'])
+
+    def test_sample_is_bounded(self):
+        metrics = serve.Metrics(sample_size=100)
+        for index in range(10000):
+            metrics.record(index / 1000.0)
+        summary = metrics.summary()
+        self.assertEqual(100, len(metrics.latencies))
+        self.assertEqual(10000, summary['count'])
+        self.assertEqual(4999.5, summary['mean_ms'])
+        self.assertEqual(9999.0, summary['max_ms'])
+
+
+class TestGateway(unittest.TestCase):
+
+    def setUp(self):
+        root = os.path.join(os.path.dirname(__file__), 'functions')
+        cfg = configuration.load(os.path.join(root, 'aws-lambda.yml'))
+        self.pool = serve.create_pool(cfg.functions['serve'], 'serve', root)
+        self.gateway = serve.Gateway([self.pool])
+        self.gateway.loop = asyncio.new_event_loop()
+        self.gateway.start()
+
+    def tearDown(self):
+        self.gateway.stop()
+        self.gateway.loop.close()
+
+    def dispatch(self, method, target, body=b''):
+        return self.gateway.loop.run_until_complete(
+            self.gateway.dispatch(method, target, [], body)
+        )
+
+    def test_prefork(self):
+        self.assertEqual(2, len(self.pool.workers))
+
+    def test_dispatch(self):
+        status, headers, body = self.dispatch('GET', '/api/things?x=1')
+        self.assertEqual(200, status)
+        self.assertDictEqual({
+            'path': '/api/things',
+            'proxy': 'things',
+            'query': { 'x': '1' },
+            'body': None
+        }, json.loads(body.decode('utf-8')))
+
+    def test_not_found(self):
+        status, headers, body = self.dispatch('GET', '/elsewhere')
+        self.assertEqual(404, status)
+
+    def test_metrics(self):
+        self.dispatch('GET', '/api')
+        self.dispatch('GET', '/api')
+        status, headers, body = self.dispatch('GET', serve.METRICS_PATH)
+        metrics = json.loads(body.decode('utf-8'))
+        self.assertEqual(2, metrics['serve']['count'])
+        self.assertEqual(0, metrics['serve']['errors'])
+
+    def test_chunked_request(self):
+        class Writer:
+            def __init__(self):
+                self.data = b''
+                self.closed = False
+            def write(self, data):
+                self.data += data
+            async def drain(self):
+                pass
+            def close(self):
+                self.closed = True
+
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b'POST /api HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n'
+                b'5\r\nhello\r\n0\r\n\r\n')
+            reader.feed_eof()
+            writer = Writer()
+            await self.gateway.handle_connection(reader, writer)
+            return writer
+        writer = self.gateway.loop.run_until_complete(run())
+        self.assertTrue(writer.data.startswith(b'HTTP/1.1 411 Length Required\r\n'))
+        self.assertIn(b'Connection: close', writer.data)
+        self.assertTrue(writer.closed)
+        self.assertEqual(0, self.pool.metrics.count)
+
+    def test_handler_error(self):
+        self.pool.stop()
+        self.pool.handler = 'api.broken'
+        self.pool.start()
+        status, headers, body = self.dispatch('GET', '/api')
+        self.assertEqual(502, status)
+        self.assertEqual(1, self.pool.metrics.errors)
+
+    def test_timeout_does_not_block_other_requests(self):
+        self.pool.stop()
+        self.pool.handler = 'api.slow'
+        self.pool.timeout = 0.2
+        self.pool.start()
+
+        started = time.perf_counter()
+
+        async def fast_request():
+            # Sent once the slow request has timed out.
+            await asyncio.sleep(0.3)
+            result = await self.gateway.dispatch('GET', '/api?sleep=0', [], b'')
+            return result, time.perf_counter() - started
+
+        async def run():
+            return await asyncio.gather(
+                self.gateway.dispatch('GET', '/api?sleep=5', [], b''),
+                fast_request()
+            )
+        slow, (fast, latency) = self.gateway.loop.run_until_complete(run())
+        self.assertEqual(504, slow[0])
+        self.assertEqual(200, fast[0])
+        self.assertLess(latency, 0.8)
+        self.assertEqual(2, len(self.pool.workers))
+
+    def test_failed_replacement(self):
+        self.pool.stop()
+        self.pool.handler = 'api.slow'
+        self.pool.timeout = 0.2
+        self.pool.concurrency = 1
+        self.pool.start()
+        self.pool.handler = 'api.missing'
+        self.assertEqual(504, self.dispatch('GET', '/api?sleep=5')[0])
+        self.assertListEqual([], self.pool.workers)
+        self.assertEqual(502, self.dispatch('GET', '/api?sleep=0')[0])
+        self.pool.handler = 'api.slow'
+        self.assertEqual(200, self.dispatch('GET', '/api?sleep=0')[0])
+        self.assertEqual(1, len(self.pool.workers))
@@ -0,0 +1,49 @@
+import importlib.util
+import os
+import unittest
+from unittest import mock
+
+from lambda_tools import warmup
+
+
+class TestWarmupShim(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        warmup._handler = lambda event, context: self.calls.append(event) or 'handled'
+
+    def tearDown(self):
+        del warmup._handler
+
+    def test_warmup_events_are_answered(self):
+        result = warmup.handler({ 'ltools-warmup': { 'concurrency': 1 } }, None)
+        self.assertDictEqual({ 'warmup': True }, result)
+        self.assertListEqual([], self.calls)
+
+    def test_other_events_are_passed_through(self):
+        self.assertEqual('handled', warmup.handler({ 'body': 'hello' }, None))
+        self.assertEqual('handled', warmup.handler('not a dict', None))
+        self.assertListEqual([{ 'body': 'hello' }, 'not a dict'], self.calls)
+
+    def test_load_handler(self):
+        self.assertIs(os.path.join, warmup.load_handler('os.path.join'))
+
+
+class TestWarmupShimImport(unittest.TestCase):
+
+    def import_shim(self):
+        spec = importlib.util.spec_from_file_location(warmup.MODULE_NAME, warmup.__file__)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def test_handler_is_loaded(self):
+        with mock.patch.dict(os.environ, { warmup.HANDLER_VARIABLE: 'os.path.join' }):
+            self.assertIs(os.path.join, self.import_shim()._handler)
+
+    def test_handler_not_set(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop(warmup.HANDLER_VARIABLE, None)
+            with self.assertRaises(RuntimeError) as cm:
+                self.import_shim()
+        self.assertIn(warmup.HANDLER_VARIABLE, str(cm.exception))